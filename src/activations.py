@@ -0,0 +1,143 @@
+import numpy as np
+
+
+# Activation functions of the hidden layers.
+ACTIVATIONS = ("sigmoid", "fast_sigmoid", "tanh", "relu", "leaky_relu")
+
+# Output layers and the loss each is trained with: sigmoid with squared error, softmax with
+# cross-entropy.
+OUTPUTS = ("sigmoid", "softmax")
+
+# Slope of the leaky ReLU for negative weighted sums.
+LEAKY_RELU_SLOPE = 0.01
+
+# Largest exponent np.exp can take without overflowing, by precision.
+_EXP_LIMITS = {np.dtype(t): np.floor(np.log(np.finfo(t).max)).astype(t)  # pylint: disable=no-member
+               for t in (np.float32, np.float64)}
+
+
+def sigmoid(z: np.ndarray, out: np.ndarray = None):
+    """Activation function for the neural network to introduce nonlinearity.
+
+    The exponent is clipped below the overflow limit of z's precision, so large negative
+    weighted sums give values close to zero without overflowing to infinity in float32.
+
+    Args:
+        z (np.ndarray): Weighted sum.
+        out (np.ndarray, optional): Array the result is written into; may be z itself.
+        Defaults to None.
+
+    Returns:
+        np.ndarray: Array of values between zero and one.
+    """
+    out = np.negative(z, out=out)
+    np.minimum(out, _EXP_LIMITS[out.dtype], out=out)
+    np.exp(out, out=out)
+    out += 1
+    return np.reciprocal(out, out=out)
+
+
+def softmax(z: np.ndarray, out: np.ndarray = None):
+    """Output activation giving a probability distribution over the classes.
+
+    The largest weighted sum is subtracted before exponentiating, so no value overflows.
+
+    Args:
+        z (np.ndarray): Weighted sum; a vector or a matrix with one example per column.
+        out (np.ndarray, optional): Array the result is written into; may be z itself.
+        Defaults to None.
+
+    Returns:
+        np.ndarray: Non-negative values summing to one along the first axis.
+    """
+    out = np.subtract(z, np.max(z, axis=0), out=out)
+    np.exp(out, out=out)
+    out /= np.sum(out, axis=0)
+    return out
+
+
+def sigmoid_derivative(a: np.ndarray, out: np.ndarray = None):
+    """Derivative of the sigmoid function expressed with its value.
+
+    Args:
+        a (np.ndarray): Values of the sigmoid function.
+        out (np.ndarray, optional): Array the result is written into. Defaults to None.
+
+    Returns:
+        np.ndarray: Derivatives.
+    """
+    out = np.subtract(1, a, out=out)
+    out *= a
+    return out
+
+
+# The activation functions of the hidden layers below share one signature: the weighted sums z,
+# the array the result is written into (possibly z itself) and an optional scratch array shaped
+# like z, which the functions that need no temporary ignore (_scratch). The derivatives are
+# expressed with the values of the activation function, which the backward pass already has, so
+# the weighted sums need not be kept.
+
+def _hidden_sigmoid(z: np.ndarray, out: np.ndarray, _scratch: np.ndarray = None):
+    return sigmoid(z, out=out)
+
+
+def _fast_sigmoid(z: np.ndarray, out: np.ndarray, scratch: np.ndarray = None):
+    """Sigmoid-shaped function 0.5 * z / (1 + |z|) + 0.5 computed without exponentials.
+    """
+    scratch = np.abs(z, out=scratch)
+    scratch += 1
+    np.divide(z, scratch, out=out)
+    out *= 0.5
+    out += 0.5
+    return out
+
+
+def _fast_sigmoid_derivative(a: np.ndarray, out: np.ndarray = None):
+    out = np.multiply(a, 2, out=out)
+    out -= 1
+    np.abs(out, out=out)
+    np.subtract(1, out, out=out)
+    np.square(out, out=out)
+    out *= 0.5
+    return out
+
+
+def _tanh(z: np.ndarray, out: np.ndarray, _scratch: np.ndarray = None):
+    return np.tanh(z, out=out)
+
+
+def _tanh_derivative(a: np.ndarray, out: np.ndarray = None):
+    out = np.multiply(a, a, out=out)
+    return np.subtract(1, out, out=out)
+
+
+def _relu(z: np.ndarray, out: np.ndarray, _scratch: np.ndarray = None):
+    return np.maximum(z, 0, out=out)
+
+
+def _relu_derivative(a: np.ndarray, out: np.ndarray = None):
+    if out is None:
+        out = np.empty_like(a)
+    return np.greater(a, 0, out=out)
+
+
+def _leaky_relu(z: np.ndarray, out: np.ndarray, scratch: np.ndarray = None):
+    scratch = np.multiply(z, LEAKY_RELU_SLOPE, out=scratch)
+    return np.maximum(z, scratch, out=out)
+
+
+def _leaky_relu_derivative(a: np.ndarray, out: np.ndarray = None):
+    out = _relu_derivative(a, out)
+    out *= 1 - LEAKY_RELU_SLOPE
+    out += LEAKY_RELU_SLOPE
+    return out
+
+
+# Activation function and its derivative for each name in ACTIVATIONS.
+ACTIVATION_FUNCTIONS = {
+    "sigmoid": (_hidden_sigmoid, sigmoid_derivative),
+    "fast_sigmoid": (_fast_sigmoid, _fast_sigmoid_derivative),
+    "tanh": (_tanh, _tanh_derivative),
+    "relu": (_relu, _relu_derivative),
+    "leaky_relu": (_leaky_relu, _leaky_relu_derivative),
+}
@@ -0,0 +1,243 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tracemalloc
+from time import perf_counter
+import numpy as np
+from data_handling import Dataset, get_data
+from network import DEFAULT_LAYERS, Network
+
+# Layer shapes benchmarked; the default network and the largest one Ui.create_new allows
+BENCHMARK_LAYERS = {
+    "default": DEFAULT_LAYERS,
+    "maximum": [784] + [784] * 10 + [10],
+}
+
+# Batch sizes of the forward pass, gradient and mini batch benchmarks
+BENCHMARK_BATCH_SIZES = (1, 10, 100, 1000)
+
+# Relative drop in throughput reported as a regression
+REGRESSION_THRESHOLD = 0.1
+
+# Keys of the throughput in a benchmark result, mapped to their units in the report
+THROUGHPUT_UNITS = {"examples_per_second": "examples/s", "launches_per_second": "launches/s"}
+
+
+def measure(function, n_examples: int, repeats: int = 3):
+    """Measure the throughput and peak memory of a function.
+
+    The function is timed repeats times and the fastest run is kept. The peak memory is measured
+    in a separate run, since tracing the allocations slows the function down.
+
+    Args:
+        function (callable): Function without arguments processing n_examples examples.
+        n_examples (int): Number of examples processed in one call.
+        repeats (int, optional): Number of timed calls. Defaults to 3.
+
+    Returns:
+        dict: Examples per second and peak traced memory in bytes.
+    """
+    seconds = float("inf")
+    for _ in range(repeats):
+        start = perf_counter()
+        function()
+        seconds = min(seconds, perf_counter() - start)
+
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"examples_per_second": n_examples / seconds, "peak_memory_bytes": peak}
+
+
+def measure_startup(data_path: str = "data/mnist.pkl.gz", repeats: int = 3):
+    """Measure the time from launching Python to the menu of the user interface being ready.
+
+    Each run is a fresh interpreter importing user_interface and creating a Ui, which is what
+    main.py does before showing the menu. The fastest run is kept.
+
+    Args:
+        data_path (str, optional): Path to mnist. Defaults to "data/mnist.pkl.gz".
+        repeats (int, optional): Number of timed launches. Defaults to 3.
+
+    Returns:
+        dict: Launches per second and peak resident memory in bytes.
+    """
+    code = ("import resource, sys; from user_interface import Ui; Ui(sys.argv[1]); "
+            "print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)")
+    environment = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.abspath(__file__)))
+    seconds = float("inf")
+    for _ in range(repeats):
+        start = perf_counter()
+        result = subprocess.run([sys.executable, "-c", code, data_path], env=environment,
+                                check=True, capture_output=True, text=True)
+        seconds = min(seconds, perf_counter() - start)
+    return {"launches_per_second": 1 / seconds,
+            "peak_memory_bytes": int(result.stdout.split()[-1]) * 1024}
+
+
+# One statement per measured operation.
+# pylint: disable-next=too-many-statements
+def run_benchmarks(layer_shapes: dict = None,
+                   batch_sizes: tuple = BENCHMARK_BATCH_SIZES,
+                   n_examples: int = 1000,
+                   repeats: int = 3,
+                   data_path: str = "data/mnist.pkl.gz"):
+    """Benchmark training and inference of the neural network.
+
+    The network benchmarks use random data, so they can be run without the mnist data set.
+    Loading the data set with get_data and the startup of the user interface, reported in
+    launches per second, are benchmarked only if the data set exists at data_path.
+
+    Args:
+        layer_shapes (dict, optional): Names mapped to lists of layer sizes. Defaults to
+        BENCHMARK_LAYERS.
+        batch_sizes (tuple, optional): Batch sizes of the forward pass, gradient and mini batch
+        benchmarks. Defaults to BENCHMARK_BATCH_SIZES.
+        n_examples (int, optional): Number of training examples. Defaults to 1000.
+        repeats (int, optional): Number of timed calls of each benchmark. Defaults to 3.
+        data_path (str, optional): Path to mnist. Defaults to "data/mnist.pkl.gz".
+
+    Returns:
+        list: List of dict; name, layers, batch size, throughput and peak memory of each
+        benchmark. The throughput is under the key "launches_per_second" for the startup and
+        "examples_per_second" for the rest.
+    """
+    layer_shapes = BENCHMARK_LAYERS if layer_shapes is None else layer_shapes
+    results = []
+
+    def record(name, shape, batch_size, function, n):
+        result = {"name": name, "layers": shape, "batch_size": batch_size}
+        result.update(measure(function, n, repeats))
+        results.append(result)
+
+    for shape, layers in layer_shapes.items():
+        net = Network(layers)
+        data = Dataset(np.random.rand(n_examples, layers[0]).astype(np.float32),
+                       np.random.randint(0, layers[-1], n_examples), layers[-1])
+
+        for batch_size in batch_sizes:
+            batch_size = min(batch_size, n_examples)
+            x = net._cast(data.inputs[:batch_size].T)
+            a_hat = net._cast(data.expected_outputs(slice(batch_size)).T)
+            record("feed_forward", shape, batch_size,
+                   lambda net=net, x=x: net.feed_forward(x), batch_size)
+            record("gradient_calculation", shape, batch_size,
+                   lambda net=net, x=x, a_hat=a_hat: net._gradient_calculation(x, a_hat),
+                   batch_size)
+            record("minibatch_gradient_descent", shape, batch_size,
+                   lambda net=net, data=data, batch_size=batch_size:
+                   net.minibatch_gradient_descent(data, batch_size, 1, 0.1), n_examples)
+
+        record("vanilla_gradient_descent", shape, n_examples,
+               lambda net=net, data=data: net.vanilla_gradient_descent(data, 1, 0.1), n_examples)
+        record("stochastic_gradient_descent", shape, 1,
+               lambda net=net, data=data: net.stochastic_gradient_descent(data, 1, 0.1),
+               n_examples)
+        record("validation_accuracy", shape, None,
+               lambda net=net, data=data: net.validation_accuracy(data), n_examples)
+
+    if os.path.exists(data_path):
+        n_loaded = sum(len(split) for split in get_data(data_path))
+        record("get_data", None, None, lambda: get_data(data_path), n_loaded)
+        results.append({"name": "ui_startup", "layers": None, "batch_size": None,
+                        **measure_startup(data_path, repeats)})
+    return results
+
+
+def benchmark_key(result: dict):
+    """Get the identifier of a benchmark result, shared by runs with the same parameters.
+    """
+    return f"{result['name']}[layers={result['layers']}, batch_size={result['batch_size']}]"
+
+
+def throughput(result: dict):
+    """Get the throughput of a benchmark result and its unit.
+
+    Args:
+        result (dict): Result of run_benchmarks.
+
+    Returns:
+        tuple: Throughput and its unit, a value of THROUGHPUT_UNITS.
+    """
+    key = next(key for key in THROUGHPUT_UNITS if key in result)
+    return result[key], THROUGHPUT_UNITS[key]
+
+
+def compare(results: list, baseline: list, threshold: float = REGRESSION_THRESHOLD):
+    """Find the benchmarks slower than in a baseline.
+
+    Args:
+        results (list): List of dict; results of run_benchmarks.
+        baseline (list): List of dict; earlier results of run_benchmarks.
+        threshold (float, optional): Relative drop in throughput reported as a regression.
+        Defaults to REGRESSION_THRESHOLD.
+
+    Returns:
+        list: List of tuples; key, baseline and current throughput, unit of the throughput and
+        relative change of each regressed benchmark.
+    """
+    previous = {benchmark_key(result): result for result in baseline}
+    regressions = []
+    for result in results:
+        key = benchmark_key(result)
+        if key not in previous:
+            continue
+        before, _ = throughput(previous[key])
+        after, unit = throughput(result)
+        change = after / before - 1
+        if change < -threshold:
+            regressions.append((key, before, after, unit, change))
+    return regressions
+
+
+def write_results(results: list, path: str):
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(results, file, indent=2)
+
+
+def read_results(path: str):
+    with open(path, encoding="utf-8") as file:
+        return json.load(file)
+
+
+# The options and the report are read top to bottom.
+# pylint: disable-next=too-many-statements
+def main():
+    parser = argparse.ArgumentParser(description="Neural network benchmarks.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="Run the benchmarks and write the results.")
+    run.add_argument("--output", default="benchmark.json")
+    run.add_argument("--examples", type=int, default=1000)
+    run.add_argument("--repeats", type=int, default=3)
+    run.add_argument("--quick", action="store_true", help="Benchmark only the default layers.")
+
+    comparison = commands.add_parser("compare", help="Compare results against a baseline.")
+    comparison.add_argument("baseline")
+    comparison.add_argument("results")
+    comparison.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+
+    args = parser.parse_args()
+    if args.command == "run":
+        layer_shapes = {"default": DEFAULT_LAYERS} if args.quick else BENCHMARK_LAYERS
+        results = run_benchmarks(layer_shapes, n_examples=args.examples, repeats=args.repeats)
+        for result in results:
+            rate, unit = throughput(result)
+            print(f"{benchmark_key(result)}: {rate:.0f} {unit}, peak memory {result['peak_memory_bytes'] / 2**20:.1f} MiB")
+        write_results(results, args.output)
+        return
+
+    regressions = compare(read_results(args.results), read_results(args.baseline),
+                          args.threshold)
+    for key, before, after, unit, change in regressions:
+        print(f"REGRESSION {key}: {before:.0f} -> {after:.0f} {unit} ({change:+.1%})")
+    if regressions:
+        sys.exit(1)
+    print("No regressions.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,395 @@
+import csv
+import json
+from abc import ABC, abstractmethod
+from math import gcd
+from time import perf_counter
+import numpy as np
+from data_handling import Dataset, as_dataset
+
+
+# Phases the wall time of training is split into.
+PHASES = ("data", "forward", "backward", "update", "validation")
+
+# Fields of the batch and epoch events, in the column order of CSVLogger.
+EVENT_FIELDS = ("event", "epoch", "batch", "examples", "loss", "validation_accuracy", "seconds",
+                "examples_per_second") + PHASES
+
+# Every how many batches the phases are timed when no callback asks for batch events.
+EPOCH_SAMPLE_INTERVAL = 100
+
+
+class Callback:
+    """Base class of the callbacks of the gradient descent methods of network.Network.
+
+    Subclasses override the hooks they need. Events are dictionaries with the keys of
+    EVENT_FIELDS; a batch event has no validation accuracy.
+
+    Attributes:
+        sample_interval (int): Every how many batches on_batch_end is called, or None for epoch
+        events only.
+        stop_training (bool): Set by the callback to end the training after the current epoch.
+        needs_validation (bool): Whether the callback uses the validation accuracy computed by
+        the training method, which then refuses to start without validation data.
+    """
+
+    sample_interval = None
+    stop_training = False
+    needs_validation = False
+
+    def on_train_begin(self, net):
+        """Called before the first epoch with the network trained.
+        """
+
+    def on_batch_end(self, event: dict):
+        """Called after every sample_interval-th update with the loss and phase times of the
+        batch.
+        """
+
+    def on_epoch_end(self, event: dict):
+        """Called after every epoch with the loss, validation accuracy and phase times of the
+        epoch.
+        """
+
+    def on_train_end(self):
+        """Called after the last epoch.
+        """
+
+    def close(self):
+        """Called when the training is over, also when it raised, to release what
+        on_train_begin acquired, such as open files.
+        """
+
+
+class History(Callback):
+    """Callback keeping every event in memory.
+
+    Attributes:
+        batches (list): List of dict; batch events.
+        epochs (list): List of dict; epoch events.
+    """
+
+    def __init__(self, sample_interval: int = None):
+        """Class constructor for the history.
+
+        Args:
+            sample_interval (int, optional): Every how many batches a batch event is kept, or
+            None for epoch events only. Defaults to None.
+        """
+        self.sample_interval = sample_interval
+        self.batches = []
+        self.epochs = []
+
+    def on_batch_end(self, event: dict):
+        self.batches.append(event)
+
+    def on_epoch_end(self, event: dict):
+        self.epochs.append(event)
+
+
+# The settings, the best snapshot and the progress of the run.
+class EarlyStopping(Callback):  # pylint: disable=too-many-instance-attributes
+    """Callback ending the training when the validation accuracy stops improving.
+
+    The parameters of the best validated epoch are kept in an in-memory snapshot and copied back
+    into the network when the training ends, whether it stopped early or not.
+
+    Attributes:
+        patience (int): Number of validations without improvement before stopping.
+        min_delta (float): Smallest increase in accuracy counted as an improvement.
+        interval (int): Every how many epochs the network is validated.
+        best_accuracy (float): Best validation accuracy seen.
+        best_epoch (int): Epoch of the best validation accuracy, or None.
+        stopped_epoch (int): Epoch after which the training was stopped, or None.
+    """
+
+    def __init__(self,
+                 patience: int = 5,
+                 min_delta: float = 0.0,
+                 validation_data=None,
+                 subsample: int = None,
+                 interval: int = 1):
+        """Class constructor for the early stopping.
+
+        Args:
+            patience (int, optional): Number of validations without improvement before stopping.
+            Defaults to 5.
+            min_delta (float, optional): Smallest increase in accuracy counted as an improvement.
+            Defaults to 0.0.
+            validation_data (Dataset or list, optional): Data to validate on. Defaults to None,
+            which uses the validation accuracy computed by the training method.
+            subsample (int, optional): Number of randomly chosen examples of validation_data
+            validated on, the same ones every time. Defaults to None for all of them.
+            interval (int, optional): Every how many epochs the network is validated.
+            Defaults to 1.
+        """
+        self.patience = patience
+        self.min_delta = min_delta
+        self.interval = interval
+        self.best_accuracy = -np.inf
+        self.best_epoch = None
+        self.stopped_epoch = None
+        self._net = None
+        self._best_params = None
+        self._waited = 0
+
+        self._validation_data = None
+        if validation_data is not None:
+            data = as_dataset(validation_data)
+            if subsample is not None and subsample < len(data):
+                index = np.sort(np.random.choice(len(data), subsample, replace=False))
+                targets = None if data.targets is None else data.targets[index]
+                data = Dataset(data.inputs[index], data.labels[index], data.n_classes, targets,
+                               data.inputs.dtype)
+            self._validation_data = data
+        self.needs_validation = validation_data is None
+
+    def on_train_begin(self, net):
+        self._net = net
+        self._best_params = np.empty_like(net.params)
+        self.best_accuracy = -np.inf
+        self.best_epoch = None
+        self.stopped_epoch = None
+        self.stop_training = False
+        self._waited = 0
+
+    def on_epoch_end(self, event: dict):
+        if (event["epoch"] + 1) % self.interval:
+            return
+        if self._validation_data is not None:
+            accuracy = self._net.validation_accuracy(self._validation_data)
+        else:
+            accuracy = event["validation_accuracy"]
+
+        if accuracy > self.best_accuracy + self.min_delta or self.best_epoch is None:
+            self.best_accuracy = accuracy
+            self.best_epoch = event["epoch"]
+            np.copyto(self._best_params, self._net.params)
+            self._waited = 0
+            return
+        self._waited += 1
+        if self._waited >= self.patience:
+            self.stop_training = True
+            self.stopped_epoch = event["epoch"]
+
+    def on_train_end(self):
+        if self.best_epoch is not None:
+            self._net.params[...] = self._best_params
+        self._net = None
+        self._best_params = None
+
+
+class _FileLogger(Callback, ABC):
+    """Callback writing every event to a file, which is emptied when the logger is created and
+    appended to by each training run.
+    """
+
+    def __init__(self, path: str, sample_interval: int = None):
+        """Class constructor for the logger.
+
+        Args:
+            path (str): Path of the file.
+            sample_interval (int, optional): Every how many batches a batch event is written, or
+            None for epoch events only. Defaults to None.
+        """
+        self.path = path
+        self.sample_interval = sample_interval
+        self._file = None
+        with open(path, "w", encoding="utf-8", newline="") as file:
+            self._write_header(file)
+
+    def on_train_begin(self, net):
+        # Closed by close, which the training loop calls however the training ends.
+        self._file = open(self.path, "a", encoding="utf-8",  # pylint: disable=consider-using-with
+                          newline="")
+
+    def on_batch_end(self, event: dict):
+        self._write(event)
+
+    def on_epoch_end(self, event: dict):
+        self._write(event)
+        self._file.flush()
+
+    def on_train_end(self):
+        self.close()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _write_header(self, file):
+        pass
+
+    @abstractmethod
+    def _write(self, event: dict):
+        """Write one event to the open file.
+        """
+
+
+class CSVLogger(_FileLogger):
+    """Callback writing the events as rows of a CSV file with the columns of EVENT_FIELDS.
+    """
+
+    def __init__(self, path: str, sample_interval: int = None):
+        """Class constructor for the logger.
+
+        Args:
+            path (str): Path of the CSV file.
+            sample_interval (int, optional): Every how many batches a batch event is written, or
+            None for epoch events only. Defaults to None.
+        """
+        self._writer = None
+        super().__init__(path, sample_interval)
+
+    def _write_header(self, file):
+        csv.writer(file).writerow(EVENT_FIELDS)
+
+    def on_train_begin(self, net):
+        super().on_train_begin(net)
+        self._writer = csv.DictWriter(self._file, EVENT_FIELDS, restval="")
+
+    def _write(self, event: dict):
+        self._writer.writerow(event)
+
+
+class JSONLinesLogger(_FileLogger):
+    """Callback writing the events as one JSON object per line.
+    """
+
+    def _write(self, event: dict):
+        self._file.write(json.dumps(event) + "\n")
+
+
+class PhaseTimer:
+    """Stopwatch splitting wall time into the phases of PHASES.
+
+    Attributes:
+        seconds (dict): Seconds spent in each phase since the timer was reset.
+    """
+
+    def __init__(self):
+        self.seconds = dict.fromkeys(PHASES, 0.0)
+        self._last = perf_counter()
+
+    def reset(self):
+        """Zero the phase times and start timing from now.
+        """
+        for phase in self.seconds:
+            self.seconds[phase] = 0.0
+        self._last = perf_counter()
+
+    def mark(self, phase: str):
+        """Attribute the time since the previous mark or reset to phase.
+        """
+        now = perf_counter()
+        self.seconds[phase] += now - self._last
+        self._last = now
+
+
+class CallbackList:
+    """Dispatcher of the events of a training loop to its callbacks.
+
+    The phases of a batch are timed only on every n-th batch, n being the greatest common divisor
+    of the sample intervals of the callbacks, or EPOCH_SAMPLE_INTERVAL if none of them asks for
+    batch events. The phase times of an epoch are estimated from the timed batches, while the
+    total time, loss and validation accuracy of an epoch are exact.
+    """
+
+    def __init__(self, callbacks: list, net, validated: bool = False):
+        """Class constructor for the dispatcher.
+
+        Args:
+            callbacks (list): List of Callback.
+            net (Network): Network trained.
+            validated (bool, optional): Whether the training method computes the validation
+            accuracy of every epoch. Defaults to False.
+
+        Raises:
+            ValueError: A callback needs validation accuracies the training does not compute.
+        """
+        self.callbacks = list(callbacks)
+        for callback in self.callbacks:
+            if callback.needs_validation and not validated:
+                raise ValueError(f"{type(callback).__name__} needs validation data")
+        intervals = [c.sample_interval for c in self.callbacks if c.sample_interval]
+        self.sample_interval = gcd(*intervals) if intervals else EPOCH_SAMPLE_INTERVAL
+        self._batch_timer = PhaseTimer()
+        self._epoch_timer = PhaseTimer()
+        self._n_batches = 0
+        self._timed_batches = 0
+        self._start = perf_counter()
+        self._validation_start = self._start
+        for i, callback in enumerate(self.callbacks):
+            try:
+                callback.on_train_begin(net)
+            except BaseException:
+                for started in self.callbacks[:i]:
+                    started.close()
+                raise
+
+    def epoch_begin(self):
+        self._epoch_timer.reset()
+        self._n_batches = 0
+        self._timed_batches = 0
+        self._start = perf_counter()
+
+    def batch_timer(self, batch: int):
+        """Get the timer for the phases of a batch, or None if the batch is not sampled.
+        """
+        self._n_batches += 1
+        if batch % self.sample_interval:
+            return None
+        self._batch_timer.reset()
+        return self._batch_timer
+
+    def batch_end(self, epoch: int, batch: int, n_examples: int, loss: float):
+        phases = self._batch_timer.seconds
+        self._timed_batches += 1
+        for phase, seconds in phases.items():
+            self._epoch_timer.seconds[phase] += seconds
+
+        callbacks = [c for c in self.callbacks
+                     if c.sample_interval and batch % c.sample_interval == 0]
+        if not callbacks:
+            return
+        seconds = sum(phases.values())
+        event = {"event": "batch", "epoch": epoch, "batch": batch, "examples": n_examples,
+                 "loss": float(loss / n_examples), "seconds": seconds,
+                 "examples_per_second": n_examples / seconds if seconds else 0.0}
+        event.update((phase, phases[phase]) for phase in PHASES if phase != "validation")
+        for callback in callbacks:
+            callback.on_batch_end(event)
+
+    def validation_begin(self):
+        self._validation_start = perf_counter()
+
+    def epoch_end(self, epoch: int, n_examples: int, loss: float, validation_accuracy: list):
+        end = perf_counter()
+        validation = end - self._validation_start if validation_accuracy else 0.0
+        training = end - self._start - validation
+        scale = self._n_batches / self._timed_batches if self._timed_batches else 0.0
+
+        event = {"event": "epoch", "epoch": epoch, "examples": n_examples, "loss": float(loss),
+                 "validation_accuracy": validation_accuracy[-1] if validation_accuracy else None,
+                 "seconds": end - self._start,
+                 "examples_per_second": n_examples / training if training else 0.0}
+        event.update((phase, self._epoch_timer.seconds[phase] * scale) for phase in PHASES)
+        event["validation"] = validation
+        for callback in self.callbacks:
+            callback.on_epoch_end(event)
+
+    @property
+    def stop_training(self):
+        """Whether a callback asked to end the training.
+        """
+        return any(callback.stop_training for callback in self.callbacks)
+
+    def train_end(self):
+        for callback in self.callbacks:
+            callback.on_train_end()
+
+    def close(self):
+        """Let every callback release its resources; called however the training ends.
+        """
+        for callback in self.callbacks:
+            callback.close()
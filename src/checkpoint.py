@@ -0,0 +1,416 @@
+import json
+import os
+import queue
+import sys
+import threading
+import numpy as np
+from callbacks import Callback
+from data_handling import get_data
+from network import Network
+from optimizers import OPTIMIZERS
+
+
+# Version of the checkpoint file written by Checkpoint.
+CHECKPOINT_VERSION = 1
+
+# Path of the checkpoint of a training run by default.
+CHECKPOINT_PATH = "neuralnetwork.checkpoint"
+
+# Gradient descent methods of Network a checkpointed run can use.
+METHODS = ("vanilla", "stochastic", "minibatch")
+
+
+class CheckpointWriter:
+    """Background thread writing checkpoint files.
+
+    A file is written next to its path, flushed to disk and renamed over the path only when
+    complete, so a crash during a write leaves the previous checkpoint intact. At most one
+    snapshot waits while another is written; submitting a third blocks until the first is done,
+    which bounds the memory held by the snapshots.
+    """
+
+    def __init__(self):
+        self._queue = queue.Queue(1)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, path: str, arrays: dict, metadata: dict):
+        """Queue a checkpoint to be written.
+
+        Args:
+            path (str): Path of the checkpoint file.
+            arrays (dict): Names mapped to np.ndarray, which must not change after the call.
+            metadata (dict): Description of the checkpoint of plain Python types, see
+            plain_metadata.
+
+        Raises:
+            Exception: Writing an earlier checkpoint failed.
+            RuntimeError: The writer is closed.
+        """
+        self._raise_error()
+        if not self._thread.is_alive():
+            raise RuntimeError("The checkpoint writer is closed")
+        self._queue.put((path, arrays, metadata))
+
+    def close(self):
+        """Wait for the queued checkpoints to be written and stop the thread.
+
+        Raises:
+            Exception: Writing a checkpoint failed.
+        """
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        self._raise_error()
+
+    def _raise_error(self):
+        error, self._error = self._error, None
+        if error is not None:
+            raise error
+
+    def _run(self):
+        while (item := self._queue.get()) is not None:
+            try:
+                write_checkpoint(*item)
+            except Exception as error:  # pylint: disable=broad-exception-caught
+                # The thread keeps draining the queue so submit never blocks; the first
+                # error is raised in the training thread by the next submit or close.
+                if self._error is None:
+                    self._error = error
+
+
+# The run settings saved in every checkpoint and the writer.
+class Checkpoint(Callback):  # pylint: disable=too-many-instance-attributes
+    """Callback saving the state of a training run every interval epochs.
+
+    The parameters, pruning mask, optimizer state, numpy's global random state, the number of
+    epochs done and the loss and validation accuracy of every epoch are copied at the end of the
+    epoch and written by a CheckpointWriter, so the training loop only waits for the copies. The
+    last epoch is always saved, marking the run finished.
+
+    Use train_with_checkpoints to start a checkpointed run and resume to continue one. The
+    callback comes last in the callback list, so the final checkpoint holds the parameters
+    another callback, e.g. EarlyStopping, restored at the end of the training.
+
+    Attributes:
+        path (str): Path of the checkpoint file.
+        run (dict): Training method, batch size, number of epochs and learning rate of the run.
+        optimizer (Optimizer): Optimizer of the run, or None.
+        interval (int): Every how many epochs a checkpoint is written.
+        start_epoch (int): Number of epochs done before the training call.
+        training_loss (list): Mean loss of each epoch done.
+        validation_accuracy (list): Validation accuracy of each epoch done.
+    """
+
+    def __init__(self,
+                 path: str,
+                 run: dict,
+                 optimizer=None,
+                 interval: int = 1,
+                 start_epoch: int = 0,
+                 training_loss: list = None,
+                 validation_accuracy: list = None):
+        """Class constructor for the checkpoint callback.
+
+        Args:
+            path (str): Path of the checkpoint file.
+            run (dict): Training method of METHODS, batch size, number of epochs and learning
+            rate of the run, under the keys "method", "batch_size", "epochs" and "lr".
+            optimizer (Optimizer, optional): Optimizer of the run. Defaults to None.
+            interval (int, optional): Every how many epochs a checkpoint is written. Defaults
+            to 1.
+            start_epoch (int, optional): Number of epochs done before the training call.
+            Defaults to 0.
+            training_loss (list, optional): Mean loss of the epochs done before. Defaults to
+            None.
+            validation_accuracy (list, optional): Validation accuracy of the epochs done before.
+            Defaults to None.
+        """
+        self.path = path
+        self.run = run
+        self.optimizer = optimizer
+        self.interval = interval
+        self.start_epoch = start_epoch
+        self.training_loss = list(training_loss or [])
+        self.validation_accuracy = list(validation_accuracy or [])
+        self._net = None
+        self._writer = None
+
+    def on_train_begin(self, net):
+        self._net = net
+        self._writer = CheckpointWriter()
+
+    def on_epoch_end(self, event: dict):
+        self.training_loss.append(event["loss"])
+        if event["validation_accuracy"] is not None:
+            self.validation_accuracy.append(event["validation_accuracy"])
+        if (self.start_epoch + event["epoch"] + 1) % self.interval == 0:
+            self._save(False)
+
+    def on_train_end(self):
+        self._save(True)
+        self.close()
+
+    def close(self):
+        """Wait for the checkpoints to be written. Called at the end of the training, and by
+        train_with_checkpoints also when the training raises.
+        """
+        if self._writer is not None:
+            writer, self._writer = self._writer, None
+            writer.close()
+
+    def _save(self, finished: bool):
+        net = self._net
+        random_state = np.random.get_state()
+        arrays = {"params": net.params.copy(), "random_keys": random_state[1]}
+        if net.mask is not None:
+            arrays["mask"] = net.mask.copy()
+        metadata = {
+            "version": CHECKPOINT_VERSION,
+            "network": {"layers": net.layers, "output": net.output,
+                        "activations": net.activations},
+            "run": self.run,
+            "epoch": self.start_epoch + len(self.training_loss),
+            "finished": finished,
+            "training_loss": list(self.training_loss),
+            "validation_accuracy": list(self.validation_accuracy),
+            "random_state": {"algorithm": random_state[0], "position": random_state[2],
+                             "has_gauss": random_state[3],
+                             "cached_gaussian": random_state[4]},
+            "optimizer": None,
+        }
+        if self.optimizer is not None:
+            metadata["optimizer"] = {"name": type(self.optimizer).__name__,
+                                     "hyperparameters": self.optimizer.hyperparameters(),
+                                     "steps": self.optimizer.steps}
+            for name, buffer in self.optimizer.state.items():
+                arrays["optimizer_" + name] = buffer.copy()
+        self._writer.submit(self.path, arrays, plain_metadata(metadata))
+
+
+def plain_metadata(metadata: dict):
+    """Convert the numpy scalars and arrays in checkpoint metadata, e.g. a learning rate given
+    as np.float32, into plain Python values, so the metadata is JSON serializable.
+
+    Raises:
+        TypeError: The metadata holds a value that cannot be converted.
+    """
+    def convert(value):
+        if isinstance(value, (np.generic, np.ndarray)):
+            return value.tolist()
+        raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+    return json.loads(json.dumps(metadata, default=convert))
+
+
+def write_checkpoint(path: str, arrays: dict, metadata: dict):
+    """Write a checkpoint file atomically.
+
+    The checkpoint is an .npz archive of the arrays and the JSON metadata. It is written next to
+    path, flushed to disk and renamed over path. If the write fails, the partial file is
+    removed and the previous checkpoint is kept.
+
+    Args:
+        path (str): Path of the checkpoint file.
+        arrays (dict): Names mapped to np.ndarray.
+        metadata (dict): JSON serializable description of the checkpoint.
+    """
+    encoded = np.frombuffer(json.dumps(metadata).encode("utf-8"), np.uint8)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "wb") as file:
+            np.savez(file, metadata=encoded, **arrays)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def load_checkpoint(path: str = CHECKPOINT_PATH):
+    """Read a checkpoint written by Checkpoint.
+
+    Args:
+        path (str, optional): Path of the checkpoint file. Defaults to CHECKPOINT_PATH.
+
+    Raises:
+        ValueError: The checkpoint was written in a newer format or by an unknown optimizer.
+
+    Returns:
+        tuple: Network, Optimizer or None, and dict; the network and optimizer in their saved
+        state, and the metadata of the checkpoint.
+    """
+    with np.load(path) as archive:
+        metadata = json.loads(bytes(archive["metadata"]))
+        if metadata["version"] > CHECKPOINT_VERSION:
+            raise ValueError(f"Unsupported checkpoint version {metadata['version']}")
+        params = np.asarray(archive["params"])
+        mask = archive["mask"] if "mask" in archive.files else None
+        state = {name[len("optimizer_"):]: archive[name] for name in archive.files
+                 if name.startswith("optimizer_")}
+        metadata["random_keys"] = archive["random_keys"]
+
+    layers = metadata["network"]
+    net = Network(layers["layers"], params.dtype, params, layers["output"],
+                  layers["activations"])
+    net.mask = mask
+    optimizer = None
+    if metadata["optimizer"] is not None:
+        classes = {cls.__name__: cls for cls, _ in OPTIMIZERS.values()}
+        name = metadata["optimizer"]["name"]
+        if name not in classes:
+            raise ValueError(f"Unknown optimizer {name}")
+        optimizer = classes[name](**metadata["optimizer"]["hyperparameters"])
+        optimizer.load_state(net.params, state, metadata["optimizer"]["steps"])
+    return net, optimizer, metadata
+
+
+# pylint: disable-next=too-many-arguments,too-many-positional-arguments
+def train_with_checkpoints(net: Network,
+                           training_data,
+                           method: str,
+                           epochs: int,
+                           lr: float,
+                           batch_size: int = None,
+                           validation_data=None,
+                           optimizer=None,
+                           callbacks: list = None,
+                           path: str = CHECKPOINT_PATH,
+                           interval: int = 1):
+    """Train a network with one of its gradient descent methods, writing a checkpoint every
+    interval epochs.
+
+    Args:
+        net (Network): Network to train.
+        training_data (Dataset, list or BatchPipeline): Training data.
+        method (str): Gradient descent method of METHODS.
+        epochs (int): Number of times the data set is iterated through.
+        lr (float): Learning rate.
+        batch_size (int, optional): Number of training examples in one mini batch, used by the
+        minibatch method. Defaults to None.
+        validation_data (Dataset or list, optional): Validation data. Defaults to None.
+        optimizer (Optimizer, optional): Update rule from the optimizers module. Defaults to
+        plain gradient descent.
+        callbacks (list, optional): List of callbacks.Callback; other callbacks of the run.
+        Their state is not checkpointed. Defaults to None.
+        path (str, optional): Path of the checkpoint file. Defaults to CHECKPOINT_PATH.
+        interval (int, optional): Every how many epochs a checkpoint is written. Defaults to 1.
+
+    Raises:
+        ValueError: Unknown method, or no batch size for the minibatch method.
+
+    Returns:
+        tuple: Tuple of list; mean loss and validation accuracy of each epoch.
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown method {method}, expected one of {', '.join(METHODS)}")
+    if method == "minibatch" and batch_size is None:
+        raise ValueError("The minibatch method needs a batch size")
+    run = {"method": method, "batch_size": batch_size, "epochs": epochs, "lr": lr}
+    checkpoint = Checkpoint(path, run, optimizer, interval)
+    return _train(net, training_data, validation_data, callbacks, checkpoint, epochs)
+
+
+def resume(path: str,
+           training_data,
+           validation_data=None,
+           callbacks: list = None,
+           interval: int = 1):
+    """Continue a run of train_with_checkpoints from its checkpoint.
+
+    The network, optimizer and numpy's global random state are restored, so given the same data
+    the remaining epochs are trained exactly as without the interruption. A finished run is not
+    trained further.
+
+    Args:
+        path (str): Path of the checkpoint file.
+        training_data (Dataset, list or BatchPipeline): Training data of the run.
+        validation_data (Dataset or list, optional): Validation data of the run. Defaults to
+        None.
+        callbacks (list, optional): List of callbacks.Callback; other callbacks of the rest of
+        the run. Defaults to None.
+        interval (int, optional): Every how many epochs a checkpoint is written. Defaults to 1.
+
+    Returns:
+        tuple: Network, Optimizer or None, and tuple of list; the trained network and its
+        optimizer, and the mean loss and validation accuracy of every epoch of the run.
+    """
+    net, optimizer, metadata = load_checkpoint(path)
+    random_state = metadata["random_state"]
+    np.random.set_state((random_state["algorithm"], metadata["random_keys"],
+                         random_state["position"], random_state["has_gauss"],
+                         random_state["cached_gaussian"]))
+    histories = metadata["training_loss"], metadata["validation_accuracy"]
+    if metadata["finished"]:
+        return net, optimizer, histories
+
+    run = metadata["run"]
+    checkpoint = Checkpoint(path, run, optimizer, interval, metadata["epoch"], *histories)
+    return net, optimizer, _train(net, training_data, validation_data, callbacks, checkpoint,
+                                  run["epochs"] - metadata["epoch"])
+
+
+# pylint: disable-next=too-many-arguments,too-many-positional-arguments
+def train(net: Network,
+          training_data,
+          method: str,
+          epochs: int,
+          lr: float,
+          batch_size: int = None,
+          validation_data=None,
+          optimizer=None,
+          callbacks: list = None):
+    """Train a network with its gradient descent method named method.
+
+    Args:
+        net (Network): Network to train.
+        training_data (Dataset, list or BatchPipeline): Training data.
+        method (str): Gradient descent method of METHODS.
+        epochs (int): Number of times the data set is iterated through.
+        lr (float): Learning rate.
+        batch_size (int, optional): Number of training examples in one mini batch, used by the
+        minibatch method. Defaults to None.
+        validation_data (Dataset or list, optional): Validation data. Defaults to None.
+        optimizer (Optimizer, optional): Update rule from the optimizers module. Defaults to
+        plain gradient descent.
+        callbacks (list, optional): List of callbacks.Callback. Defaults to None.
+
+    Returns:
+        tuple: Tuple of list; mean loss and validation accuracy of each epoch.
+    """
+    arguments = (epochs, lr, validation_data, callbacks, optimizer)
+    if method == "vanilla":
+        return net.vanilla_gradient_descent(training_data, *arguments)
+    if method == "stochastic":
+        return net.stochastic_gradient_descent(training_data, *arguments)
+    return net.minibatch_gradient_descent(training_data, batch_size, *arguments)
+
+
+def _train(net: Network, training_data, validation_data, callbacks: list,
+           checkpoint: Checkpoint, epochs: int):
+    """Run the training method of a checkpointed run for epochs epochs.
+
+    Returns:
+        tuple: Tuple of list; mean loss and validation accuracy of every epoch of the run.
+    """
+    run = checkpoint.run
+    try:
+        train(net, training_data, run["method"], epochs, run["lr"], run["batch_size"],
+              validation_data, checkpoint.optimizer, list(callbacks or []) + [checkpoint])
+    finally:
+        checkpoint.close()
+    return checkpoint.training_loss, checkpoint.validation_accuracy
+
+
+def main():
+    checkpoint_path = sys.argv[1] if len(sys.argv) > 1 else CHECKPOINT_PATH
+    training, validation, _ = get_data()
+    _, _, (loss, _) = resume(checkpoint_path, training, validation)
+    print(f"Trained {len(loss)} epochs, final training loss {loss[-1]:.4f}")
+
+
+if __name__ == "__main__":
+    main()
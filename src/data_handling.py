@@ -1,46 +1,399 @@
 import gzip
+import hashlib
+import json
+import os
 import pickle
+import queue
+import threading
 import numpy as np
 
 
-def get_data(path: str = "data/mnist.pkl.gz"):
+# Version of the on-disk layout written by build_cache. A cache of any other version is rebuilt.
+CACHE_VERSION = 1
+SPLITS = ("training", "validation", "testing")
+
+# Number of batches a BatchPipeline prepares ahead of the training loop by default.
+PREFETCH_BATCHES = 2
+
+
+class Dataset:
+    """Columnar data set for a neural network of network.Network class.
+
+    The inputs are kept in one contiguous matrix, float32 by default, and the classes in an
+    integer vector.
+    Expected outputs are materialized as one-hot vectors only when asked for, unless the data set
+    was built with explicit expected outputs.
+
+    Attributes:
+        inputs (np.ndarray): Inputs with one example per row.
+        labels (np.ndarray): Integer class of each example.
+        n_classes (int): Length of an expected output vector.
+        targets (np.ndarray): Explicit expected outputs with one example per row or None.
+    """
+
+    def __init__(self, inputs: np.ndarray, labels: np.ndarray, n_classes: int = 10,
+                 targets: np.ndarray = None, dtype=np.float32):
+        """Class constructor for the data set.
+
+        Args:
+            inputs (np.ndarray): Inputs with one example per row.
+            labels (np.ndarray): Integer class of each example.
+            n_classes (int, optional): Number of classes. Defaults to 10.
+            targets (np.ndarray, optional): Expected outputs with one example per row, if they are
+            not one-hot vectors of the labels. Defaults to None.
+            dtype (optional): Floating point precision of the inputs. Inputs already in this
+            precision are not copied. Defaults to np.float32.
+        """
+        self.inputs = np.ascontiguousarray(inputs, dtype=dtype)
+        self.labels = np.asarray(labels, dtype=np.int64)
+        self.n_classes = n_classes
+        self.targets = targets
+
+    @classmethod
+    def from_pairs(cls, data: list, dtype=None):
+        """Build a data set from a list of inputs and expected outputs.
+
+        Args:
+            data (list): List of tuples; tuples of np.ndarray; inputs and expected outputs in
+            format [(x, y), ...].
+            dtype (optional): Floating point precision of the inputs. Defaults to None, which
+            keeps the precision of floating point inputs and uses np.float32 for others.
+
+        Returns:
+            Dataset: The same examples in columnar form.
+        """
+        inputs = np.array([x for x, _ in data], dtype=dtype)
+        if not np.issubdtype(inputs.dtype, np.floating):
+            inputs = inputs.astype(np.float32)
+        dtype = inputs.dtype
+        targets = np.array([y for _, y in data])
+        return cls(inputs, np.argmax(targets, axis=1), targets.shape[1], targets, dtype)
+
+    def __len__(self):
+        return len(self.labels)
+
+    def __getitem__(self, index):
+        """Get one example as a tuple (x, y), or a slice of the data set as a Dataset.
+
+        Slicing does not copy the inputs.
+        """
+        if isinstance(index, slice):
+            targets = None if self.targets is None else self.targets[index]
+            return Dataset(self.inputs[index], self.labels[index], self.n_classes, targets,
+                           self.inputs.dtype)
+        return self.inputs[index], self.expected_outputs(index)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def expected_outputs(self, index=slice(None)):
+        """Get the expected outputs of the examples at index.
+
+        Args:
+            index (optional): Integer, slice or array of indices. Defaults to all examples.
+
+        Returns:
+            np.ndarray: Expected outputs, one example per row.
+        """
+        if self.targets is not None:
+            return self.targets[index]
+        labels = self.labels[index]
+        one_hot = np.zeros(np.shape(labels) + (self.n_classes,))
+        np.put_along_axis(one_hot, np.expand_dims(labels, -1), 1, axis=-1)
+        return one_hot
+
+    def batch(self, index):
+        """Get the inputs and expected outputs of the examples at index.
+
+        Args:
+            index: Slice or array of indices. A slice is returned without copying the inputs.
+
+        Returns:
+            tuple: Tuple of np.ndarray; inputs and expected outputs, one example per row.
+        """
+        return self.inputs[index], self.expected_outputs(index)
+
+
+def as_dataset(data):
+    """Get data as a Dataset.
+
+    Args:
+        data: Dataset or list of tuples; tuples of np.ndarray; inputs and expected outputs.
+
+    Returns:
+        Dataset: The data itself if it already is a Dataset, otherwise a columnar copy of it in
+        the precision of its inputs.
+    """
+    if isinstance(data, Dataset):
+        return data
+    return Dataset.from_pairs(data)
+
+
+class BatchPipeline:
+    """Minibatches of a data set prepared on a background thread.
+
+    An epoch is a chain of generators: the example order is shuffled, split into batches, each
+    example of a batch is passed through the optional transform and the results are stacked into
+    a contiguous Dataset. A background thread runs the chain and keeps at most prefetch batches
+    in a bounded queue, so the next batch is ready when the training loop asks for it.
+
+    The gradient descent methods of network.Network accept a BatchPipeline in place of the
+    training data; the method decides the batch size and whether to shuffle.
+
+    Attributes:
+        data (Dataset): Examples of the pipeline.
+        n_classes (int): Length of an expected output vector.
+        dtype: Floating point precision of the batched inputs.
+        transform (callable): Function mapping an input vector to a new one of the same size, for
+        example to augment the data, or None.
+        prefetch (int): Largest number of batches prepared ahead.
+    """
+
+    def __init__(self, data, transform=None, prefetch: int = PREFETCH_BATCHES):
+        """Class constructor for the pipeline.
+
+        Args:
+            data (Dataset or list): Dataset or list of tuples; tuples of np.ndarray; inputs and
+            expected outputs.
+            transform (callable, optional): Function mapping an input vector to a new one of the
+            same size. Defaults to None.
+            prefetch (int, optional): Largest number of batches prepared ahead. Defaults to
+            PREFETCH_BATCHES.
+        """
+        self.data = as_dataset(data)
+        self.n_classes = self.data.n_classes
+        self.dtype = self.data.inputs.dtype
+        self.transform = transform
+        self.prefetch = prefetch
+        self._order = np.arange(len(self.data))
+
+    def __len__(self):
+        return len(self.data)
+
+    def epoch(self, batch_size: int, shuffle: bool = True):
+        """Iterate over the batches of one pass through the data.
+
+        The order is drawn from numpy's global random state in the calling thread, like Network
+        shuffles a Dataset, so a pipeline without a transform sees the examples in the same order
+        under the same seed.
+
+        Args:
+            batch_size (int): Number of examples in a batch; the last batch may be smaller.
+            shuffle (bool, optional): Shuffle the examples. Defaults to True.
+
+        Yields:
+            tuple: Dataset and np.ndarray; the stacked batch and the indices of all its examples.
+        """
+        batches = self._batches(batch_size, shuffle)
+        ready = queue.Queue(self.prefetch)
+        stop = threading.Event()
+        producer = threading.Thread(target=self._produce, args=(batches, ready, stop),
+                                    daemon=True)
+        producer.start()
+        try:
+            while (item := ready.get()) is not None:
+                if isinstance(item, BaseException):
+                    raise item
+                yield item, np.arange(len(item))
+        finally:
+            stop.set()
+            producer.join()
+
+    def _batches(self, batch_size: int, shuffle: bool):
+        """Get the generator chain of one epoch. Runs in the calling thread, the generators in
+        the producer thread.
+        """
+        if shuffle:
+            self._order = np.random.permutation(len(self.data))
+        return self._stack(self._transform(self._batch(self._order, batch_size)))
+
+    def _batch(self, order: np.ndarray, batch_size: int):
+        data = self.data
+        for i in range(0, len(order), batch_size):
+            index = order[i:i + batch_size]
+            targets = None if data.targets is None else data.targets[index]
+            yield data.inputs[index], data.labels[index], targets
+
+    def _transform(self, batches):
+        for inputs, labels, targets in batches:
+            if self.transform is not None:
+                inputs = np.stack([self.transform(x) for x in inputs])
+            yield inputs, labels, targets
+
+    def _stack(self, batches):
+        for inputs, labels, targets in batches:
+            yield Dataset(inputs, labels, self.n_classes, targets, self.dtype)
+
+    @staticmethod
+    def _produce(batches, ready: queue.Queue, stop: threading.Event):
+        try:
+            for item in batches:
+                BatchPipeline._put(item, ready, stop)
+                if stop.is_set():
+                    return
+        except Exception as error:  # pylint: disable=broad-exception-caught
+            # Raised again in the consuming thread by epoch.
+            BatchPipeline._put(error, ready, stop)
+            return
+        BatchPipeline._put(None, ready, stop)
+
+    @staticmethod
+    def _put(item, ready: queue.Queue, stop: threading.Event):
+        while not stop.is_set():
+            try:
+                ready.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+
+def get_data(path: str = "data/mnist.pkl.gz", cache: bool = True, dtype=np.float32):
     """Get training, validation and testing data from the mnist data set.
 
-    Format compatible with training a neural network of network.Network class.
+    Format compatible with training a neural network of network.Network class. By default the
+    decoded arrays are cached next to the source file and memory-mapped on later calls, see
+    load_cache.
 
     Args:
         path (str, optional): Path to mnist. Defaults to "data/mnist.pkl.gz".
+        cache (bool, optional): Use the memory-mapped cache. Defaults to True.
+        dtype (optional): Floating point precision of the inputs. Defaults to np.float32.
 
     Returns:
-        tuple: Tuple of three lists; list of tuple; tuple of np.ndarray; Inputs and expected outputs
-        in format [(x, y), ...], ...
+        tuple: Tuple of three Dataset; training, validation and testing data.
     """
+    if cache:
+        return load_cache(path, dtype)
+
     with gzip.open(path) as file:
         tr_data, va_data, te_data = pickle.load(file, encoding="latin1")
 
     training_data, validation_data, testing_data = data_converter(
-        tr_data, va_data, te_data)
+        tr_data, va_data, te_data, dtype)
     return training_data, validation_data, testing_data
 
 
-def data_converter(training_data, validation_data, testing_data):
-    """Convert data into the format suitable for a neural network of network.Network class.
+def cache_directory(path: str):
+    """Get the directory of the cache of the data set at path.
+    """
+    return path + ".cache"
+
+
+def load_cache(path: str = "data/mnist.pkl.gz", dtype=np.float32):
+    """Get the mnist data set from its memory-mapped cache, building the cache first if needed.
+
+    The arrays are opened read-only with np.memmap, so loading takes only milliseconds and
+    processes using the same cache share one copy of the data in the page cache. The cache is
+    stored in float32; any other precision is a private copy.
+
+    Args:
+        path (str, optional): Path to mnist. Defaults to "data/mnist.pkl.gz".
+        dtype (optional): Floating point precision of the inputs. Defaults to np.float32.
+
+    Returns:
+        tuple: Tuple of three Dataset; training, validation and testing data.
+    """
+    directory = cache_directory(path)
+    if not _cache_is_valid(path, directory):
+        build_cache(path)
+
+    training, validation, testing = (
+        Dataset(np.load(os.path.join(directory, f"{split}_inputs.npy"), mmap_mode="r"),
+                np.load(os.path.join(directory, f"{split}_labels.npy"), mmap_mode="r"),
+                dtype=dtype)
+        for split in SPLITS)
+    return training, validation, testing
+
+
+def build_cache(path: str = "data/mnist.pkl.gz"):
+    """Decode the mnist data set once and write it to an uncompressed cache.
+
+    The cache is a directory of .npy files and a header.json holding the cache version and the
+    size, modification time and sha256 checksum of the source file. The header is written last,
+    so an interrupted build leaves no valid cache behind.
+
+    Args:
+        path (str, optional): Path to mnist. Defaults to "data/mnist.pkl.gz".
     """
-    training_data_list, validation_data_list, testing_data_list = [], [], []
+    with gzip.open(path) as file:
+        splits = pickle.load(file, encoding="latin1")
+
+    directory = cache_directory(path)
+    os.makedirs(directory, exist_ok=True)
+
+    for split, (inputs, labels) in zip(SPLITS, splits):
+        _atomic_save(os.path.join(directory, f"{split}_inputs.npy"),
+                     np.ascontiguousarray(inputs, dtype=np.float32))
+        _atomic_save(os.path.join(directory, f"{split}_labels.npy"),
+                     np.asarray(labels, dtype=np.int64))
+
+    header = _source_fingerprint(path)
+    header["version"] = CACHE_VERSION
+    header["sha256"] = _sha256(path)
+    _atomic_write_header(directory, header)
+
+
+def _cache_is_valid(path: str, directory: str):
+    """Check that the cache exists, is of the current version and was built from the file at
+    path. A changed modification time alone does not invalidate the cache if the checksum still
+    matches.
+    """
+    try:
+        with open(os.path.join(directory, "header.json"), encoding="utf-8") as file:
+            header = json.load(file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return False
+
+    if header.get("version") != CACHE_VERSION:
+        return False
+
+    fingerprint = _source_fingerprint(path)
+    if all(header.get(key) == value for key, value in fingerprint.items()):
+        return True
+    if header.get("size") != fingerprint["size"] or header.get("sha256") != _sha256(path):
+        return False
+
+    header.update(fingerprint)
+    _atomic_write_header(directory, header)
+    return True
 
-    for inputs, expected_ouput in zip(training_data[0], training_data[1]):
-        expected_ouput = output_converter(expected_ouput)
-        training_data_list.append((inputs, expected_ouput))
 
-    for inputs, expected_ouput in zip(validation_data[0], validation_data[1]):
-        expected_ouput = output_converter(expected_ouput)
-        validation_data_list.append((inputs, expected_ouput))
+def _source_fingerprint(path: str):
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
 
-    for inputs, expected_ouput in zip(testing_data[0], testing_data[1]):
-        expected_ouput = output_converter(expected_ouput)
-        testing_data_list.append((inputs, expected_ouput))
 
-    return training_data_list, validation_data_list, testing_data_list
+def _sha256(path: str):
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _atomic_save(path: str, array: np.ndarray):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as file:
+        np.save(file, array)
+    os.replace(tmp_path, path)
+
+
+def _atomic_write_header(directory: str, header: dict):
+    path = os.path.join(directory, "header.json")
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as file:
+        json.dump(header, file)
+    os.replace(tmp_path, path)
+
+
+def data_converter(training_data, validation_data, testing_data, dtype=np.float32):
+    """Convert data into the format suitable for a neural network of network.Network class.
+    """
+    training_dataset = Dataset(training_data[0], training_data[1], dtype=dtype)
+    validation_dataset = Dataset(validation_data[0], validation_data[1], dtype=dtype)
+    testing_dataset = Dataset(testing_data[0], testing_data[1], dtype=dtype)
+    return training_dataset, validation_dataset, testing_dataset
 
 
 def output_converter(y: int):
@@ -49,33 +402,26 @@ def output_converter(y: int):
     return np.array([0 if i != y else 1 for i in range(9 + 1)])
 
 
-def get_test_data(path: str = "data/mnist.pkl.gz"):
+def get_test_data(path: str = "data/mnist.pkl.gz", dtype=np.float32):
     """Get data for automated tests from the mnist data set.
 
     Args:
         path (str, optional): Path to mnist. Defaults to "data/mnist.pkl.gz".
+        dtype (optional): Floating point precision of the inputs. Defaults to np.float32.
 
     Returns:
-        list: List of tuples; tuples of np.ndarray; Inputs and expected outputs in format
-        [(x, y), ...]. Consists only of ones and twos.
+        Dataset: Consists only of 100 ones and twos.
     """
-    with gzip.open(path) as file:
-        _, data, _ = pickle.load(file, encoding="latin1")
-
-    test_data = test_data_converter(data)
+    _, validation_data, _ = load_cache(path)
+    test_data = test_data_converter((validation_data.inputs, validation_data.labels), dtype)
     return test_data
 
 
-def test_data_converter(data):
+def test_data_converter(data, dtype=np.float32):
     """Convert test data into the format suitable for a neural network of network.Network class.
 
-    Returns a list of length 100 consisting only of ones and twos of the mnist data set.
+    Returns a data set of length 100 consisting only of ones and twos of the mnist data set.
     """
-    test_data = []
-    for x, y in zip(data[0], data[1]):
-        if y in (1, 2):
-            y = output_converter(y)
-            test_data.append((x, y))
-        if len(test_data) > 99:
-            break
-    return test_data
+    inputs, labels = data
+    index = np.flatnonzero(np.isin(labels, (1, 2)))[:100]
+    return Dataset(inputs[index], labels[index], dtype=dtype)
@@ -0,0 +1,319 @@
+import argparse
+import asyncio
+import json
+from collections import deque
+from contextlib import suppress
+from time import perf_counter
+import numpy as np
+from data_handling import get_data
+from network import Network, load
+
+
+class ServerStats:
+    """Latency and throughput counters of an InferenceServer.
+
+    Attributes:
+        requests (int): Number of requests answered.
+        batches (int): Number of batched forward passes run.
+        latencies (deque): Seconds from arrival to answer of the latest requests.
+    """
+
+    def __init__(self, window: int = 10000):
+        """Class constructor for the counters.
+
+        Args:
+            window (int, optional): Number of latest latencies kept. Defaults to 10000.
+        """
+        self.requests = 0
+        self.batches = 0
+        self.latencies = deque(maxlen=window)
+        self._start = perf_counter()
+
+    def record_batch(self, latencies: list):
+        self.batches += 1
+        self.requests += len(latencies)
+        self.latencies.extend(latencies)
+
+    def snapshot(self):
+        """Get the counters as a dictionary.
+
+        Returns:
+            dict: Requests, batches, mean batch size, requests per second since the server
+            started, and median and 99th percentile latency in milliseconds.
+        """
+        latencies = np.array(self.latencies) * 1000
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "mean_batch_size": self.requests / self.batches if self.batches else 0,
+            "requests_per_second": self.requests / (perf_counter() - self._start),
+            "p50_latency_ms": float(np.percentile(latencies, 50)) if len(latencies) else 0,
+            "p99_latency_ms": float(np.percentile(latencies, 99)) if len(latencies) else 0,
+        }
+
+
+class InferenceServer:
+    """Micro-batching classification service for a neural network.
+
+    Requests are queued and coalesced into batches of at most max_batch_size inputs, waiting at
+    most max_wait seconds for a batch to fill. Each batch is one matrix forward pass, run in a
+    worker thread so the event loop keeps accepting requests meanwhile.
+
+    The TCP front end reads one JSON object per line: {"input": [...]} is answered with
+    {"class": ..., "output": [...]} and {"stats": true} with the counters of ServerStats. An "id"
+    field of a request is echoed back.
+
+    Attributes:
+        net (Network): Network serving the requests.
+        max_batch_size (int): Largest number of inputs in one forward pass.
+        max_wait (float): Longest time in seconds a batch waits for more requests.
+        stats (ServerStats): Latency and throughput counters.
+    """
+
+    def __init__(self, net: Network, max_batch_size: int = 64, max_wait: float = 0.002):
+        """Class constructor for the inference server.
+
+        Args:
+            net (Network): Network serving the requests.
+            max_batch_size (int, optional): Largest number of inputs in one forward pass.
+            Defaults to 64.
+            max_wait (float, optional): Longest time in seconds a batch waits for more requests.
+            Defaults to 0.002.
+        """
+        self.net = net
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.stats = ServerStats()
+        self._queue = None
+        self._batcher = None
+        self._server = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0):
+        """Start batching and listening for connections.
+
+        Args:
+            host (str, optional): Address to listen on. Defaults to "127.0.0.1".
+            port (int, optional): Port to listen on, 0 for any free port. Defaults to 0.
+
+        Returns:
+            int: Port the server listens on.
+        """
+        self._queue = asyncio.Queue()
+        self._batcher = asyncio.create_task(self._run_batches())
+        self._server = await asyncio.start_server(self._handle_connection, host, port)
+        return self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        """Stop listening and batching.
+        """
+        self._server.close()
+        await self._server.wait_closed()
+        self._batcher.cancel()
+        try:
+            await self._batcher
+        except asyncio.CancelledError:
+            pass
+
+    async def classify(self, x: np.ndarray):
+        """Get the output layer activation of the network for one input.
+
+        Args:
+            x (np.ndarray): Input for the neural network.
+
+        Returns:
+            np.ndarray: Output layer activation.
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((x, future, perf_counter()))
+        return await future
+
+    # The batching loop reads best in one piece.
+    # pylint: disable-next=too-many-statements
+    async def _run_batches(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            try:
+                inputs = np.array([x for x, _, _ in batch]).transpose()
+                outputs = await loop.run_in_executor(None, self.net.evaluate, inputs)
+            except Exception as error:  # pylint: disable=broad-exception-caught
+                # The failure is passed to the requests of this batch only; the batcher must
+                # keep running or every later request would wait forever.
+                for _, future, _ in batch:
+                    if not future.cancelled():
+                        future.set_exception(error)
+                continue
+
+            done = perf_counter()
+            for i, (_, future, arrival) in enumerate(batch):
+                if not future.cancelled():
+                    future.set_result(outputs[:, i])
+            self.stats.record_batch([done - arrival for _, _, arrival in batch])
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while line := await reader.readline():
+                response = await self._respond(line)
+                writer.write(json.dumps(response).encode("utf-8") + b"\n")
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+            with suppress(ConnectionError):
+                await writer.wait_closed()
+
+    async def _respond(self, line: bytes):
+        """Answer one request line. A malformed request, or one whose evaluation fails, is
+        answered with an error message, so the connection stays usable.
+
+        Args:
+            line (bytes): JSON object of the request.
+
+        Returns:
+            dict: Response to be sent back.
+        """
+        try:
+            request = json.loads(line)
+        except ValueError:
+            return {"error": "request must be a JSON object"}
+        if not isinstance(request, dict):
+            return {"error": "request must be a JSON object"}
+
+        if request.get("stats"):
+            response = self.stats.snapshot()
+        elif "input" not in request:
+            response = {"error": 'request must have an "input" or "stats" key'}
+        else:
+            response = await self._classify_request(request["input"])
+        if "id" in request:
+            response["id"] = request["id"]
+        return response
+
+    async def _classify_request(self, values):
+        try:
+            x = np.array(values, self.net.dtype)
+        except (TypeError, ValueError):
+            x = None
+        if x is None or x.shape != (self.net.n_inputs,):
+            return {"error": f"input must be a list of {self.net.n_inputs} numbers"}
+        try:
+            output = await self.classify(x)
+        except Exception as error:  # pylint: disable=broad-exception-caught
+            return {"error": f"evaluation failed: {error}"}
+        return {"class": int(np.argmax(output)), "output": output.tolist()}
+
+
+async def request_stats(host: str, port: int):
+    """Get the counters of a running server.
+
+    Args:
+        host (str): Address of the server.
+        port (int): Port of the server.
+
+    Returns:
+        dict: Counters of the server, see ServerStats.snapshot.
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(b'{"stats": true}\n')
+    response = json.loads(await reader.readline())
+    writer.close()
+    await writer.wait_closed()
+    return response
+
+
+async def generate_load(host: str, port: int, inputs: np.ndarray, n_requests: int,
+                        concurrency: int):
+    """Send classification requests to a server from concurrent connections.
+
+    Args:
+        host (str): Address of the server.
+        port (int): Port of the server.
+        inputs (np.ndarray): Inputs sent, one per row, cycled through.
+        n_requests (int): Total number of requests.
+        concurrency (int): Number of connections sending requests at the same time.
+
+    Returns:
+        tuple: np.ndarray and dict; predicted class of each request in order, and the requests
+        per second and median and 99th percentile latency in milliseconds seen by the client.
+    """
+    classes = np.empty(n_requests, dtype=np.int64)
+    latencies = np.empty(n_requests)
+    encoded = [json.dumps({"input": x.tolist()}).encode("utf-8") + b"\n" for x in inputs]
+
+    async def client(requests: range):
+        reader, writer = await asyncio.open_connection(host, port)
+        for i in requests:
+            start = perf_counter()
+            writer.write(encoded[i % len(encoded)])
+            await writer.drain()
+            classes[i] = json.loads(await reader.readline())["class"]
+            latencies[i] = perf_counter() - start
+        writer.close()
+        await writer.wait_closed()
+
+    start = perf_counter()
+    await asyncio.gather(*(client(range(i, n_requests, concurrency))
+                           for i in range(concurrency)))
+    seconds = perf_counter() - start
+    return classes, {
+        "requests_per_second": n_requests / seconds,
+        "p50_latency_ms": float(np.percentile(latencies, 50) * 1000),
+        "p99_latency_ms": float(np.percentile(latencies, 99) * 1000),
+    }
+
+
+async def _serve(args):
+    server = InferenceServer(load(args.model, mmap_mode="r"), args.max_batch_size, args.max_wait)
+    port = await server.start(args.host, args.port)
+    print(f"Serving {args.model} on {args.host}:{port}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+
+async def _load(args):
+    _, _, testing_data = get_data()
+    _, client_stats = await generate_load(args.host, args.port, testing_data.inputs,
+                                          args.requests, args.concurrency)
+    print("Client:", client_stats)
+    print("Server:", await request_stats(args.host, args.port))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-batching inference server.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve = commands.add_parser("serve", help="Serve a saved network.")
+    serve.add_argument("--model", default="neuralnetwork")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8765)
+    serve.add_argument("--max-batch-size", type=int, default=64)
+    serve.add_argument("--max-wait", type=float, default=0.002)
+
+    load_generator = commands.add_parser("load", help="Send requests from the mnist test set.")
+    load_generator.add_argument("--host", default="127.0.0.1")
+    load_generator.add_argument("--port", type=int, default=8765)
+    load_generator.add_argument("--requests", type=int, default=10000)
+    load_generator.add_argument("--concurrency", type=int, default=64)
+
+    args = parser.parse_args()
+    asyncio.run(_serve(args) if args.command == "serve" else _load(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,57 +1,160 @@
+import json
+import os
 import pickle
+import struct
+from functools import partial
 from math import sqrt
-from random import shuffle
 import numpy as np
-
-
-class Network:
+from activations import (ACTIVATION_FUNCTIONS, ACTIVATIONS, OUTPUTS, sigmoid,
+                         sigmoid_derivative, softmax)
+from callbacks import CallbackList
+from data_handling import BatchPipeline, as_dataset
+from workspace import Workspace, _layer_views, _n_params
+
+
+# Layers of the neural network that is created by default.
+DEFAULT_LAYERS = [784, 16, 16, 10]
+# Number of examples fed through the network at once when evaluating a whole data set.
+EVALUATION_CHUNK_SIZE = 1000
+# Largest number of examples whose gradient is computed at once while training. Larger batches
+# are processed in chunks so that the workspace stays small.
+GRADIENT_CHUNK_SIZE = 1000
+# Number of workspaces of different batch sizes a network keeps at a time.
+MAX_WORKSPACES = 4
+# First bytes of a network saved in the binary model format.
+MODEL_MAGIC = b"ALGONN\x00\x00"
+# Version of the binary model format written by save.
+MODEL_VERSION = 1
+# Byte boundary the parameter blocks of a saved network start at.
+MODEL_ALIGNMENT = 64
+
+
+# The parameter buffer and its weight and bias views are attributes besides the architecture.
+class Network:  # pylint: disable=too-many-instance-attributes
     """Neural network class.
 
     Approximates arbitrary functions by learning from training data with gradient descent.
-    Uses the sigmoid activation function and squared error.
+    Each hidden layer has its own activation function, sigmoid by default. The output layer is
+    either sigmoid trained with squared error or softmax trained with cross-entropy.
 
     Attributes:
         n_inputs (int): Length of the array the network takes as input. 
         n_layers (int): Number of layers of the network.
-        weights (list): List of np.ndarray; weight arrays.
-        biases (list): List of np.ndarray; bias arrays.
+        layers (list): List of integers; lengths of the layers.
+        params (np.ndarray): All the weights and biases in one contiguous buffer, layer by layer.
+        weights (list): List of np.ndarray; weight arrays, views into params.
+        biases (list): List of np.ndarray; bias arrays, views into params.
+        dtype (np.dtype): Floating point precision of the parameters and of all the computation.
+        output (str): Output layer, "sigmoid" or "softmax".
+        activations (list): List of str; activation function of each hidden layer.
+        mask (np.ndarray): Pruning mask laid out like params, 1 for kept and 0 for pruned
+        parameters, reapplied after every update; None if the network is not pruned.
     """
 
-    def __init__(self, layers: list):
+    def __init__(self, layers: list, dtype=np.float64, params: np.ndarray = None,
+                 output: str = "sigmoid", activations="sigmoid"):
         """Class constructor for the neural network.
 
         Args:
             layers (list): List of integers; Lengths of the input layer, hidden layers and the
             output layer.
+            dtype (optional): Floating point precision, np.float32 or np.float64. Defaults to
+            np.float64.
+            params (np.ndarray, optional): Flat buffer of trained weights and biases to use
+            instead of initializing new ones, see set_params. Defaults to None.
+            output (str, optional): Output layer, "sigmoid" with squared error or "softmax" with
+            cross-entropy. Defaults to "sigmoid".
+            activations (str or list, optional): Activation function of every hidden layer, or a
+            list with one per hidden layer, from ACTIVATIONS. The weights of ReLU layers are
+            initialized with He initialization and the others with Glorot initialization.
+            Defaults to "sigmoid".
+
+        Raises:
+            ValueError: Unknown output layer or activation function, or the wrong number of
+            activation functions.
         """
+        activations = _checked_activations(layers, output, activations)
         self.n_inputs = layers[0]
         self.n_layers = len(layers)
-        self.weights = []
-        self.biases = []
+        self.layers = list(layers)
+        self.dtype = np.dtype(dtype)
+        self.output = output
+        self.activations = list(activations)
+        self.mask = None
+        self._workspaces = {}
+
+        if params is not None:
+            self.set_params(params)
+            return
 
-        for i in range(1, self.n_layers):
-            weights = _glorot(layers[i - 1], layers[i])
-            self.weights.append(weights)
+        self.set_params(np.zeros(_n_params(self.layers), self.dtype))
+        for i, (weights, activation) in enumerate(zip(self.weights, self.activations + [output])):
+            initializer = _he if activation in ("relu", "leaky_relu") else _glorot
+            weights[...] = initializer(layers[i], layers[i + 1])
 
-            biases = np.zeros(layers[i])
-            self.biases.append(biases)
+    def set_params(self, params: np.ndarray):
+        """Use params as the parameter buffer of the network without copying it.
 
-    def feed_forward(self, x: np.ndarray):
+        The buffer may for example be shared memory or a memory-mapped file.
+
+        Args:
+            params (np.ndarray): Flat buffer of all weights and biases, layer by layer.
+        """
+        self.params = params
+        self.weights, self.biases = _layer_views(params, self.layers)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["weights"], state["biases"], state["_workspaces"]
+        return state
+
+    def __setstate__(self, state: dict):
+        if "params" not in state:
+            # Networks pickled before the parameter buffer existed.
+            state["layers"] = [state["n_inputs"]] + [len(b) for b in state["biases"]]
+            state["params"] = np.concatenate(
+                [p.ravel() for pair in zip(state.pop("weights"), state.pop("biases"))
+                 for p in pair])
+        state.setdefault("dtype", state["params"].dtype)
+        state.setdefault("output", "sigmoid")
+        state.setdefault("activations", ["sigmoid"] * (len(state["layers"]) - 2))
+        state.setdefault("mask", None)
+        self.__dict__.update(state)
+        self.set_params(self.params)
+        self._workspaces = {}
+
+    def feed_forward(self, x: np.ndarray, out: list = None, scratch: list = None):
         """Get all activations of the neural network with input x.
 
         Args:
-            x (np.ndarray): Input for the neural network.
+            x (np.ndarray): Input for the neural network; a single input vector or a matrix with
+            one input per column.
+            out (list, optional): List of np.ndarray; preallocated arrays the activations are
+            written into. Defaults to None.
+            scratch (list, optional): List of np.ndarray; preallocated arrays shaped like the
+            activations for the weighted sums of a matrix input. Defaults to None.
 
         Returns:
-            list: List of np.ndarray; activations of each layer of the neural network.
+            list: List of np.ndarray; activations of each layer of the neural network. Shaped
+            like x, one row per neuron.
         """
-        activations = []
-        for w, b in zip(self.weights, self.biases):
-            z = np.dot(w, x) + b
-            a = _sigmoid(z)
-            activations.append(a)
+        x = self._cast(x)
+        if out is None:
+            out = [np.empty((len(b),) + x.shape[1:], self.dtype) for b in self.biases]
+
+        for i, (w, b, a) in enumerate(zip(self.weights, self.biases, out)):
+            if a.ndim == 1:
+                np.dot(w, x, out=a)
+                a += b
+            else:
+                # Broadcasting the bias in place makes NumPy buffer the operation, copying it
+                # does not.
+                z = np.dot(w, x) if scratch is None else np.dot(w, x, out=scratch[i])
+                np.copyto(a, b[:, np.newaxis])
+                a += z
+            activate(a, i, self.activations, self.output, None if scratch is None else scratch[i])
             x = a
-        return activations
+        return out
 
     def evaluate(self, x: np.ndarray):
         """Get the activation of the neural network with input x.
@@ -64,49 +167,72 @@ class Network:
         """
         return self.feed_forward(x)[-1]
 
-    def _loss(self, a: np.ndarray, a_hat: np.ndarray):
-        """Quadratic loss function.
+    def _loss(self, a: np.ndarray, a_hat: np.ndarray, scratch: np.ndarray = None):
+        """Loss function; squared error for a sigmoid output layer, cross-entropy for softmax.
 
         Args:
-            a (np.ndarray): Output.
+            a (np.ndarray): Output; a single output vector or a matrix with one output per column.
             a_hat (np.ndarray): Expected output.
+            scratch (np.ndarray, optional): Preallocated array shaped like a for the error or the
+            logarithms of the outputs.
+            Defaults to None.
 
         Returns:
-            np.float64: Loss value.
+            np.float64: Loss value summed over all the columns.
         """
-        return np.sum((a - a_hat) ** 2)
-
-    def _backward_pass(self, activations: list, a_hat: np.ndarray):
+        if self.output == "softmax":
+            # Outputs that underflowed to zero would give an infinite loss.
+            log_a = np.maximum(a, np.finfo(a.dtype).tiny, out=scratch)
+            np.log(log_a, out=log_a)
+            return -np.float64(np.vdot(a_hat, log_a))
+        if scratch is None:
+            return np.sum((a - a_hat) ** 2, dtype=np.float64)
+        np.subtract(a, a_hat, out=scratch)
+        return np.float64(np.vdot(scratch, scratch))
+
+    def _backward_pass(self, activations: list, a_hat: np.ndarray, out: list = None,
+                       scratch: list = None):
         """Get all delta values for calculating the gradient w.r.t each weight and bias.
 
+        Works both for a single example and for a batch with one example per column.
+
         Args:
             activations (list): List of np.ndarray; activations of each layer of the network by the
             feed_forward-method.
             a_hat (np.ndarray): Desired output.
+            out (list, optional): List of np.ndarray; preallocated arrays shaped like the
+            activations the deltas are written into. Defaults to None.
+            scratch (list, optional): List of np.ndarray; preallocated arrays shaped like the
+            activations for the activation function derivatives. Defaults to None.
 
         Returns:
             list: List of np.ndarray; all delta values.
         """
-        delta_l = []
+        if out is None:
+            out = [np.empty_like(a) for a in activations]
+        if scratch is None:
+            scratch = [np.empty_like(a) for a in activations]
 
         a = activations[-1]
-        delta_u = 2 * (a - a_hat) * a * (1 - a)
-        delta_l.append(delta_u)
-
-        for i in range(self.n_layers - 2, 0, -1):
-            a = activations[i - 1]
-            w = self.weights[i]
-            d = delta_l[-1]
-            sigmoid_derivative = a * (1 - a)
-            delta_weight_sums = np.dot(w.transpose(), d)
-            this_layer_delta = sigmoid_derivative * delta_weight_sums
-            delta_l.append(this_layer_delta)
-        delta_l.reverse()
-        return delta_l
+        np.subtract(a, a_hat, out=out[-1])
+        if self.output == "sigmoid":
+            out[-1] *= 2
+            out[-1] *= sigmoid_derivative(a, out=scratch[-1])
+        # For softmax with cross-entropy the Jacobian of the softmax cancels against the
+        # derivative of the loss, leaving a - a_hat.
+
+        for i in range(self.n_layers - 3, -1, -1):
+            np.dot(self.weights[i + 1].transpose(), out[i + 1], out=out[i])
+            derivative = ACTIVATION_FUNCTIONS[self.activations[i]][1]
+            out[i] *= derivative(activations[i], out=scratch[i])
+        return out
 
     def _gradient_calculation(self, x: np.ndarray, a_hat: np.ndarray):
         """Get the gradient with respect to each weight and bias in the network.
 
+        If x is a matrix with one example per column, the gradient and the loss are summed over
+        the examples with a single matrix product per layer.
+
         Args:
             x (np.ndarray): Input.
             a_hat (np.ndarray): Expected output.
@@ -114,265 +240,697 @@ class Network:
         Returns:
             tuple: Two lists and np.float64; gradient w.r.t the weights and biases, loss.
         """
-        activations = self.feed_forward(x)
-        loss = self._loss(activations[-1], a_hat)
-        deltas = self._backward_pass(activations, a_hat)
-        weight_derivatives = []
+        gradient = np.empty_like(self.params)
+        loss = self._gradient_into(x, a_hat, gradient)
+        weight_derivatives, bias_derivatives = _layer_views(gradient, self.layers)
+        return weight_derivatives, bias_derivatives, loss
+
+    def _gradient_into(self, x: np.ndarray, a_hat: np.ndarray, gradient: np.ndarray,
+                       workspace=None, timer=None):
+        """Write the gradient with respect to each weight and bias into a flat buffer laid out
+        like params.
+
+        Args:
+            x (np.ndarray): Input; a single input vector or a matrix with one input per column.
+            a_hat (np.ndarray): Expected output.
+            gradient (np.ndarray): Flat buffer for the gradient.
+            workspace (Workspace, optional): Preallocated buffers for a batch of x's size. Without
+            one, the intermediate arrays are allocated. Defaults to None.
+            timer (PhaseTimer, optional): Timer for the forward and backward phases. Defaults to
+            None.
 
-        for delta, acts in zip(deltas, [x] + activations):
-            delta = delta.reshape((len(delta), 1))
-            weight_derivatives.append(delta * acts)
-        return weight_derivatives, deltas, loss
+        Returns:
+            np.float64: Loss.
+        """
+        x = self._cast(x)
+        if workspace is None:
+            activations = self.feed_forward(x)
+            loss = self._loss(activations[-1], a_hat)
+            deltas = self._backward_pass(activations, a_hat)
+        else:
+            activations = self.feed_forward(x, workspace.activations, workspace.scratch)
+            loss = self._loss(activations[-1], a_hat, workspace.scratch[-1])
+            if timer is not None:
+                timer.mark("forward")
+            deltas = self._backward_pass(
+                activations, a_hat, workspace.deltas, workspace.scratch)
+        self._write_derivatives([x] + activations, deltas, gradient, workspace)
+        if timer is not None:
+            timer.mark("backward")
+        return loss
+
+    def _write_derivatives(self, inputs: list, deltas: list, gradient: np.ndarray,
+                           workspace=None):
+        """Write the weight and bias derivatives of each layer into a flat buffer laid out like
+        params, given the inputs and delta values of each layer.
+        """
+        weight_derivatives, bias_derivatives = _layer_views(gradient, self.layers)
+        for delta, acts, wd, bd in zip(deltas, inputs, weight_derivatives, bias_derivatives):
+            if delta.ndim == 1:
+                np.outer(delta, acts, out=wd)
+                bd[...] = delta
+            elif workspace is None:
+                np.dot(delta, acts.transpose(), out=wd)
+                np.sum(delta, axis=1, out=bd)
+            else:
+                np.dot(delta, acts.transpose(), out=wd)
+                np.dot(delta, workspace.ones, out=bd)
+
+    def _batch_gradient(self, data, index: np.ndarray, gradient: np.ndarray, timer=None):
+        """Write the gradient summed over the examples of data at index into a flat buffer.
+
+        The batch is processed GRADIENT_CHUNK_SIZE examples at a time in preallocated workspaces,
+        so a training step allocates no new arrays.
+
+        Args:
+            data (Dataset): Training data.
+            index (np.ndarray): Indices of the examples of the batch.
+            gradient (np.ndarray): Flat buffer for the gradient, laid out like params.
+            timer (PhaseTimer, optional): Timer for the data, forward and backward phases.
+            Defaults to None.
+
+        Returns:
+            np.float64: Loss summed over the batch.
+        """
+        loss = 0
+        for i in range(0, len(index), GRADIENT_CHUNK_SIZE):
+            chunk = index[i:i + GRADIENT_CHUNK_SIZE]
+            workspace = self._workspace(len(chunk))
+            workspace.load(data, chunk)
+            if timer is not None:
+                timer.mark("data")
+            target = gradient if i == 0 else workspace.partial_gradient
+            loss += self._gradient_into(workspace.inputs.transpose(),
+                                        workspace.expected_outputs, target, workspace, timer)
+            if i > 0:
+                gradient += workspace.partial_gradient
+        return loss
+
+    def _workspace(self, batch_size: int):
+        """Get the network's workspace for batches of batch_size examples, creating it on first
+        use.
+        """
+        if batch_size not in self._workspaces:
+            if len(self._workspaces) >= MAX_WORKSPACES:
+                self._workspaces.clear()
+            self._workspaces[batch_size] = Workspace(self.layers, batch_size, self.dtype)
+        return self._workspaces[batch_size]
+
+    def _cast(self, x: np.ndarray):
+        """Get x in the precision of the network, copying it only if needed.
+        """
+        return np.asarray(x, dtype=self.dtype)
 
     def vanilla_gradient_descent(self,
-                                 training_data: list,
+                                 training_data,
                                  epochs: int,
                                  lr: float,
-                                 validation_data: list = None):
+                                 validation_data=None,
+                                 callbacks: list = None,
+                                 optimizer=None):
         """Gradient descent for training the neural network. 
 
         The weights and biases are updated only after going through the whole training data set.
 
         Args:
-            training_data (list): List of tuples; tuples of np.ndarray; inputs and expected outputs.
+            training_data (Dataset, list or BatchPipeline): Dataset or list of tuples; tuples of
+            np.ndarray; inputs and expected outputs. A BatchPipeline prepares the batches on a
+            background thread and is read GRADIENT_CHUNK_SIZE examples at a time.
             epochs (int): Number of times the data set is iterated through.
             lr (float): Learning rate.
-            validation_data (list, optional): List of tuples; tuples of np.ndarray; inputs and
-            expected outputs. Defaults to None.
+            validation_data (Dataset or list, optional): Dataset or list of tuples; tuples of
+            np.ndarray; inputs and expected outputs. Defaults to None.
+            callbacks (list, optional): List of callbacks.Callback; receivers of the loss and phase
+            times of the epochs and batches, which may also end the training early, see
+            callbacks.EarlyStopping. Defaults to None.
+            optimizer (Optimizer, optional): Update rule from the optimizers module, keeping its
+            state between calls. Defaults to plain gradient descent.
 
         Returns:
             tuple: Tuple of list; list of np.float64; mean loss and validation loss value of each
             epoch.
         """
-        training_loss = []
-        validation_accuracy = []
-        n = len(training_data)
-        training_data = training_data.copy()
-
-        for _ in range(epochs):
-            gradient_wrt_weights = [np.zeros_like(w) for w in self.weights]
-            gradient_wrt_biases = [np.zeros_like(b) for b in self.biases]
-            loss_this_epoch = 0
-
-            for inp, ex in training_data:
-                weight_derivatives, bias_derivatives, loss = self._gradient_calculation(
-                    inp, ex)
-                loss_this_epoch += loss
-
-                for i in range(self.n_layers - 1):
-                    gradient_wrt_weights[i] += weight_derivatives[i]
-                    gradient_wrt_biases[i] += bias_derivatives[i]
-
-            for i in range(self.n_layers - 1):
-                gradient_wrt_weights[i] /= n
-                gradient_wrt_biases[i] /= n
-
-            loss_this_epoch /= n
-            training_loss.append(loss_this_epoch)
-            if validation_data:
-                validation_accuracy.append(
-                    self.validation_accuracy(validation_data))
-
-            self._update_weights_and_biases(
-                gradient_wrt_weights, gradient_wrt_biases, lr)
-
-        return training_loss, validation_accuracy
+        return self._descend(training_data, len(training_data), epochs, lr, validation_data,
+                             shuffle_data=False, callbacks=callbacks, optimizer=optimizer)
 
     def stochastic_gradient_descent(self,
-                                    training_data: list,
+                                    training_data,
                                     epochs: int,
                                     lr: float,
-                                    validation_data: list = None):
+                                    validation_data=None,
+                                    callbacks: list = None,
+                                    optimizer=None):
         """Gradient descent for training the neural network.
 
         The weights and biases are updated after every training example.
 
         Args:
-            training_data (list): List of tuples; tuples of np.ndarray; inputs and expected outputs.
+            training_data (Dataset, list or BatchPipeline): Dataset or list of tuples; tuples of
+            np.ndarray; inputs and expected outputs. A BatchPipeline prepares the batches on a
+            background thread.
             epochs (int): Number of times the data set is iterated through.
             lr (float): Learning rate.
-            validation_data (list, optional): List of tuples; tuples of np.ndarray; inputs and
-            expected outputs. Defaults to None.
+            validation_data (Dataset or list, optional): Dataset or list of tuples; tuples of
+            np.ndarray; inputs and expected outputs. Defaults to None.
+            callbacks (list, optional): List of callbacks.Callback; receivers of the loss and phase
+            times of the epochs and batches, which may also end the training early, see
+            callbacks.EarlyStopping. Defaults to None.
+            optimizer (Optimizer, optional): Update rule from the optimizers module, keeping its
+            state between calls. Defaults to plain gradient descent.
 
         Returns:
             tuple: Tuple of list; list of np.float64; mean loss and validation loss value of each
             epoch.
         """
-        training_loss = []
-        validation_accuracy = []
-        n = len(training_data)
-        training_data = training_data.copy()
-
-        for _ in range(epochs):
-            shuffle(training_data)
-
-            loss_this_epoch = 0
-
-            for inp, ex in training_data:
-                weight_derivatives, bias_derivatives, loss = self._gradient_calculation(
-                    inp, ex)
-                loss_this_epoch += loss
-                self._update_weights_and_biases(
-                    weight_derivatives, bias_derivatives, lr)
-
-            loss_this_epoch /= n
-            training_loss.append(loss_this_epoch)
-            if validation_data:
-                validation_accuracy.append(
-                    self.validation_accuracy(validation_data))
-
-        return training_loss, validation_accuracy
+        return self._descend(training_data, 1, epochs, lr, validation_data, callbacks=callbacks,
+                             optimizer=optimizer)
 
     def minibatch_gradient_descent(self,
-                                   training_data: list,
+                                   training_data,
                                    minibatch_size: int,
                                    epochs: int,
                                    lr: float,
-                                   validation_data: list = None):
+                                   validation_data=None,
+                                   callbacks: list = None,
+                                   optimizer=None):
         """Gradient descent for training the neural network.
 
         The training data is split into batches and the weights and biases are updated after each
         one.
 
         Args:
-            training_data (list): List of tuples; tuples of np.ndarray; inputs and expected outputs.
+            training_data (Dataset, list or BatchPipeline): Dataset or list of tuples; tuples of
+            np.ndarray; inputs and expected outputs. A BatchPipeline prepares the batches on a
+            background thread.
             minibatch_size (int): Number of training examples in one mini batch.
             epochs (int): Number of times the data set is iterated through.
             lr (float): Learning rate.
-            validation_data (list, optional): List of tuples; tuples of np.ndarray; inputs and
-            expected outputs. Defaults to None.
+            validation_data (Dataset or list, optional): Dataset or list of tuples; tuples of
+            np.ndarray; inputs and expected outputs. Defaults to None.
+            callbacks (list, optional): List of callbacks.Callback; receivers of the loss and phase
+            times of the epochs and batches, which may also end the training early, see
+            callbacks.EarlyStopping. Defaults to None.
+            optimizer (Optimizer, optional): Update rule from the optimizers module, keeping its
+            state between calls. Defaults to plain gradient descent.
 
         Returns:
             tuple: Tuple of list; list of np.float64; mean loss and validation loss value of each
             epoch.
         """
-        training_loss = []
-        validation_accuracy = []
-        n = len(training_data)
-        training_data = training_data.copy()
+        return self._descend(training_data, minibatch_size, epochs, lr, validation_data,
+                             callbacks=callbacks, optimizer=optimizer)
+
+    # Nine of the locals are the parameters shared with the public training methods.
+    # pylint: disable-next=too-many-arguments,too-many-positional-arguments,too-many-locals
+    def _descend(self,
+                 training_data,
+                 batch_size: int,
+                 epochs: int,
+                 lr: float,
+                 validation_data=None,
+                 shuffle_data: bool = True,
+                 callbacks: list = None,
+                 optimizer=None):
+        """Batched training loop shared by all the gradient descent methods.
+
+        Each batch is fed through the network as one matrix, so the gradient of a batch takes a
+        single matrix product per layer. The summed gradient is divided by batch_size. The order
+        of each epoch is a fresh permutation drawn from numpy's global random state, so a run
+        continues identically from the random state saved between two epochs. A BatchPipeline
+        covering the whole data set in one batch is read in chunks, see _batch_source.
 
-        for _ in range(epochs):
-            shuffle(training_data)
+        Args:
+            training_data (Dataset, list or BatchPipeline): Dataset or list of tuples; tuples of
+            np.ndarray; inputs and expected outputs. A BatchPipeline prepares the batches on a
+            background thread.
+            batch_size (int): Number of training examples between updates.
+            epochs (int): Number of times the data set is iterated through.
+            lr (float): Learning rate.
+            validation_data (Dataset or list, optional): Dataset or list of tuples; tuples of
+            np.ndarray; inputs and expected outputs. Defaults to None.
+            shuffle_data (bool, optional): Shuffle the training data every epoch. Defaults to True.
+            callbacks (list, optional): List of callbacks.Callback. Defaults to None.
+            optimizer (Optimizer, optional): Update rule, given the gradient averaged over the
+            batch. Defaults to plain gradient descent.
 
-            loss_this_epoch = 0
-            minibatches = [training_data[i:i+minibatch_size]
-                           for i in range(0, n, minibatch_size)]
+        Returns:
+            tuple: Tuple of list; list of np.float64; mean loss and validation loss value of each
+            epoch.
+        """
+        training_data, read_size, total = self._batch_source(training_data, batch_size)
+        n = len(training_data)
+        update = partial(self._step, lr=lr, batch_size=batch_size, optimizer=optimizer)
+        history = ([], [])
+        hooks = CallbackList(callbacks, self, bool(validation_data)) if callbacks else None
+
+        try:
+            for epoch in range(epochs):
+                if hooks is not None:
+                    hooks.epoch_begin()
+                batches = self._epoch_batches(training_data, read_size, shuffle_data)
+                loss = self._descend_epoch(batches, update, total, hooks, epoch) / n
+                if self._end_epoch(epoch, n, loss, validation_data, history, hooks):
+                    break
+            if hooks is not None:
+                hooks.train_end()
+        finally:
+            if hooks is not None:
+                hooks.close()
+        return history
+
+    def _batch_source(self, training_data, batch_size: int):
+        """Prepare the training data for _descend.
+
+        A BatchPipeline covering the whole data set in one batch would stack all of it in memory,
+        so it is read GRADIENT_CHUNK_SIZE examples at a time instead and the gradients of the
+        chunks are summed into a buffer, applied as one update at the end of the epoch.
 
-            for minibatch in minibatches:
-                gradient_wrt_weights = [np.zeros_like(w) for w in self.weights]
-                gradient_wrt_biases = [np.zeros_like(b) for b in self.biases]
+        Returns:
+            tuple: Dataset or BatchPipeline, int and np.ndarray or None; the training data, the
+            number of examples read at a time and the buffer summing the chunk gradients.
+        """
+        if not isinstance(training_data, BatchPipeline):
+            return as_dataset(training_data), batch_size, None
+        if batch_size < len(training_data):
+            return training_data, batch_size, None
+        return training_data, GRADIENT_CHUNK_SIZE, np.zeros_like(self.params)
+
+    @staticmethod
+    def _epoch_batches(training_data, batch_size: int, shuffle_data: bool):
+        """Get the batches of one epoch as pairs of a Dataset and the indices of the batch in it.
+        """
+        if isinstance(training_data, BatchPipeline):
+            return training_data.epoch(batch_size, shuffle_data)
+        n = len(training_data)
+        order = np.random.permutation(n) if shuffle_data else np.arange(n)
+        return ((training_data, order[i:i + batch_size]) for i in range(0, n, batch_size))
 
-                for inp, ex in minibatch:
-                    weight_derivatives, bias_derivatives, loss = \
-                        self._gradient_calculation(inp, ex)
-                    loss_this_epoch += loss
+    # pylint: disable-next=too-many-arguments,too-many-positional-arguments
+    def _descend_epoch(self, batches, update, total: np.ndarray, hooks, epoch: int):
+        """Compute the gradient of each batch of an epoch and descend it.
 
-                    for i in range(self.n_layers - 1):
-                        gradient_wrt_weights[i] += weight_derivatives[i]
-                        gradient_wrt_biases[i] += bias_derivatives[i]
+        Args:
+            batches (iterable): Pairs of a Dataset and the indices of a batch in it.
+            update (callable): Function descending a summed gradient, see _step.
+            total (np.ndarray): Buffer summing the gradients of the batches into one update at
+            the end of the epoch, or None to update after every batch.
+            hooks (CallbackList): Callbacks timing the batches, or None.
+            epoch (int): Number of the epoch.
 
-                for i in range(self.n_layers - 1):
-                    gradient_wrt_weights[i] /= minibatch_size
-                    gradient_wrt_biases[i] /= minibatch_size
+        Returns:
+            np.float64: Loss summed over the epoch.
+        """
+        gradient = np.empty_like(self.params)
+        loss = 0
+        for batch, (data, index) in enumerate(batches):
+            timer = None if hooks is None else hooks.batch_timer(batch)
+            batch_loss = self._batch_gradient(data, index, gradient, timer)
+            if total is None:
+                update(gradient)
+            else:
+                total += gradient
+            loss += batch_loss
+            if timer is not None:
+                timer.mark("update")
+                hooks.batch_end(epoch, batch, len(index), batch_loss)
+        if total is not None:
+            update(total)
+            total.fill(0)
+        return loss
 
-                self._update_weights_and_biases(
-                    gradient_wrt_weights, gradient_wrt_biases, lr)
+    # pylint: disable-next=too-many-arguments,too-many-positional-arguments
+    def _end_epoch(self, epoch: int, n: int, loss: float, validation_data, history: tuple,
+                   hooks):
+        """Record the loss and validation accuracy of an epoch and report it to the callbacks.
 
-            loss_this_epoch /= n
-            training_loss.append(loss_this_epoch)
-            if validation_data:
-                validation_accuracy.append(
-                    self.validation_accuracy(validation_data))
+        Returns:
+            bool: Whether a callback stopped the training.
+        """
+        training_loss, validation_accuracy = history
+        training_loss.append(loss)
+        if validation_data:
+            if hooks is not None:
+                hooks.validation_begin()
+            validation_accuracy.append(self.validation_accuracy(validation_data))
+        if hooks is None:
+            return False
+        hooks.epoch_end(epoch, n, loss, validation_accuracy)
+        return hooks.stop_training
+
+    def _step(self, gradient: np.ndarray, lr: float, batch_size: int, optimizer=None):
+        """Descend the gradient summed over a batch of batch_size examples.
 
-        return training_loss, validation_accuracy
+        Args:
+            gradient (np.ndarray): Flat summed gradient, laid out like params. Scaled in place
+            when an optimizer is given.
+            lr (float): Learning rate.
+            batch_size (int): Number of training examples the gradient is summed over.
+            optimizer (Optimizer, optional): Update rule. Defaults to plain gradient descent.
+        """
+        if optimizer is None:
+            self._update_params(gradient, lr / batch_size)
+        else:
+            gradient *= 1 / batch_size
+            optimizer.step(self.params, gradient, lr)
+            self._apply_mask()
 
     def _update_weights_and_biases(self, new_w: list, new_b: list, lr: float):
         """Update all the weights and biases of the network to descend the gradient.
 
+        The derivatives are copied into one flat buffer laid out like params and left unchanged.
+        Callers holding the gradient as a flat buffer already should use _update_params, which
+        saves the copy.
+
         Args:
             new_w (list): List of np.ndarray; weight derivatives.
             new_b (list): List of np.ndarray; bias derivatives.
             lr (float): Learning rate.
+
+        Raises:
+            ValueError: The derivatives are not shaped like the weights and biases.
+        """
+        derivatives = [d for pair in zip(new_w, new_b) for d in pair]
+        params = [p for pair in zip(self.weights, self.biases) for p in pair]
+        if len(derivatives) != len(params) or any(
+                np.shape(d) != p.shape for d, p in zip(derivatives, params)):
+            raise ValueError("The derivatives must be shaped like the weights and biases")
+        gradient = np.concatenate([np.ravel(d) for d in derivatives])
+        self._update_params(gradient, lr)
+
+    def _update_params(self, gradient: np.ndarray, lr: float):
+        """Descend a gradient laid out like params with operations over the whole buffer.
+
+        The gradient is scaled in place, so its contents are lost.
+
+        Args:
+            gradient (np.ndarray): Flat buffer of the gradient.
+            lr (float): Learning rate.
+        """
+        gradient *= lr
+        self.params -= gradient
+        self._apply_mask()
+
+    def _apply_mask(self):
+        """Zero the pruned parameters again after an update, see pruning.prune.
+        """
+        if self.mask is not None:
+            self.params *= self.mask
+
+    def bulk_evaluate(self, data, chunk_size: int = EVALUATION_CHUNK_SIZE):
+        """Evaluate the network over a whole data set in one pass.
+
+        The data set is fed through the network chunk_size examples at a time, one matrix per
+        chunk.
+
+        Args:
+            data (Dataset or list): Dataset or list of tuples; tuples of np.ndarray; inputs and
+            expected outputs.
+            chunk_size (int, optional): Number of examples evaluated at once. Defaults to
+            EVALUATION_CHUNK_SIZE.
+
+        Returns:
+            Evaluation: Mean loss, accuracy, predicted classes and confusion matrix.
         """
-        for i in range(self.n_layers - 1):
-            self.weights[i] -= lr * new_w[i]
-            self.biases[i] -= lr * new_b[i]
+        data = as_dataset(data)
+        n = len(data)
+        loss = 0
+        predictions = np.empty(n, dtype=np.int64)
+
+        for i in range(0, n, chunk_size):
+            x, a_hat = data.batch(slice(i, i + chunk_size))
+            activation = self.evaluate(x.transpose())
+            loss += self._loss(activation, a_hat.transpose())
+            predictions[i:i + chunk_size] = np.argmax(activation, axis=0)
 
-    def overall_loss(self, validation_data: list):
+        return Evaluation(loss / n, predictions, data.labels, len(self.biases[-1]))
+
+    def overall_loss(self, validation_data, chunk_size: int = EVALUATION_CHUNK_SIZE):
         """Get mean loss value of the network over the validation data set.
 
         Args:
-            validation_data (list): List of tuples; tuples of np.ndarray; inputs and expected
-            outputs.
+            validation_data (Dataset or list): Dataset or list of tuples; tuples of np.ndarray;
+            inputs and expected outputs.
+            chunk_size (int, optional): Number of examples evaluated at once. Defaults to
+            EVALUATION_CHUNK_SIZE.
 
         Returns:
             np.float64: Mean loss value.
         """
-        loss = 0
-        for x, y in validation_data:
-            activation = self.evaluate(x)
-            loss += self._loss(activation, y)
-        loss /= len(validation_data)
-        return loss
+        return self.bulk_evaluate(validation_data, chunk_size).loss
 
-    def validation_accuracy(self, data: list):
+    def validation_accuracy(self, data, chunk_size: int = EVALUATION_CHUNK_SIZE):
         """Get the accuracy of the network over the validation data set.
 
         Args:
-            data (list): List of tuples; tuples of np.ndarray; inputs and expected outputs.
+            data (Dataset or list): Dataset or list of tuples; tuples of np.ndarray; inputs and
+            expected outputs.
+            chunk_size (int, optional): Number of examples evaluated at once. Defaults to
+            EVALUATION_CHUNK_SIZE.
 
         Returns:
             float: Accuracy.
         """
-        correct = 0
-        n = len(data)
-        for x, y in data:
-            activation = self.evaluate(x)
-            y = np.argmax(y)
-            a = np.argmax(activation)
+        return self.bulk_evaluate(data, chunk_size).accuracy
 
-            if a == y:
-                correct += 1
-        return correct / n
-
-    def test_classification(self, testing_data: list):
+    def test_classification(self, testing_data, chunk_size: int = EVALUATION_CHUNK_SIZE):
         """See which testing examples the network classifies right and which ones wrong.
 
         Suitable only for testing classification tasks such as digit recognition.
 
         Args:
-            testing_data (list): List of tuples; tuples of np.ndarray; inputs and
-            expected outputs.
+            testing_data (Dataset or list): Dataset or list of tuples; tuples of np.ndarray;
+            inputs and expected outputs.
+            chunk_size (int, optional): Number of examples evaluated at once. Defaults to
+            EVALUATION_CHUNK_SIZE.
 
         Returns:
-            tuple: Tuple of list: list of tuples; tuples of np.ndarray; training examples classified
-            correctly and incorrectly in format [(x, y), ... ], [(x, y, incorr_activation), ... ]
+            tuple: Tuple of np.ndarray; indices of the testing examples classified correctly and
+            incorrectly.
         """
-        correct = []
-        incorrect = []
-        for x, y in testing_data:
-            activation = self.evaluate(x)
-            y = np.argmax(y)
-            a = np.argmax(activation)
-
-            if a == y:
-                correct.append((x, y))
-            else:
-                incorrect.append((x, y, activation))
-        return correct, incorrect
+        evaluation = self.bulk_evaluate(testing_data, chunk_size)
+        hits = evaluation.predictions == evaluation.labels
+        return np.flatnonzero(hits), np.flatnonzero(~hits)
+
+
+class Evaluation:
+    """Results of evaluating a neural network over a data set.
+
+    Attributes:
+        loss (np.float64): Mean loss value.
+        accuracy (float): Share of the examples classified correctly.
+        predictions (np.ndarray): Class the network predicts for each example.
+        labels (np.ndarray): Expected class of each example.
+        confusion (np.ndarray): Confusion matrix; element [i, j] is the number of examples of
+        class i classified as class j.
+    """
+
+    def __init__(self, loss, predictions: np.ndarray, labels: np.ndarray, n_classes: int):
+        self.loss = loss
+        self.predictions = predictions
+        self.labels = labels
+        self.accuracy = float(np.mean(predictions == labels))
+        self.confusion = np.bincount(labels * n_classes + predictions,
+                                     minlength=n_classes ** 2).reshape((n_classes, n_classes))
 
 
 def save(network: Network, path: str = "neuralnetwork"):
-    with open(path, "wb") as file:
-        pickle.dump(network, file)
+    """Save a network in the binary model format.
 
+    The file starts with MODEL_MAGIC, the format version and the length of a JSON header
+    describing the network. The weights and biases follow as raw little-endian blocks, layer by
+    layer, starting at a MODEL_ALIGNMENT boundary. The pruning mask of a pruned network follows
+    them as one byte per parameter. The file is written next to path and renamed over it only
+    when complete.
 
-def load(path: str = "neuralnetwork"):
+    Args:
+        network (Network): Network to save.
+        path (str, optional): Path of the file. Defaults to "neuralnetwork".
+    """
+    header = json.dumps(_model_header(network)).encode("utf-8")
+    prefix_length = len(MODEL_MAGIC) + 8
+    header += b" " * (-(prefix_length + len(header)) % MODEL_ALIGNMENT)
+    dtype = network.dtype.newbyteorder("<")
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as file:
+        file.write(MODEL_MAGIC)
+        file.write(struct.pack("<II", MODEL_VERSION, len(header)))
+        file.write(header)
+        for weights, biases in zip(network.weights, network.biases):
+            file.write(np.ascontiguousarray(weights, dtype).data)
+            file.write(np.ascontiguousarray(biases, dtype).data)
+        if network.mask is not None:
+            file.write(network.mask.astype(np.uint8).data)
+    os.replace(tmp_path, path)
+
+
+def load(path: str = "neuralnetwork", mmap_mode: str = None):
+    """Load a network saved in the binary model format.
+
+    Args:
+        path (str, optional): Path of the file. Defaults to "neuralnetwork".
+        mmap_mode (str, optional): None to read the parameters into memory, "r" to memory-map
+        them read-only (for inference processes sharing one copy) or "c" to memory-map them
+        copy-on-write (for training without changing the file). Defaults to None.
+
+    Raises:
+        ValueError: The file is not a complete network in the binary model format, or it has a
+        newer format version. A network pickled by an older version has no MODEL_MAGIC; see
+        is_pickled and migrate.
+
+    Returns:
+        Network: The saved network.
+    """
+    with open(path, "rb") as file:
+        header = _read_model_header(file, path)
+        params, mask = _read_model_params(file, path, header, mmap_mode)
+    network = Network(header["layers"], params.dtype, params, header.get("output", "sigmoid"),
+                      header.get("activations", "sigmoid"))
+    if mask is not None:
+        network.mask = mask.astype(network.dtype)
+    return network
+
+
+def migrate(path: str = "neuralnetwork"):
+    """Convert a network pickled by an older version into the binary model format in place.
+
+    Unpickling can execute arbitrary code, so migrate only files saved by yourself.
+
+    Args:
+        path (str, optional): Path of the file. Defaults to "neuralnetwork".
+
+    Raises:
+        ValueError: The file does not hold a pickled network.
+
+    Returns:
+        Network: The migrated network.
+    """
     with open(path, "rb") as file:
         network = pickle.load(file)
+    if not isinstance(network, Network):
+        raise ValueError(f"{path} does not hold a pickled network")
+    save(network, path)
     return network
 
 
+def is_pickled(path: str = "neuralnetwork"):
+    """Check whether a file looks like a network pickled by an older version: it does not start
+    with MODEL_MAGIC but with the opcode of pickle protocol 2 or newer.
+    """
+    with open(path, "rb") as file:
+        start = file.read(len(MODEL_MAGIC))
+    return start[:1] == pickle.PROTO and start != MODEL_MAGIC
+
+
+def activate(a: np.ndarray, layer: int, activations: list, output: str,
+             scratch: np.ndarray = None):
+    """Apply the activation function of a layer in place.
+
+    Args:
+        a (np.ndarray): Weighted sums of the layer, overwritten with its activation.
+        layer (int): Index of the layer; 0 for the first hidden layer.
+        activations (list): List of str; activation function of each hidden layer. The layer
+        after the last hidden layer is the output layer.
+        output (str): Output layer, "sigmoid" or "softmax".
+        scratch (np.ndarray, optional): Preallocated array shaped like a. Defaults to None.
+
+    Returns:
+        np.ndarray: a.
+    """
+    if layer < len(activations):
+        return ACTIVATION_FUNCTIONS[activations[layer]][0](a, a, scratch)
+    if output == "softmax":
+        return softmax(a, out=a)
+    return sigmoid(a, out=a)
+
+
+def _checked_activations(layers: list, output: str, activations):
+    """Get the activation function of every hidden layer as a list.
+
+    Raises:
+        ValueError: Unknown output layer or activation function, or the wrong number of
+        activation functions.
+    """
+    if isinstance(activations, str):
+        activations = [activations] * (len(layers) - 2)
+    if output not in OUTPUTS:
+        raise ValueError(f"Unknown output layer {output}, expected one of {OUTPUTS}")
+    for activation in activations:
+        if activation not in ACTIVATIONS:
+            raise ValueError(
+                f"Unknown activation function {activation}, expected one of {ACTIVATIONS}")
+    if len(activations) != len(layers) - 2:
+        raise ValueError(f"Expected {len(layers) - 2} hidden layer activation functions, "
+                         f"got {len(activations)}")
+    return list(activations)
+
+
+def _model_header(network: Network):
+    """Get the JSON header of the binary model format describing network.
+    """
+    header = {"layers": network.layers, "dtype": network.dtype.newbyteorder("<").str,
+              "output": network.output, "activations": network.activations}
+    if network.mask is not None:
+        header["mask"] = True
+    return header
+
+
+def _read_model_header(file, path: str):
+    """Read and check the start of a file in the binary model format, leaving the file at the
+    start of the parameters.
+
+    Raises:
+        ValueError: The file is not in the binary model format, is truncated, has a newer format
+        version or an invalid header.
+
+    Returns:
+        dict: The JSON header.
+    """
+    if file.read(len(MODEL_MAGIC)) != MODEL_MAGIC:
+        raise ValueError(f"{path} is not a saved network in the binary model format")
+    prefix = file.read(8)
+    if len(prefix) < 8:
+        raise ValueError(f"{path} is truncated")
+    version, header_length = struct.unpack("<II", prefix)
+    if version > MODEL_VERSION:
+        raise ValueError(f"{path} has model format version {version}, "
+                         f"newer than the supported {MODEL_VERSION}")
+    header = json.loads(file.read(header_length))
+    if not isinstance(header, dict) or "layers" not in header or "dtype" not in header:
+        raise ValueError(f"{path} has an invalid header")
+    return header
+
+
+def _read_model_params(file, path: str, header: dict, mmap_mode: str = None):
+    """Read the parameters and the pruning mask following the header of a saved network.
+
+    Raises:
+        ValueError: The file is too short for the parameters described by the header.
+
+    Returns:
+        tuple: np.ndarray and np.ndarray or None; the parameters in native byte order and the
+        pruning mask.
+    """
+    offset = file.tell()
+    dtype = np.dtype(header["dtype"])
+    n_params = _n_params(header["layers"])
+    size = n_params * (dtype.itemsize + (1 if header.get("mask") else 0))
+    if offset + size > os.fstat(file.fileno()).st_size:
+        raise ValueError(f"{path} is truncated: it does not hold the {n_params} parameters "
+                         f"of a network with layers {header['layers']}")
+    if mmap_mode is None:
+        params = np.fromfile(file, dtype, n_params)
+    else:
+        params = np.memmap(file, dtype, mmap_mode, offset, (n_params,))
+    mask = None
+    if header.get("mask"):
+        file.seek(offset + n_params * dtype.itemsize)
+        mask = np.fromfile(file, np.uint8, n_params)
+    if not dtype.isnative:
+        params = params.astype(dtype.newbyteorder("="))
+    return params, mask
+
+
 def _glorot(n, m):
     """Weight initialization function suitable for neural network layers using the sigmoid
     activation function.
@@ -389,13 +947,15 @@ def _glorot(n, m):
     return np.random.uniform(a, b, (m, n))
 
 
-def _sigmoid(z: np.ndarray):
-    """Activation function for the neural network to introduce nonlinearity.
+def _he(n, m):
+    """Weight initialization function suitable for neural network layers using the ReLU
+    activation function.
 
     Args:
-        z (np.ndarray): Weighted sum.
+        n (int): Number of inputs for this layer ("fan-in").
+        m (int): Number of outputs (neurons) for this layer ("fan_out").
 
     Returns:
-        np.ndarray: Array of values between zero and one.
+        np.ndarray: Weights for this layer.
     """
-    return 1 / (1 + np.exp(-z))
+    return np.random.normal(0, sqrt(2 / n), (m, n))
@@ -0,0 +1,268 @@
+from abc import ABC, abstractmethod
+from math import sqrt
+from time import perf_counter
+import numpy as np
+from data_handling import get_data
+from network import DEFAULT_LAYERS, Network
+
+
+class Optimizer(ABC):
+    """Base class of the update rules of the gradient descent methods of network.Network.
+
+    The state of an optimizer is kept in flat buffers laid out like Network.params, allocated on
+    the first step and updated in place, so a step allocates no new arrays.
+
+    Attributes:
+        state (dict): Names of the state buffers mapped to np.ndarray laid out like params.
+        steps (int): Number of steps taken.
+    """
+
+    # Names of the state buffers of the optimizer.
+    buffers = ()
+
+    def __init__(self):
+        self.state = {}
+        self.steps = 0
+        self._scratch = None
+
+    def step(self, params: np.ndarray, gradient: np.ndarray, lr: float):
+        """Update the parameters in place to descend the gradient.
+
+        The gradient is used as scratch space, so its contents are lost.
+
+        Args:
+            params (np.ndarray): Flat parameter buffer of the network.
+            gradient (np.ndarray): Gradient averaged over the batch, laid out like params.
+            lr (float): Learning rate.
+        """
+        if self._scratch is None or self._scratch.shape != params.shape:
+            self.state = {name: np.zeros_like(params) for name in self.buffers}
+            self.steps = 0
+            self._scratch = np.empty_like(params)
+        self.steps += 1
+        self._update(params, gradient, lr)
+
+    def hyperparameters(self):
+        """Get the constructor arguments of the optimizer.
+
+        Returns:
+            dict: Names of the hyperparameters mapped to their values.
+        """
+        return {name: value for name, value in vars(self).items()
+                if name not in ("state", "steps") and not name.startswith("_")}
+
+    def load_state(self, params: np.ndarray, state: dict, steps: int):
+        """Continue from the state of an optimizer of the same type, e.g. one saved in a
+        checkpoint.
+
+        Args:
+            params (np.ndarray): Flat parameter buffer of the network updated.
+            state (dict): Names of the state buffers mapped to np.ndarray laid out like params.
+            steps (int): Number of steps taken.
+        """
+        self.state = {name: np.array(state[name], params.dtype) for name in self.buffers}
+        self.steps = steps
+        self._scratch = np.empty_like(params)
+
+    @abstractmethod
+    def _update(self, params: np.ndarray, gradient: np.ndarray, lr: float):
+        """Apply the update rule of a step; the state buffers are allocated and steps counted.
+        """
+
+
+class SGD(Optimizer):
+    """Plain gradient descent, params -= lr * gradient.
+    """
+
+    def _update(self, params, gradient, lr):
+        gradient *= lr
+        params -= gradient
+
+
+class Momentum(Optimizer):
+    """Gradient descent with momentum.
+
+    Attributes:
+        beta (float): Fraction of the velocity kept between steps.
+    """
+
+    buffers = ("velocity",)
+
+    def __init__(self, beta: float = 0.9):
+        """Class constructor for the optimizer.
+
+        Args:
+            beta (float, optional): Fraction of the velocity kept between steps. Defaults to 0.9.
+        """
+        super().__init__()
+        self.beta = beta
+
+    def _update(self, params, gradient, lr):
+        velocity = self.state["velocity"]
+        velocity *= self.beta
+        velocity += gradient
+        np.multiply(velocity, lr, out=gradient)
+        params -= gradient
+
+
+class Nesterov(Momentum):
+    """Gradient descent with Nesterov momentum; the step looks ahead along the velocity.
+    """
+
+    def _update(self, params, gradient, lr):
+        velocity = self.state["velocity"]
+        velocity *= self.beta
+        velocity += gradient
+        np.multiply(velocity, self.beta, out=self._scratch)
+        gradient += self._scratch
+        gradient *= lr
+        params -= gradient
+
+
+class RMSProp(Optimizer):
+    """Gradient descent with the step of each parameter divided by its root mean square gradient.
+
+    Attributes:
+        rho (float): Decay rate of the mean square gradient.
+        eps (float): Term added to the root mean square for numerical stability.
+    """
+
+    buffers = ("mean_square",)
+
+    def __init__(self, rho: float = 0.9, eps: float = 1e-8):
+        """Class constructor for the optimizer.
+
+        Args:
+            rho (float, optional): Decay rate of the mean square gradient. Defaults to 0.9.
+            eps (float, optional): Term added for numerical stability. Defaults to 1e-8.
+        """
+        super().__init__()
+        self.rho = rho
+        self.eps = eps
+
+    def _update(self, params, gradient, lr):
+        mean_square = self.state["mean_square"]
+        np.multiply(gradient, gradient, out=self._scratch)
+        self._scratch *= 1 - self.rho
+        mean_square *= self.rho
+        mean_square += self._scratch
+        np.sqrt(mean_square, out=self._scratch)
+        self._scratch += self.eps
+        gradient /= self._scratch
+        gradient *= lr
+        params -= gradient
+
+
+class Adam(Optimizer):
+    """Adam; gradient descent with momentum and RMSProp scaling, both bias corrected.
+
+    Attributes:
+        beta1 (float): Decay rate of the mean gradient.
+        beta2 (float): Decay rate of the mean square gradient.
+        eps (float): Term added to the root mean square for numerical stability.
+    """
+
+    buffers = ("mean", "mean_square")
+
+    def __init__(self, beta1: float = 0.9, beta2: float = 0.999, eps: float = 1e-8):
+        """Class constructor for the optimizer.
+
+        Args:
+            beta1 (float, optional): Decay rate of the mean gradient. Defaults to 0.9.
+            beta2 (float, optional): Decay rate of the mean square gradient. Defaults to 0.999.
+            eps (float, optional): Term added for numerical stability. Defaults to 1e-8.
+        """
+        super().__init__()
+        self.beta1 = beta1
+        self.beta2 = beta2
+        self.eps = eps
+
+    def _update(self, params, gradient, lr):
+        mean, mean_square = self.state["mean"], self.state["mean_square"]
+        scratch = self._scratch
+        mean *= self.beta1
+        np.multiply(gradient, 1 - self.beta1, out=scratch)
+        mean += scratch
+        np.multiply(gradient, gradient, out=scratch)
+        scratch *= 1 - self.beta2
+        mean_square *= self.beta2
+        mean_square += scratch
+
+        np.sqrt(mean_square, out=scratch)
+        scratch *= 1 / sqrt(1 - self.beta2 ** self.steps)
+        scratch += self.eps
+        np.divide(mean, scratch, out=gradient)
+        gradient *= lr / (1 - self.beta1 ** self.steps)
+        params -= gradient
+
+
+# Optimizers selectable by name, with a learning rate that works for the default network.
+OPTIMIZERS = {
+    "sgd": (SGD, 1.0),
+    "momentum": (Momentum, 0.1),
+    "nesterov": (Nesterov, 0.1),
+    "rmsprop": (RMSProp, 0.001),
+    "adam": (Adam, 0.001),
+}
+
+
+# The loop keeps the state of one optimizer run.
+# pylint: disable-next=too-many-locals
+def compare_optimizers(layers: list,
+                       training_data,
+                       validation_data,
+                       minibatch_size: int,
+                       target_accuracy: float,
+                       max_epochs: int,
+                       optimizers: dict = None):
+    """Train identical networks with minibatch gradient descent and each optimizer until they
+    reach a validation accuracy.
+
+    The networks start from the same initial parameters and see the training data in the same
+    order.
+
+    Args:
+        layers (list): List of integers; layers of the networks trained.
+        training_data (Dataset): Training data.
+        validation_data (Dataset): Validation data.
+        minibatch_size (int): Number of training examples in one mini batch.
+        target_accuracy (float): Validation accuracy to reach.
+        max_epochs (int): Largest number of epochs trained.
+        optimizers (dict, optional): Names mapped to tuples of an optimizer class and a learning
+        rate. Defaults to OPTIMIZERS.
+
+    Returns:
+        dict: Name of each optimizer mapped to a tuple of the number of epochs to reach the
+        target accuracy or None, the training time in seconds and the validation accuracy of each
+        epoch.
+    """
+    optimizers = OPTIMIZERS if optimizers is None else optimizers
+    initial = Network(layers)
+    random_state = np.random.get_state()
+    results = {}
+
+    for name, (optimizer, lr) in optimizers.items():
+        net = Network(layers, params=initial.params.copy())
+        optimizer = optimizer()
+        np.random.set_state(random_state)
+        accuracy = []
+        start = perf_counter()
+        while len(accuracy) < max_epochs and (not accuracy or accuracy[-1] < target_accuracy):
+            accuracy += net.minibatch_gradient_descent(
+                training_data, minibatch_size, 1, lr, validation_data, optimizer=optimizer)[1]
+        epochs = len(accuracy) if accuracy[-1] >= target_accuracy else None
+        results[name] = (epochs, perf_counter() - start, accuracy)
+    return results
+
+
+def main():
+    training, validation, _ = get_data()
+    for name, (epochs, seconds, accuracy) in compare_optimizers(
+            DEFAULT_LAYERS, training, validation, 10, 0.9, 30).items():
+        reached = f"{epochs} epochs" if epochs else "not reached"
+        print(f"{name}: 90% validation accuracy {reached}, {seconds:.2f} s, "
+              f"final validation accuracy {accuracy[-1]:.4f}")
+
+
+if __name__ == "__main__":
+    main()
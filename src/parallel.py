@@ -0,0 +1,382 @@
+from multiprocessing import get_context, shared_memory
+from threading import Thread
+from time import perf_counter
+import numpy as np
+from data_handling import as_dataset, get_data
+from network import DEFAULT_LAYERS, Network
+from sweep import _blas_threads
+
+
+class DataParallelTrainer:
+    """Computes the gradient of a batch with a pool of worker processes.
+
+    The training data, the network's parameters and one gradient row per worker live in shared
+    memory. While the trainer is open, the network's parameter buffer is the shared one, so
+    updating it in place broadcasts the new parameters to the workers without pickling anything.
+    Each worker computes the gradient of its shard of a batch with the network's own gradient
+    calculation and writes it into its own row, which the trainer then sums.
+
+    Attributes:
+        net (Network): Network being trained.
+        n_workers (int): Number of worker processes.
+    """
+
+    def __init__(self, net: Network, training_data, n_workers: int, blas_threads: int = 1):
+        """Class constructor for the data-parallel trainer.
+
+        Args:
+            net (Network): Network to train.
+            training_data (Dataset or list): Dataset or list of tuples; tuples of np.ndarray;
+            inputs and expected outputs.
+            n_workers (int): Number of worker processes.
+            blas_threads (int, optional): Number of BLAS threads of a worker, so the workers do
+            not oversubscribe the cores. Defaults to 1.
+
+        Raises:
+            ValueError: n_workers is less than one.
+        """
+        if n_workers < 1:
+            raise ValueError(f"Expected at least one worker, got {n_workers}")
+        self.net = net
+        self.n_workers = n_workers
+        training_data = as_dataset(training_data)
+
+        self._memory = []
+        params = net.params
+        try:
+            self._inputs = self._share(training_data.inputs)
+            self._outputs = self._share(training_data.expected_outputs())
+            self._params = self._share(params)
+            self._gradients = self._share(np.zeros((n_workers, len(params)), net.dtype))
+            net.set_params(self._params)
+            self._pool = self._start_pool(blas_threads)
+        except BaseException:
+            net.set_params(params)
+            self._free_memory()
+            raise
+
+    def _start_pool(self, blas_threads: int):
+        """Spawn the workers, so that they load BLAS with the thread limits set here. The pool
+        is closed and joined by close.
+        """
+        spec = [(memory.name, array.shape, array.dtype.str)
+                for memory, array in zip(self._memory, self._arrays())]
+        net = self.net
+        with _blas_threads(blas_threads):
+            return get_context("spawn").Pool(self.n_workers, _worker_init,
+                                             (spec, net.layers, net.output, net.activations))
+
+    def _share(self, array: np.ndarray):
+        memory = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        self._memory.append(memory)
+        shared = np.ndarray(array.shape, array.dtype, memory.buf)
+        shared[...] = array
+        return shared
+
+    def _arrays(self):
+        return [self._inputs, self._outputs, self._params, self._gradients]
+
+    def gradient(self, index: np.ndarray):
+        """Get the gradient summed over the training examples at index.
+
+        Args:
+            index (np.ndarray): Indices of the training examples of the batch.
+
+        Returns:
+            tuple: np.ndarray and np.float64; gradient laid out like Network.params, loss.
+        """
+        shards = [shard for shard in np.array_split(index, self.n_workers) if len(shard)]
+        losses = self._pool.starmap(_worker_gradient, enumerate(shards))
+        return np.sum(self._gradients[:len(shards)], axis=0), sum(losses)
+
+    def close(self):
+        """Stop the workers, give the network private copies of its parameters and free the
+        shared memory.
+        """
+        self._pool.close()
+        self._pool.join()
+        self.net.set_params(self.net.params.copy())
+        self._free_memory()
+
+    def _free_memory(self):
+        self._inputs = self._outputs = self._params = self._gradients = None
+        for memory in self._memory:
+            memory.close()
+            memory.unlink()
+        self._memory = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+
+# State of a worker process, set by _worker_init.
+_WORKER = {}
+
+
+def _worker_init(spec: list, layers: list, output: str, activations: list):
+    memory = [shared_memory.SharedMemory(name=name) for name, _, _ in spec]
+    inputs, outputs, params, gradients = (np.ndarray(shape, dtype, block.buf)
+                                          for (_, shape, dtype), block in zip(spec, memory))
+
+    net = Network(layers, params.dtype, params, output, activations)
+    _WORKER.update(memory=memory, inputs=inputs, outputs=outputs, gradients=gradients, net=net)
+
+
+def _worker_gradient(worker: int, index: np.ndarray):
+    x = _WORKER["inputs"][index].transpose()
+    a_hat = _WORKER["outputs"][index].transpose()
+    return _WORKER["net"]._gradient_into(  # pylint: disable=protected-access
+        x, a_hat, _WORKER["gradients"][worker])
+
+
+def parallel_vanilla_gradient_descent(net: Network,
+                                      training_data,
+                                      epochs: int,
+                                      lr: float,
+                                      validation_data=None,
+                                      n_workers: int = 2):
+    """Data-parallel version of Network.vanilla_gradient_descent.
+
+    Args:
+        net (Network): Network to train.
+        training_data (Dataset or list): Dataset or list of tuples; tuples of np.ndarray;
+        inputs and expected outputs.
+        epochs (int): Number of times the data set is iterated through.
+        lr (float): Learning rate.
+        validation_data (Dataset or list, optional): Dataset or list of tuples; tuples of
+        np.ndarray; inputs and expected outputs. Defaults to None.
+        n_workers (int, optional): Number of worker processes. Defaults to 2.
+
+    Returns:
+        tuple: Tuple of list; list of np.float64; mean loss and validation loss value of each
+        epoch.
+    """
+    return _parallel_descend(net, training_data, len(training_data), epochs, lr,
+                             validation_data, n_workers, shuffle_data=False)
+
+
+def parallel_minibatch_gradient_descent(net: Network,
+                                        training_data,
+                                        minibatch_size: int,
+                                        epochs: int,
+                                        lr: float,
+                                        validation_data=None,
+                                        n_workers: int = 2):
+    """Data-parallel version of Network.minibatch_gradient_descent.
+
+    Args:
+        net (Network): Network to train.
+        training_data (Dataset or list): Dataset or list of tuples; tuples of np.ndarray;
+        inputs and expected outputs.
+        minibatch_size (int): Number of training examples in one mini batch.
+        epochs (int): Number of times the data set is iterated through.
+        lr (float): Learning rate.
+        validation_data (Dataset or list, optional): Dataset or list of tuples; tuples of
+        np.ndarray; inputs and expected outputs. Defaults to None.
+        n_workers (int, optional): Number of worker processes. Defaults to 2.
+
+    Returns:
+        tuple: Tuple of list; list of np.float64; mean loss and validation loss value of each
+        epoch.
+    """
+    return _parallel_descend(net, training_data, minibatch_size, epochs, lr,
+                             validation_data, n_workers)
+
+
+# Takes the parameters of the serial training methods.
+# pylint: disable-next=too-many-arguments,too-many-positional-arguments,too-many-locals
+def _parallel_descend(net: Network,
+                      training_data,
+                      batch_size: int,
+                      epochs: int,
+                      lr: float,
+                      validation_data,
+                      n_workers: int,
+                      shuffle_data: bool = True):
+    """Same loop as Network._descend with the gradients computed by a DataParallelTrainer.
+    """
+    training_loss = []
+    validation_accuracy = []
+    n = len(training_data)
+
+    order = np.arange(n)
+
+    with DataParallelTrainer(net, training_data, n_workers) as trainer:
+        for _ in range(epochs):
+            loss_this_epoch = 0
+            if shuffle_data:
+                order = np.random.permutation(n)
+
+            for i in range(0, n, batch_size):
+                gradient, loss = trainer.gradient(order[i:i + batch_size])
+                loss_this_epoch += loss
+                net._update_params(gradient, lr / batch_size)  # pylint: disable=protected-access
+
+            loss_this_epoch /= n
+            training_loss.append(loss_this_epoch)
+            if validation_data:
+                validation_accuracy.append(net.validation_accuracy(validation_data))
+
+    return training_loss, validation_accuracy
+
+
+def hogwild_gradient_descent(net: Network,
+                             training_data,
+                             epochs: int,
+                             lr: float,
+                             validation_data=None,
+                             n_workers: int = 2):
+    """Asynchronous, lock-free version of Network.stochastic_gradient_descent (Hogwild).
+
+    Every epoch the shuffled training data is split into one shard per thread. The threads walk
+    their shards and update the network's weights and biases in place after every example,
+    without locking; an update may be computed from parameters another thread is changing at the
+    same time. NumPy releases the GIL inside the array operations, which lets the threads overlap.
+
+    Args:
+        net (Network): Network to train.
+        training_data (Dataset or list): Dataset or list of tuples; tuples of np.ndarray;
+        inputs and expected outputs.
+        epochs (int): Number of times the data set is iterated through.
+        lr (float): Learning rate.
+        validation_data (Dataset or list, optional): Dataset or list of tuples; tuples of
+        np.ndarray; inputs and expected outputs. Defaults to None.
+        n_workers (int, optional): Number of threads. Defaults to 2.
+
+    Returns:
+        tuple: Tuple of list; list of np.float64; mean loss and validation loss value of each
+        epoch.
+    """
+    training_loss = []
+    validation_accuracy = []
+    training_data = as_dataset(training_data)
+    n = len(training_data)
+
+    for _ in range(epochs):
+        losses = [0] * n_workers
+        shards = np.array_split(np.random.permutation(n), n_workers)
+        threads = [Thread(target=_hogwild_worker, args=(net, training_data, shard, lr, losses, i))
+                   for i, shard in enumerate(shards)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        training_loss.append(sum(losses) / n)
+        if validation_data:
+            validation_accuracy.append(net.validation_accuracy(validation_data))
+
+    return training_loss, validation_accuracy
+
+
+def _hogwild_worker(net: Network, training_data, shard: np.ndarray, lr: float, losses: list,
+                    worker: int):
+    gradient = np.empty_like(net.params)
+    for i in shard:
+        x, a_hat = training_data.batch(i)
+        losses[worker] += net._gradient_into(x, a_hat, gradient)  # pylint: disable=protected-access
+        net._update_params(gradient, lr)  # pylint: disable=protected-access
+
+
+def compare_hogwild(layers: list,
+                    training_data,
+                    validation_data,
+                    epochs: int,
+                    lr: float,
+                    worker_counts: tuple = (1, 2, 4)):
+    """Compare the convergence and throughput of Hogwild training with the serial
+    stochastic_gradient_descent.
+
+    Every network starts from the same initial parameters.
+
+    Args:
+        layers (list): List of integers; layers of the networks trained.
+        training_data (Dataset or list): Dataset or list of tuples; tuples of np.ndarray;
+        inputs and expected outputs.
+        validation_data (Dataset or list): Dataset or list of tuples; tuples of np.ndarray;
+        inputs and expected outputs.
+        epochs (int): Number of times the data set is iterated through.
+        lr (float): Learning rate.
+        worker_counts (tuple, optional): Numbers of threads to try. Defaults to (1, 2, 4).
+
+    Returns:
+        dict: Number of threads (0 for the serial method) mapped to a tuple of training examples
+        per second and the validation accuracy of each epoch.
+    """
+    training_data = as_dataset(training_data)
+    initial = Network(layers)
+    results = {}
+
+    for n_workers in (0,) + tuple(worker_counts):
+        net = Network(layers)
+        for p1, p2 in zip(initial.weights + initial.biases, net.weights + net.biases):
+            p2[...] = p1
+
+        start = perf_counter()
+        if n_workers == 0:
+            _, accuracy = net.stochastic_gradient_descent(
+                training_data, epochs, lr, validation_data)
+        else:
+            _, accuracy = hogwild_gradient_descent(
+                net, training_data, epochs, lr, validation_data, n_workers)
+        seconds = perf_counter() - start
+        results[n_workers] = (epochs * len(training_data) / seconds, accuracy)
+    return results
+
+
+def measure_speedup(layers: list,
+                    training_data,
+                    minibatch_size: int,
+                    worker_counts: tuple = (1, 2, 4),
+                    epochs: int = 1,
+                    lr: float = 0.1):
+    """Time one run of minibatch gradient descent serially and with each number of workers.
+
+    Args:
+        layers (list): List of integers; layers of the networks trained.
+        training_data (Dataset or list): Dataset or list of tuples; tuples of np.ndarray;
+        inputs and expected outputs.
+        minibatch_size (int): Number of training examples in one mini batch.
+        worker_counts (tuple, optional): Numbers of workers to try. Defaults to (1, 2, 4).
+        epochs (int, optional): Number of epochs timed. Defaults to 1.
+        lr (float, optional): Learning rate. Defaults to 0.1.
+
+    Returns:
+        dict: Number of workers (0 for the serial path) mapped to a tuple of the wall time in
+        seconds and the speedup over the serial path.
+    """
+    training_data = as_dataset(training_data)
+
+    start = perf_counter()
+    Network(layers).minibatch_gradient_descent(training_data, minibatch_size, epochs, lr)
+    serial = perf_counter() - start
+    results = {0: (serial, 1.0)}
+
+    for n_workers in worker_counts:
+        start = perf_counter()
+        parallel_minibatch_gradient_descent(Network(layers), training_data, minibatch_size,
+                                            epochs, lr, n_workers=n_workers)
+        seconds = perf_counter() - start
+        results[n_workers] = (seconds, serial / seconds)
+    return results
+
+
+def main():
+    data, validation, _ = get_data()
+    print("Data-parallel minibatch gradient descent:")
+    for workers, (wall_time, speedup) in measure_speedup(DEFAULT_LAYERS, data, 1000).items():
+        name = "serial" if workers == 0 else f"{workers} workers"
+        print(f"{name}: {wall_time:.3f} s, speedup {speedup:.2f}")
+
+    print("Hogwild stochastic gradient descent:")
+    for workers, (speed, accuracy) in compare_hogwild(
+            DEFAULT_LAYERS, data, validation, 3, 0.1).items():
+        name = "serial" if workers == 0 else f"{workers} threads"
+        print(f"{name}: {speed:.0f} examples/s, validation accuracy {accuracy[-1]:.4f}")
+
+
+if __name__ == "__main__":
+    main()
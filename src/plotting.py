@@ -0,0 +1,38 @@
+# One statement per element of the plot.
+# pylint: disable-next=too-many-statements
+def plot_training(training_loss: list, validation_accuracy: list, path: str = None):
+    """Plot the training loss and validation accuracy of each epoch.
+
+    Matplotlib is imported only here, so training without plots does not pay for the import.
+    When the plot goes to a file, a non-interactive backend is used, so no display is needed.
+
+    Args:
+        training_loss (list): Mean loss of each epoch.
+        validation_accuracy (list): Validation accuracy of each epoch.
+        path (str, optional): Path of the image; the format follows the extension. Defaults to
+        None, which shows the plot in a window.
+    """
+    # pylint: disable=import-outside-toplevel
+    if path is not None:
+        import matplotlib
+        matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    fig, ax1 = plt.subplots()
+    ax1.set_xlabel("Epochs")
+    ax1.set_ylabel("Training loss", color="navy")
+    ax1.set_ylim(0, max(training_loss))
+    ax1.plot(training_loss, color="navy")
+
+    ax2 = ax1.twinx()
+    ax2.set_ylabel("Validation accuracy", color="orangered")
+    ax2.set_ylim(0, 1)
+    ax2.plot(validation_accuracy, color="orangered")
+
+    fig.tight_layout()
+    ax1.grid()
+    if path is None:
+        plt.show()
+    else:
+        fig.savefig(path)
+        plt.close(fig)
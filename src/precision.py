@@ -0,0 +1,56 @@
+from time import perf_counter
+import numpy as np
+from data_handling import get_data
+from network import DEFAULT_LAYERS, Network
+
+
+def compare_precisions(layers: list,
+                       training_data,
+                       validation_data,
+                       minibatch_size: int,
+                       epochs: int,
+                       lr: float,
+                       dtypes: tuple = (np.float64, np.float32)):
+    """Train identical networks with minibatch gradient descent in each precision.
+
+    The networks start from the same initial parameters and see the training data in the same
+    order, so the only difference between them is the precision.
+
+    Args:
+        layers (list): List of integers; layers of the networks trained.
+        training_data (Dataset): Training data.
+        validation_data (Dataset): Validation data.
+        minibatch_size (int): Number of training examples in one mini batch.
+        epochs (int): Number of times the data set is iterated through.
+        lr (float): Learning rate.
+        dtypes (tuple, optional): Precisions compared. Defaults to (np.float64, np.float32).
+
+    Returns:
+        dict: Name of each precision mapped to a tuple of the training time in seconds and the
+        validation accuracy of each epoch.
+    """
+    initial = Network(layers)
+    random_state = np.random.get_state()
+    results = {}
+
+    for dtype in dtypes:
+        net = Network(layers, dtype)
+        net.params[...] = initial.params
+        np.random.set_state(random_state)
+
+        start = perf_counter()
+        _, accuracy = net.minibatch_gradient_descent(
+            training_data, minibatch_size, epochs, lr, validation_data)
+        results[np.dtype(dtype).name] = (perf_counter() - start, accuracy)
+    return results
+
+
+def main():
+    training, validation, _ = get_data()
+    for name, (seconds, accuracy) in compare_precisions(
+            DEFAULT_LAYERS, training, validation, 10, 10, 1).items():
+        print(f"{name}: {seconds:.2f} s, final validation accuracy {accuracy[-1]:.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,343 @@
+import json
+import sys
+import numpy as np
+from benchmark import measure
+from callbacks import Callback
+from data_handling import as_dataset, get_data
+from network import EVALUATION_CHUNK_SIZE, Network, activate, load
+from workspace import _layer_views
+
+
+# Weight sparsities compared by pruning_report by default.
+REPORT_SPARSITIES = (0.0, 0.5, 0.8, 0.9, 0.95, 0.99)
+
+# Batch sizes the dense and sparse forward passes are timed with by pruning_report.
+REPORT_BATCH_SIZES = (1, EVALUATION_CHUNK_SIZE)
+
+# Version of the file written by save_sparse.
+SPARSE_VERSION = 1
+
+
+def prune(net: Network, sparsity: float):
+    """Prune the smallest weights of every layer of a network by magnitude.
+
+    In each weight matrix the fraction sparsity of the weights with the smallest absolute values
+    is set to zero; the biases are kept. The pruned weights are recorded in net.mask, which the
+    gradient descent methods reapply after every update, so they stay zero through further
+    training. Weights pruned earlier stay pruned, so calling prune with growing sparsities prunes
+    iteratively.
+
+    Args:
+        net (Network): Network to prune in place.
+        sparsity (float): Fraction of the weights of each layer to prune, from 0 to 1.
+
+    Returns:
+        float: Fraction of all the weights that are pruned.
+    """
+    if net.mask is None:
+        net.mask = np.ones_like(net.params)
+    masks, _ = _layer_views(net.mask, net.layers)
+    for weights, mask in zip(net.weights, masks):
+        n_pruned = int(round(sparsity * weights.size))
+        if n_pruned > np.count_nonzero(mask == 0):
+            magnitude = np.where(mask != 0, np.abs(weights), -1).ravel()
+            mask.ravel()[np.argpartition(magnitude, n_pruned - 1)[:n_pruned]] = 0
+    net.params *= net.mask
+    return weight_sparsity(net)
+
+
+def weight_sparsity(net: Network):
+    """Get the fraction of the weights of a network that are zero.
+    """
+    n_zero = sum(weights.size - np.count_nonzero(weights) for weights in net.weights)
+    return n_zero / sum(weights.size for weights in net.weights)
+
+
+class IterativePruning(Callback):
+    """Callback pruning a network gradually while it trains.
+
+    The sparsity follows the cubic schedule of Zhu and Gupta, rising quickly at first and
+    levelling off at final_sparsity: after epoch t of start_epoch..end_epoch the network is
+    pruned to final_sparsity * (1 - (1 - progress) ** 3), where progress is the fraction of those
+    epochs done. The training between the steps lets the remaining weights compensate.
+
+    Attributes:
+        final_sparsity (float): Fraction of the weights of each layer pruned in the end.
+        start_epoch (int): First epoch after which the network is pruned.
+        end_epoch (int): Epoch after which the final sparsity is reached.
+        sparsity (float): Fraction of the weights pruned so far.
+    """
+
+    def __init__(self, final_sparsity: float, start_epoch: int = 0, end_epoch: int = 0):
+        """Class constructor for the pruning schedule.
+
+        Args:
+            final_sparsity (float): Fraction of the weights of each layer pruned in the end.
+            start_epoch (int, optional): First epoch after which the network is pruned.
+            Defaults to 0.
+            end_epoch (int, optional): Epoch after which the final sparsity is reached.
+            Defaults to 0, pruning all at once after the first epoch.
+        """
+        self.final_sparsity = final_sparsity
+        self.start_epoch = start_epoch
+        self.end_epoch = max(start_epoch, end_epoch)
+        self.sparsity = 0.0
+        self._net = None
+
+    def on_train_begin(self, net):
+        self._net = net
+
+    def on_epoch_end(self, event: dict):
+        epoch = event["epoch"]
+        if not self.start_epoch <= epoch <= self.end_epoch:
+            return
+        progress = (epoch - self.start_epoch + 1) / (self.end_epoch - self.start_epoch + 1)
+        prune(self._net, self.final_sparsity * (1 - (1 - progress) ** 3))
+        self.sparsity = weight_sparsity(self._net)
+
+
+class CSRMatrix:
+    """Sparse matrix in compressed sparse row format.
+
+    The nonzero values of row r are data[indptr[r]:indptr[r + 1]], in the columns
+    indices[indptr[r]:indptr[r + 1]].
+
+    Attributes:
+        data (np.ndarray): Nonzero values, row by row.
+        indices (np.ndarray): Column of each nonzero value.
+        indptr (np.ndarray): Start of each row in data, and the number of nonzero values last.
+        shape (tuple): Number of rows and columns.
+    """
+
+    def __init__(self, data: np.ndarray, indices: np.ndarray, indptr: np.ndarray, shape: tuple):
+        self.data = data
+        self.indices = indices
+        self.indptr = indptr
+        self.shape = tuple(shape)
+        self._rows = np.flatnonzero(np.diff(indptr))
+        self._segments = [(r, slice(indptr[r], indptr[r + 1])) for r in self._rows]
+
+    @property
+    def nbytes(self):
+        """Size of the nonzero values and their positions in bytes.
+        """
+        return self.data.nbytes + self.indices.nbytes + self.indptr.nbytes
+
+    def dot(self, x: np.ndarray):
+        """Multiply a vector, or a matrix with one vector per column, by the sparse matrix.
+
+        A vector is multiplied with one gather and segmented sum over all the nonzero values.
+        For a matrix, each row takes one product of its nonzero values and the rows of x they
+        select, so the work is proportional to the number of nonzero values instead of the
+        size of the matrix.
+
+        Args:
+            x (np.ndarray): C-contiguous vector or matrix with shape[1] rows.
+
+        Returns:
+            np.ndarray: Product, with shape[0] rows.
+        """
+        out = np.zeros((self.shape[0],) + x.shape[1:], np.result_type(self.data, x))
+        if self._rows.size == 0:
+            return out
+        if x.ndim == 1:
+            products = self.data * x[self.indices]
+            out[self._rows] = np.add.reduceat(products, self.indptr[self._rows])
+            return out
+        for r, segment in self._segments:
+            np.dot(self.data[segment], x[self.indices[segment]], out=out[r])
+        return out
+
+
+def csr_matrix(dense: np.ndarray):
+    """Convert a matrix into CSRMatrix, leaving out its zeros.
+    """
+    rows, columns = np.nonzero(dense)
+    indptr = np.zeros(len(dense) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=len(dense)), out=indptr[1:])
+    return CSRMatrix(dense[rows, columns], columns.astype(np.int32), indptr, dense.shape)
+
+
+class SparseNetwork:
+    """Inference-only copy of a pruned network with its weight matrices in CSR format.
+
+    The forward pass touches only the weights left after pruning. With few nonzero weights per
+    row it beats the dense matrix product, which does the same work whatever the sparsity; see
+    pruning_report for where the break-even lies.
+
+    Attributes:
+        layers (list): List of integers; sizes of the layers.
+        output (str): Output layer, "sigmoid" or "softmax".
+        activations (list): List of str; activation function of each hidden layer.
+        weights (list): List of CSRMatrix; weight matrices.
+        biases (list): List of np.ndarray; biases as columns.
+        dtype (np.dtype): Floating point precision of the computation.
+    """
+
+    def __init__(self, layers: list, output: str, activations: list, weights: list,
+                 biases: list):
+        self.layers = list(layers)
+        self.output = output
+        self.activations = list(activations)
+        self.weights = weights
+        self.biases = biases
+        self.dtype = biases[0].dtype
+
+    @property
+    def nbytes(self):
+        """Size of the weights and biases in bytes.
+        """
+        return sum(w.nbytes for w in self.weights) + sum(b.nbytes for b in self.biases)
+
+    def evaluate(self, x: np.ndarray):
+        """Get the output layer activation of the sparse network with input x.
+
+        Args:
+            x (np.ndarray): Input for the neural network; a single input vector or a matrix with
+            one input per column.
+
+        Returns:
+            np.ndarray: Output layer activation, shaped like x.
+        """
+        a = np.ascontiguousarray(x, self.dtype)
+        for i, (w, b) in enumerate(zip(self.weights, self.biases)):
+            z = w.dot(a)
+            z += b if a.ndim > 1 else b[:, 0]
+            a = activate(z, i, self.activations, self.output)
+        return a
+
+    def validation_accuracy(self, data, chunk_size: int = EVALUATION_CHUNK_SIZE):
+        """Get the accuracy of the sparse network over a data set.
+
+        Args:
+            data (Dataset or list): Dataset or list of tuples; tuples of np.ndarray; inputs and
+            expected outputs.
+            chunk_size (int, optional): Number of examples evaluated at once. Defaults to
+            EVALUATION_CHUNK_SIZE.
+
+        Returns:
+            float: Fraction of the examples classified correctly.
+        """
+        data = as_dataset(data)
+        correct = 0
+        for i in range(0, len(data), chunk_size):
+            activation = self.evaluate(data.inputs[i:i + chunk_size].transpose())
+            correct += np.count_nonzero(np.argmax(activation, axis=0)
+                                        == data.labels[i:i + chunk_size])
+        return correct / len(data)
+
+
+def to_sparse(net: Network):
+    """Convert a pruned network into an inference-only network with CSR weight matrices.
+    """
+    return SparseNetwork(net.layers, net.output, net.activations,
+                         [csr_matrix(w) for w in net.weights],
+                         [b.copy()[:, np.newaxis] for b in net.biases])
+
+
+def save_sparse(snet: SparseNetwork, path: str):
+    """Save a sparse network as an .npz archive with a JSON header.
+    """
+    header = {"version": SPARSE_VERSION, "layers": snet.layers, "output": snet.output,
+              "activations": snet.activations}
+    arrays = {"header": np.frombuffer(json.dumps(header).encode("utf-8"), np.uint8)}
+    for i, (w, b) in enumerate(zip(snet.weights, snet.biases)):
+        arrays.update({f"data_{i}": w.data, f"indices_{i}": w.indices, f"indptr_{i}": w.indptr,
+                       f"biases_{i}": b})
+    with open(path, "wb") as file:
+        np.savez(file, **arrays)
+
+
+def load_sparse(path: str):
+    """Load a sparse network saved with save_sparse.
+
+    Raises:
+        ValueError: The file was written in a newer format.
+    """
+    with np.load(path) as archive:
+        header = json.loads(bytes(archive["header"]))
+        if header["version"] > SPARSE_VERSION:
+            raise ValueError(f"Unsupported sparse model version {header['version']}")
+        layers = header["layers"]
+        weights = [CSRMatrix(archive[f"data_{i}"], archive[f"indices_{i}"],
+                             archive[f"indptr_{i}"], (layers[i + 1], layers[i]))
+                   for i in range(len(layers) - 1)]
+        biases = [archive[f"biases_{i}"] for i in range(len(layers) - 1)]
+    return SparseNetwork(layers, header["output"], header["activations"], weights, biases)
+
+
+# Every parameter and measurement of the report is a local.
+# pylint: disable-next=too-many-arguments,too-many-positional-arguments,too-many-locals
+def pruning_report(net: Network,
+                   training_data,
+                   testing_data,
+                   sparsities: tuple = REPORT_SPARSITIES,
+                   epochs: int = 1,
+                   lr: float = 0.1,
+                   minibatch_size: int = 10,
+                   batch_sizes: tuple = REPORT_BATCH_SIZES,
+                   repeats: int = 10):
+    """Prune a copy of a network step by step and measure the trade-off between sparsity,
+    accuracy and speed.
+
+    At each sparsity the copy is pruned further and fine-tuned with minibatch gradient descent
+    for epochs epochs, keeping the pruned weights at zero. The dense forward pass of the network
+    and the sparse one of its to_sparse conversion are then timed at each batch size.
+
+    Args:
+        net (Network): Trained network; it is not changed.
+        training_data (Dataset or list): Data the network is fine-tuned on.
+        testing_data (Dataset or list): Data the accuracy and speed are measured on.
+        sparsities (tuple, optional): Growing fractions of the weights pruned. Defaults to
+        REPORT_SPARSITIES.
+        epochs (int, optional): Fine-tuning epochs after each pruning step. Defaults to 1.
+        lr (float, optional): Learning rate of the fine-tuning. Defaults to 0.1.
+        minibatch_size (int, optional): Mini batch size of the fine-tuning. Defaults to 10.
+        batch_sizes (tuple, optional): Batch sizes of the timed forward passes. Defaults to
+        REPORT_BATCH_SIZES.
+        repeats (int, optional): Number of timed calls of each forward pass. Defaults to 10.
+
+    Returns:
+        list: List of dict; sparsity, test accuracy, dense and sparse model sizes in bytes, and
+        the dense and sparse examples per second at each batch size, of each pruning step.
+    """
+    testing_data = as_dataset(testing_data)
+    pruned = Network(net.layers, net.dtype, net.params.copy(), net.output, net.activations)
+    results = []
+    for sparsity in sparsities:
+        if sparsity > 0:
+            prune(pruned, sparsity)
+            pruned.minibatch_gradient_descent(training_data, minibatch_size, epochs, lr)
+        sparse = to_sparse(pruned)
+        result = {"sparsity": weight_sparsity(pruned),
+                  "accuracy": pruned.validation_accuracy(testing_data),
+                  "dense_bytes": pruned.params.nbytes,
+                  "sparse_bytes": sparse.nbytes}
+        for batch_size in batch_sizes:
+            x = testing_data.inputs[:batch_size].transpose()
+            if batch_size == 1:
+                x = x[:, 0]
+            result[f"dense_examples_per_second_{batch_size}"] = measure(
+                lambda x=x: pruned.evaluate(x), batch_size, repeats)["examples_per_second"]
+            result[f"sparse_examples_per_second_{batch_size}"] = measure(
+                lambda x=x, sparse=sparse: sparse.evaluate(x), batch_size,
+                repeats)["examples_per_second"]
+        results.append(result)
+    return results
+
+
+def main():
+    model = sys.argv[1] if len(sys.argv) > 1 else "neuralnetwork"
+    training_data, _, testing_data = get_data()
+    print("sparsity, test accuracy, sparse size / dense size, "
+          + ", ".join(f"sparse speedup at batch {b}" for b in REPORT_BATCH_SIZES))
+    for row in pruning_report(load(model), training_data, testing_data):
+        speedups = ", ".join(
+            f"{row[f'sparse_examples_per_second_{b}'] / row[f'dense_examples_per_second_{b}']:.2f}x"
+            for b in REPORT_BATCH_SIZES)
+        print(f"{row['sparsity']:.2f}, {row['accuracy']:.4f}, "
+              f"{row['sparse_bytes'] / row['dense_bytes']:.2f}, {speedups}")
+
+
+if __name__ == "__main__":
+    main()
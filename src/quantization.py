@@ -0,0 +1,244 @@
+import json
+import sys
+import numpy as np
+from benchmark import measure
+from data_handling import as_dataset, get_data
+from network import EVALUATION_CHUNK_SIZE, Network, activate, load
+
+
+# Largest magnitude of a quantized weight or activation.
+INT8_MAX = 127
+
+# Version of the file written by save_quantized.
+QUANTIZED_VERSION = 1
+
+
+class QuantizedNetwork:
+    """Inference-only copy of a network with int8 weights.
+
+    Each weight matrix is stored as int8 with a float32 scale per row (or one per layer), so
+    w ~= weights[i] * scales[i]. The activations entering a layer are quantized to int8 on the
+    fly, with one scale per example. The product of the two integer matrices is computed exactly
+    with a floating point matrix product of integer values: the accumulator is float32 when the
+    largest possible sum, n_inputs * INT8_MAX ** 2, fits its 24-bit mantissa and float64
+    otherwise. The integer result is then dequantized with both scales and the float32 bias is
+    added. The weights are cast into their accumulator type once, on the first evaluation, and
+    the cast copies are reused after that; nbytes counts only the int8 weights that are saved.
+
+    Attributes:
+        layers (list): List of integers; sizes of the layers.
+        output (str): Output layer, "sigmoid" or "softmax".
+        activations (list): List of str; activation function of each hidden layer.
+        weights (list): List of np.ndarray; int8 weight matrices.
+        scales (list): List of np.ndarray; float32 scales of the weights, one per row or one per
+        layer, shaped (rows, 1).
+        biases (list): List of np.ndarray; float32 biases.
+    """
+
+    def __init__(self, layers: list, output: str, activations: list, weights: list,
+                 scales: list, biases: list):
+        self.layers = list(layers)
+        self.output = output
+        self.activations = list(activations)
+        self.weights = weights
+        self.scales = scales
+        self.biases = biases
+        self.n_inputs = layers[0]
+        self._accumulator_weights = None
+
+    @property
+    def nbytes(self):
+        """Size of the weights, scales and biases in bytes.
+        """
+        return sum(array.nbytes for array in self.weights + self.scales + self.biases)
+
+    def evaluate(self, x: np.ndarray):
+        """Get the output layer activation of the quantized network with input x.
+
+        Args:
+            x (np.ndarray): Input for the neural network; a single input vector or a matrix with
+            one input per column.
+
+        Returns:
+            np.ndarray: float32 output layer activation, shaped like x.
+        """
+        a = np.asarray(x, np.float32)
+        vector = a.ndim == 1
+        if vector:
+            a = a[:, np.newaxis]
+
+        if self._accumulator_weights is None:
+            self._accumulator_weights = [w.astype(_accumulator(w)) for w in self.weights]
+        for i, (w, scale, b) in enumerate(zip(self._accumulator_weights, self.scales,
+                                              self.biases)):
+            a_q, a_scale = quantize_columns(a, w.dtype)
+            z = np.dot(w, a_q).astype(np.float32, copy=False)
+            z *= scale
+            z *= a_scale
+            z += b
+            a = activate(z, i, self.activations, self.output)
+        return a[:, 0] if vector else a
+
+    def predict(self, data, chunk_size: int = EVALUATION_CHUNK_SIZE):
+        """Get the predicted class of every example of a data set.
+
+        Args:
+            data (Dataset or list): Dataset or list of tuples; tuples of np.ndarray; inputs and
+            expected outputs.
+            chunk_size (int, optional): Number of examples evaluated at once. Defaults to
+            EVALUATION_CHUNK_SIZE.
+
+        Returns:
+            np.ndarray: Predicted class of each example.
+        """
+        data = as_dataset(data)
+        predictions = np.empty(len(data), dtype=np.int64)
+        for i in range(0, len(data), chunk_size):
+            activation = self.evaluate(data.inputs[i:i + chunk_size].transpose())
+            predictions[i:i + chunk_size] = np.argmax(activation, axis=0)
+        return predictions
+
+    def validation_accuracy(self, data, chunk_size: int = EVALUATION_CHUNK_SIZE):
+        """Get the accuracy of the quantized network over a data set.
+
+        Args:
+            data (Dataset or list): Dataset or list of tuples; tuples of np.ndarray; inputs and
+            expected outputs.
+            chunk_size (int, optional): Number of examples evaluated at once. Defaults to
+            EVALUATION_CHUNK_SIZE.
+
+        Returns:
+            float: Fraction of the examples classified correctly.
+        """
+        data = as_dataset(data)
+        return float(np.mean(self.predict(data, chunk_size) == data.labels))
+
+
+def quantize(net: Network, per_row: bool = True):
+    """Convert a trained network into an inference-only network with int8 weights.
+
+    The weights are quantized symmetrically: the scale of a row, or of the whole layer, maps its
+    largest absolute weight to INT8_MAX and every weight is rounded to the nearest step.
+
+    Args:
+        net (Network): Trained network.
+        per_row (bool, optional): One scale per output neuron instead of one per layer.
+        Defaults to True.
+
+    Returns:
+        QuantizedNetwork: The quantized network.
+    """
+    weights, scales, biases = [], [], []
+    for w, b in zip(net.weights, net.biases):
+        largest = np.max(np.abs(w), axis=1 if per_row else None, keepdims=True)
+        scale = np.where(largest > 0, largest / INT8_MAX, 1).astype(np.float32)
+        if not per_row:
+            scale = np.broadcast_to(scale, (len(w), 1)).copy()
+        weights.append(np.rint(w / scale).astype(np.int8))
+        scales.append(scale)
+        biases.append(np.asarray(b, np.float32)[:, np.newaxis])
+    return QuantizedNetwork(net.layers, net.output, net.activations, weights, scales, biases)
+
+
+def _accumulator(w: np.ndarray):
+    """Get the smallest floating point type that sums the products of a row of w exactly.
+    """
+    return np.float32 if w.shape[1] * INT8_MAX ** 2 <= 2 ** 24 else np.float64
+
+
+def quantize_columns(a: np.ndarray, dtype=np.float32):
+    """Quantize a matrix to int8 values with one symmetric scale per column.
+
+    Args:
+        a (np.ndarray): Matrix with one example per column.
+        dtype (optional): Type of the returned integer values. Defaults to np.float32.
+
+    Returns:
+        tuple: Tuple of np.ndarray; integer values in [-INT8_MAX, INT8_MAX] stored as dtype, and
+        the float32 scale of each column shaped (1, columns).
+    """
+    largest = np.max(np.abs(a), axis=0, keepdims=True)
+    scale = np.where(largest > 0, largest / INT8_MAX, 1).astype(np.float32)
+    return np.rint(a / scale).astype(dtype, copy=False), scale
+
+
+def save_quantized(qnet: QuantizedNetwork, path: str):
+    """Save a quantized network as an .npz archive with a JSON header.
+    """
+    header = {"version": QUANTIZED_VERSION, "layers": qnet.layers, "output": qnet.output,
+              "activations": qnet.activations}
+    arrays = {"header": np.frombuffer(json.dumps(header).encode("utf-8"), np.uint8)}
+    for i, (w, scale, b) in enumerate(zip(qnet.weights, qnet.scales, qnet.biases)):
+        arrays.update({f"weights_{i}": w, f"scales_{i}": scale, f"biases_{i}": b})
+    with open(path, "wb") as file:
+        np.savez(file, **arrays)
+
+
+def load_quantized(path: str):
+    """Load a quantized network saved with save_quantized.
+
+    Raises:
+        ValueError: The file was written in a newer format.
+    """
+    with np.load(path) as archive:
+        header = json.loads(bytes(archive["header"]))
+        if header["version"] > QUANTIZED_VERSION:
+            raise ValueError(f"Unsupported quantized model version {header['version']}")
+        n = len(header["layers"]) - 1
+        arrays = [[archive[f"{name}_{i}"] for i in range(n)]
+                  for name in ("weights", "scales", "biases")]
+    return QuantizedNetwork(header["layers"], header["output"], header["activations"], *arrays)
+
+
+def quantization_report(net: Network, testing_data, per_row: bool = True,
+                        chunk_size: int = EVALUATION_CHUNK_SIZE, repeats: int = 3):
+    """Compare a network with its int8 quantization.
+
+    Args:
+        net (Network): Trained network.
+        testing_data (Dataset or list): Data the accuracy and throughput are measured on.
+        per_row (bool, optional): One scale per output neuron instead of one per layer.
+        Defaults to True.
+        chunk_size (int, optional): Number of examples evaluated at once. Defaults to
+        EVALUATION_CHUNK_SIZE.
+        repeats (int, optional): Number of timed passes over the data. Defaults to 3.
+
+    Returns:
+        dict: Model size in bytes, examples per second and accuracy of both models, and the
+        accuracy of the quantized model minus that of the float model.
+    """
+    testing_data = as_dataset(testing_data)
+    qnet = quantize(net, per_row)
+    float_accuracy = net.validation_accuracy(testing_data, chunk_size)
+    quantized_accuracy = qnet.validation_accuracy(testing_data, chunk_size)
+    n = len(testing_data)
+    return {
+        "float_bytes": net.params.nbytes,
+        "quantized_bytes": qnet.nbytes,
+        "float_examples_per_second": measure(
+            lambda: net.validation_accuracy(testing_data, chunk_size), n,
+            repeats)["examples_per_second"],
+        "quantized_examples_per_second": measure(
+            lambda: qnet.validation_accuracy(testing_data, chunk_size), n,
+            repeats)["examples_per_second"],
+        "float_accuracy": float_accuracy,
+        "quantized_accuracy": quantized_accuracy,
+        "accuracy_delta": quantized_accuracy - float_accuracy,
+    }
+
+
+def main():
+    model = sys.argv[1] if len(sys.argv) > 1 else "neuralnetwork"
+    _, _, testing = get_data()
+    for granularity, by_row in (("per-row", True), ("per-layer", False)):
+        report = quantization_report(load(model), testing, by_row)
+        print(f"{granularity} int8: {report['float_bytes'] / 1024:.0f} KiB -> "
+              f"{report['quantized_bytes'] / 1024:.0f} KiB, "
+              f"{report['float_examples_per_second']:.0f} -> "
+              f"{report['quantized_examples_per_second']:.0f} examples/s, accuracy "
+              f"{report['float_accuracy']:.4f} -> {report['quantized_accuracy']:.4f} "
+              f"({report['accuracy_delta']:+.4f})")
+
+
+if __name__ == "__main__":
+    main()
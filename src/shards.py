@@ -0,0 +1,224 @@
+import json
+import os
+import sys
+import numpy as np
+from data_handling import PREFETCH_BATCHES, BatchPipeline, Dataset, as_dataset, get_data
+
+
+# Version of the on-disk layout written by write_shards.
+SHARDS_VERSION = 1
+
+# Number of examples in one shard file by default.
+SHARD_SIZE = 10000
+
+# Number of examples in the shuffle buffer of a ShardedDataset by default.
+SHUFFLE_BUFFER_SIZE = 10000
+
+# Largest number of examples read from a shard file at once.
+READ_CHUNK_SIZE = 1000
+
+
+# The nested flush keeps the shard bookkeeping in one place.
+# pylint: disable-next=too-many-statements
+def write_shards(chunks, directory: str, shard_size: int = SHARD_SIZE):
+    """Write a data set as shards of at most shard_size examples and a manifest.
+
+    The examples are consumed chunk by chunk, so the data set never has to fit in memory; at most
+    one shard and one chunk are held at a time. Each shard is a pair of .npy files, inputs and
+    labels. The manifest is written last, so a directory with a manifest is complete.
+
+    Args:
+        chunks (Dataset or iterable): Dataset, or iterable of Dataset with the same number of
+        inputs and classes.
+        directory (str): Directory of the shards, created if needed.
+        shard_size (int, optional): Largest number of examples in a shard. Defaults to
+        SHARD_SIZE.
+
+    Returns:
+        dict: The manifest.
+    """
+    if isinstance(chunks, Dataset):
+        chunks = [chunks]
+    os.makedirs(directory, exist_ok=True)
+    manifest = {"version": SHARDS_VERSION, "n_examples": 0, "shards": []}
+    pending = []
+
+    def flush(inputs, labels):
+        name = f"shard_{len(manifest['shards']):05d}"
+        np.save(os.path.join(directory, name + "_inputs.npy"), inputs)
+        np.save(os.path.join(directory, name + "_labels.npy"), labels)
+        manifest["shards"].append({"name": name, "size": len(labels)})
+        manifest["n_examples"] += len(labels)
+
+    for chunk in chunks:
+        chunk = as_dataset(chunk)
+        manifest.update(n_inputs=chunk.inputs.shape[1], n_classes=chunk.n_classes,
+                        dtype=chunk.inputs.dtype.name)
+        pending.append((chunk.inputs, chunk.labels))
+        while sum(len(labels) for _, labels in pending) >= shard_size:
+            inputs = np.concatenate([inputs for inputs, _ in pending])
+            labels = np.concatenate([labels for _, labels in pending])
+            flush(inputs[:shard_size], labels[:shard_size])
+            pending = [(inputs[shard_size:], labels[shard_size:])]
+    if sum(len(labels) for _, labels in pending):
+        flush(np.concatenate([inputs for inputs, _ in pending]),
+              np.concatenate([labels for _, labels in pending]))
+
+    path = os.path.join(directory, "manifest.json")
+    with open(path + ".tmp", "w", encoding="utf-8") as file:
+        json.dump(manifest, file)
+    os.replace(path + ".tmp", path)
+    return manifest
+
+
+class ShardedDataset(BatchPipeline):
+    """Training data streamed from the shards written by write_shards.
+
+    An epoch visits the shards in random order and reads each one a chunk at a time. The read
+    examples go through a shuffle buffer: once the buffer is full, every example read takes the
+    slot of a randomly chosen buffered example, which is passed on to the batch. The examples are
+    thus shuffled within a window of buffer_size examples across shard boundaries, and the
+    memory used is bounded by the buffer and the prefetched batches instead of the data set size.
+
+    Like BatchPipeline, a ShardedDataset is accepted by the gradient descent methods of
+    network.Network in place of the training data. Vanilla gradient descent reads it in chunks
+    too, so every method trains in memory bounded by the batches and the buffer.
+
+    Attributes:
+        directory (str): Directory of the shards.
+        manifest (dict): Contents of the manifest of the shards.
+        buffer_size (int): Number of examples in the shuffle buffer.
+    """
+
+    # BatchPipeline.__init__ needs the data in memory; the attributes its epoch uses are set here.
+    def __init__(self, directory: str,  # pylint: disable=super-init-not-called
+                 buffer_size: int = SHUFFLE_BUFFER_SIZE, transform=None,
+                 prefetch: int = PREFETCH_BATCHES):
+        """Class constructor for the streamed data set.
+
+        Args:
+            directory (str): Directory of the shards.
+            buffer_size (int, optional): Number of examples in the shuffle buffer. Defaults to
+            SHUFFLE_BUFFER_SIZE.
+            transform (callable, optional): Function mapping an input vector to a new one of the
+            same size. Defaults to None.
+            prefetch (int, optional): Largest number of batches prepared ahead. Defaults to
+            PREFETCH_BATCHES.
+
+        Raises:
+            ValueError: The shards were written in a newer format.
+        """
+        with open(os.path.join(directory, "manifest.json"), encoding="utf-8") as file:
+            self.manifest = json.load(file)
+        if self.manifest["version"] > SHARDS_VERSION:
+            raise ValueError(f"Unsupported shard format version {self.manifest['version']}")
+        self.directory = directory
+        self.buffer_size = buffer_size
+        self.n_classes = self.manifest["n_classes"]
+        self.dtype = np.dtype(self.manifest["dtype"])
+        self.transform = transform
+        self.prefetch = prefetch
+
+    def __len__(self):
+        return self.manifest["n_examples"]
+
+    def _batches(self, batch_size: int, shuffle: bool):
+        shards = self.manifest["shards"]
+        if shuffle:
+            shards = [shards[i] for i in np.random.permutation(len(shards))]
+            rng = np.random.default_rng(np.random.randint(2**32))
+        else:
+            rng = None
+        return self._stack(self._transform(self._rebatch(self._stream(shards, rng), batch_size)))
+
+    # The shuffle buffer loop reads best in one piece.
+    # pylint: disable-next=too-many-statements
+    def _stream(self, shards: list, rng):
+        """Yield pieces of inputs and labels read from the shards, shuffled through the buffer
+        if rng is given.
+        """
+        chunk_size = min(self.buffer_size, READ_CHUNK_SIZE)
+        buffer_inputs = np.empty((self.buffer_size, self.manifest["n_inputs"]), self.dtype)
+        buffer_labels = np.empty(self.buffer_size, np.int64)
+        filled = 0
+
+        for shard in shards:
+            for inputs, labels in self._read(shard, chunk_size):
+                if rng is None:
+                    yield inputs, labels
+                    continue
+                space = min(self.buffer_size - filled, len(labels))
+                buffer_inputs[filled:filled + space] = inputs[:space]
+                buffer_labels[filled:filled + space] = labels[:space]
+                filled += space
+                if space == len(labels):
+                    continue
+                slots = rng.choice(self.buffer_size, len(labels) - space, replace=False)
+                out = buffer_inputs[slots], buffer_labels[slots]
+                buffer_inputs[slots] = inputs[space:]
+                buffer_labels[slots] = labels[space:]
+                yield out
+
+        if rng is not None:
+            rest = rng.permutation(filled)
+            for i in range(0, filled, chunk_size):
+                yield buffer_inputs[rest[i:i + chunk_size]], buffer_labels[rest[i:i + chunk_size]]
+
+    def _read(self, shard: dict, chunk_size: int):
+        """Yield the inputs and labels of a shard chunk_size examples at a time, reading only
+        those examples from the files.
+        """
+        path = os.path.join(self.directory, shard["name"])
+        with (open(path + "_inputs.npy", "rb") as inputs,
+              open(path + "_labels.npy", "rb") as labels):
+            x_shape, x_dtype = _read_npy_header(inputs)
+            _, y_dtype = _read_npy_header(labels)
+            for i in range(0, shard["size"], chunk_size):
+                n = min(chunk_size, shard["size"] - i)
+                yield (np.fromfile(inputs, x_dtype, n * x_shape[1]).reshape((n, x_shape[1])),
+                       np.fromfile(labels, y_dtype, n))
+
+    @staticmethod
+    def _rebatch(pieces, batch_size: int):
+        """Regroup pieces of any size into batches of batch_size examples; the last batch may be
+        smaller.
+        """
+        inputs, labels, n = [], [], 0
+        for x, y in pieces:
+            while len(y):
+                take = min(batch_size - n, len(y))
+                inputs.append(x[:take])
+                labels.append(y[:take])
+                x, y, n = x[take:], y[take:], n + take
+                if n == batch_size:
+                    yield np.concatenate(inputs), np.concatenate(labels), None
+                    inputs, labels, n = [], [], 0
+        if n:
+            yield np.concatenate(inputs), np.concatenate(labels), None
+
+
+def _read_npy_header(file):
+    """Read the header of a .npy file, leaving the file at the start of the data.
+
+    Returns:
+        tuple: Shape and dtype of the array.
+    """
+    version = np.lib.format.read_magic(file)
+    if version == (1, 0):
+        shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(file)
+    else:
+        shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(file)
+    if fortran_order:
+        raise ValueError(f"Shard {file.name} is not in C order")
+    return shape, dtype
+
+
+def main():
+    source = sys.argv[1] if len(sys.argv) > 1 else "data/mnist.pkl.gz"
+    target = sys.argv[2] if len(sys.argv) > 2 else "data/mnist-shards"
+    training, _, _ = get_data(source)
+    print(f"Wrote {write_shards(training, target)['n_examples']} examples to {target}")
+
+
+if __name__ == "__main__":
+    main()
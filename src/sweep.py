@@ -0,0 +1,254 @@
+import argparse
+import csv
+import itertools
+import json
+import os
+from contextlib import contextmanager
+from math import ceil
+from multiprocessing import get_context
+from time import perf_counter
+import numpy as np
+from checkpoint import train
+from data_handling import load_cache
+from network import Network
+from optimizers import OPTIMIZERS
+
+
+# Search space of sweep by default; each hyperparameter mapped to the values tried.
+SEARCH_SPACE = {
+    "method": ["minibatch"],
+    "hidden_layers": [[30], [100], [100, 30]],
+    "activation": ["sigmoid", "relu"],
+    "output": ["sigmoid"],
+    "optimizer": ["sgd"],
+    "lr": [0.1, 0.5, 1.0, 3.0],
+    "minibatch_size": [10, 50],
+}
+
+# Environment variables limiting the threads of the BLAS libraries numpy may be linked against.
+BLAS_THREAD_VARIABLES = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS",
+                         "VECLIB_MAXIMUM_THREADS", "NUMEXPR_NUM_THREADS")
+
+# Fraction of the configurations kept by each rung of successive halving is 1 / HALVING_RATE,
+# and the epochs of the survivors are multiplied by it.
+HALVING_RATE = 3
+
+# Columns of the results table written by write_table, followed by the hyperparameters.
+TABLE_FIELDS = ("rank", "trial", "validation_accuracy", "epochs", "seconds")
+
+
+def grid(space: dict):
+    """Get every combination of the values of a search space.
+
+    Args:
+        space (dict): Names of the hyperparameters mapped to lists of values.
+
+    Returns:
+        list: List of dict; the configurations.
+    """
+    names = list(space)
+    return [dict(zip(names, values)) for values in itertools.product(*space.values())]
+
+
+def random_search(space: dict, n: int, seed: int = None):
+    """Sample configurations of a search space, each value chosen uniformly at random.
+
+    Args:
+        space (dict): Names of the hyperparameters mapped to lists of values.
+        n (int): Number of configurations sampled.
+        seed (int, optional): Seed of the sampling. Defaults to None.
+
+    Returns:
+        list: List of dict; the configurations, without duplicates, at most n of them.
+    """
+    rng = np.random.default_rng(seed)
+    configurations = []
+    for _ in range(n * 10):
+        configuration = {name: values[rng.integers(len(values))]
+                         for name, values in space.items()}
+        if configuration not in configurations:
+            configurations.append(configuration)
+        if len(configurations) == n:
+            break
+    return configurations
+
+
+# Takes the whole search setup; the rest are the halving rounds.
+# pylint: disable-next=too-many-arguments,too-many-positional-arguments,too-many-locals
+def sweep(configurations: list,
+          min_epochs: int = 1,
+          max_epochs: int = 9,
+          rate: int = HALVING_RATE,
+          n_workers: int = None,
+          blas_threads: int = 1,
+          data_path: str = "data/mnist.pkl.gz",
+          n_training: int = None,
+          n_validation: int = None,
+          seed: int = 0):
+    """Train networks of many configurations concurrently, eliminating weak ones with successive
+    halving.
+
+    Every configuration is first trained for min_epochs epochs. After each rung the best
+    1 / rate of the configurations by validation accuracy continue, their total epochs
+    multiplied by rate up to max_epochs, until one configuration is left or max_epochs is
+    reached. Surviving networks continue from where they stopped, with their optimizer state and
+    random state.
+
+    The trainings run in a pool of n_workers processes, each started with its BLAS libraries
+    limited to blas_threads threads so the workers do not oversubscribe the cores. Every worker
+    memory-maps the same cache of the mnist arrays, see data_handling.load_cache, so the data is
+    in memory only once.
+
+    Args:
+        configurations (list): List of dict; configurations with the keys of SEARCH_SPACE.
+        min_epochs (int, optional): Epochs of the first rung. Defaults to 1.
+        max_epochs (int, optional): Largest number of epochs of a configuration. Defaults to 9.
+        rate (int, optional): Elimination rate of successive halving. Defaults to HALVING_RATE.
+        n_workers (int, optional): Number of worker processes. Defaults to the number of cores
+        divided by blas_threads.
+        blas_threads (int, optional): Number of BLAS threads of a worker. Defaults to 1.
+        data_path (str, optional): Path to mnist. Defaults to "data/mnist.pkl.gz".
+        n_training (int, optional): Number of training examples used, from the start of the
+        training data. Defaults to all of them.
+        n_validation (int, optional): Number of validation examples used, from the start of the
+        validation data. Defaults to all of them.
+        seed (int, optional): Seed of the trials; trial i is seeded with seed + i. Defaults to 0.
+
+    Returns:
+        list: List of dict; the trials ranked best first by epochs trained and then validation
+        accuracy, with the keys of TABLE_FIELDS and the configuration.
+    """
+    if n_workers is None:
+        n_workers = max(1, (os.cpu_count() or 1) // blas_threads)
+    load_cache(data_path)
+    trials = [{"trial": i, "validation_accuracy": None, "epochs": 0, "seconds": 0.0,
+               "config": configuration, "state": None}
+              for i, configuration in enumerate(configurations)]
+
+    survivors = trials
+    epochs = min(min_epochs, max_epochs)
+    with _blas_threads(blas_threads):
+        pool = get_context("spawn").Pool(n_workers, _worker_init,
+                                          (data_path, n_training, n_validation))
+    with pool:
+        while survivors:
+            jobs = [(trial["config"], trial["state"], epochs - trial["epochs"],
+                     seed + trial["trial"]) for trial in survivors]
+            for trial, (state, accuracy, seconds) in zip(
+                    survivors, pool.starmap(_worker_train, jobs, chunksize=1)):
+                trial.update(state=state, validation_accuracy=accuracy, epochs=epochs,
+                             seconds=trial["seconds"] + seconds)
+            if len(survivors) == 1 or epochs >= max_epochs:
+                break
+            survivors = sorted(survivors, key=lambda trial: -trial["validation_accuracy"])
+            for trial in survivors[ceil(len(survivors) / rate):]:
+                trial["state"] = None
+            survivors = survivors[:ceil(len(survivors) / rate)]
+            epochs = min(epochs * rate, max_epochs)
+
+    trials.sort(key=lambda trial: (-trial["epochs"], -trial["validation_accuracy"]))
+    return [{"rank": rank, **{field: trial[field] for field in TABLE_FIELDS[1:]},
+             **trial["config"]} for rank, trial in enumerate(trials, 1)]
+
+
+def write_table(results: list, path: str):
+    """Write ranked trials of sweep as a CSV file.
+
+    Args:
+        results (list): List of dict; the results of sweep.
+        path (str): Path of the CSV file.
+    """
+    fields = list(TABLE_FIELDS) + [key for key in results[0] if key not in TABLE_FIELDS]
+    with open(path, "w", encoding="utf-8", newline="") as file:
+        writer = csv.DictWriter(file, fields)
+        writer.writeheader()
+        writer.writerows(results)
+
+
+@contextmanager
+def _blas_threads(threads: int):
+    """Set the BLAS thread limits of the processes started inside the block.
+    """
+    previous = {name: os.environ.get(name) for name in BLAS_THREAD_VARIABLES}
+    os.environ.update((name, str(threads)) for name in BLAS_THREAD_VARIABLES)
+    try:
+        yield
+    finally:
+        for name, value in previous.items():
+            if value is None:
+                del os.environ[name]
+            else:
+                os.environ[name] = value
+
+
+# Data of a worker process, set by _worker_init.
+_WORKER = {}
+
+
+def _worker_init(data_path: str, n_training: int, n_validation: int):
+    training_data, validation_data, _ = load_cache(data_path)
+    _WORKER.update(training=training_data[:n_training], validation=validation_data[:n_validation])
+
+
+def _worker_train(config: dict, state: tuple, epochs: int, seed: int):
+    """Train a configuration for epochs more epochs.
+
+    Returns:
+        tuple: Tuple of the network, optimizer and random state to continue from, the
+        validation accuracy and the training time in seconds.
+    """
+    if state is None:
+        np.random.seed(seed)
+        layers = [784] + list(config["hidden_layers"]) + [10]
+        net = Network(layers, output=config["output"], activations=config["activation"])
+        optimizer = OPTIMIZERS[config["optimizer"]][0]()
+    else:
+        net, optimizer, random_state = state
+        np.random.set_state(random_state)
+
+    start = perf_counter()
+    train(net, _WORKER["training"], config["method"], epochs, config["lr"],
+          config["minibatch_size"], optimizer=optimizer)
+    seconds = perf_counter() - start
+    accuracy = net.validation_accuracy(_WORKER["validation"])
+    return (net, optimizer, np.random.get_state()), accuracy, seconds
+
+
+# The options and the report are read top to bottom.
+# pylint: disable-next=too-many-statements
+def main():
+    parser = argparse.ArgumentParser(description="Hyperparameter search with successive halving.")
+    parser.add_argument("--space", help="JSON file of a search space; defaults to SEARCH_SPACE.")
+    parser.add_argument("--random", type=int, metavar="N",
+                        help="Sample N configurations instead of the full grid.")
+    parser.add_argument("--min-epochs", type=int, default=1)
+    parser.add_argument("--max-epochs", type=int, default=9)
+    parser.add_argument("--rate", type=int, default=HALVING_RATE)
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--blas-threads", type=int, default=1)
+    parser.add_argument("--training-examples", type=int)
+    parser.add_argument("--validation-examples", type=int)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="sweep.csv")
+    args = parser.parse_args()
+
+    space = SEARCH_SPACE
+    if args.space:
+        with open(args.space, encoding="utf-8") as file:
+            space = json.load(file)
+    configurations = grid(space) if args.random is None else random_search(
+        space, args.random, args.seed)
+
+    results = sweep(configurations, args.min_epochs, args.max_epochs, args.rate, args.workers,
+                    args.blas_threads, n_training=args.training_examples,
+                    n_validation=args.validation_examples, seed=args.seed)
+    write_table(results, args.output)
+    for result in results:
+        config = {key: value for key, value in result.items() if key not in TABLE_FIELDS}
+        print(f"{result['rank']:>3}. accuracy {result['validation_accuracy']:.4f} after "
+              f"{result['epochs']} epochs ({result['seconds']:.1f} s): {config}")
+    print(f"Wrote {len(results)} trials to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+import unittest
+from benchmark import compare, measure_startup, run_benchmarks, throughput
+
+
+class TestBenchmark(unittest.TestCase):
+    def setUp(self):
+        self.results = run_benchmarks({"small": [20, 8, 4]}, (1, 10), n_examples=50,
+                                      repeats=1, data_path="nonexistent")
+
+    def test_every_benchmark_is_run(self):
+        names = {result["name"] for result in self.results}
+        self.assertEqual(names, {"feed_forward", "gradient_calculation",
+                                 "minibatch_gradient_descent", "vanilla_gradient_descent",
+                                 "stochastic_gradient_descent", "validation_accuracy"})
+        for result in self.results:
+            self.assertGreater(result["examples_per_second"], 0)
+            self.assertGreaterEqual(result["peak_memory_bytes"], 0)
+
+    def test_regressions_are_flagged(self):
+        slower = [dict(result, examples_per_second=result["examples_per_second"] / 2)
+                  for result in self.results]
+        self.assertEqual(compare(self.results, self.results), [])
+        self.assertEqual(len(compare(slower, self.results)), len(self.results))
+        self.assertEqual(compare(self.results, slower), [])
+
+    def test_startup_is_reported_in_launches(self):
+        result = measure_startup("nonexistent", repeats=1)
+        self.assertNotIn("examples_per_second", result)
+        rate, unit = throughput(result)
+        self.assertGreater(rate, 0)
+        self.assertEqual(unit, "launches/s")
+        self.assertEqual(throughput(self.results[0])[1], "examples/s")
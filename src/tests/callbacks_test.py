@@ -0,0 +1,130 @@
+import csv
+import json
+import os
+import tempfile
+import unittest
+import numpy as np
+from callbacks import PHASES, Callback, CSVLogger, EarlyStopping, History, JSONLinesLogger
+from data_handling import get_test_data
+from network import Network
+
+
+class TestCallbacks(unittest.TestCase):
+    def setUp(self):
+        self.test_data = get_test_data()
+        self.net = Network([784, 10, 10])
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_epoch_events_match_results(self):
+        history = History()
+        loss, accuracy = self.net.minibatch_gradient_descent(
+            self.test_data, 10, 3, 1, self.test_data, callbacks=[history])
+        self.assertEqual(len(history.epochs), 3)
+        self.assertEqual(history.batches, [])
+        for event, epoch_loss, epoch_accuracy in zip(history.epochs, loss, accuracy):
+            self.assertAlmostEqual(event["loss"], epoch_loss)
+            self.assertEqual(event["validation_accuracy"], epoch_accuracy)
+            self.assertGreater(event["examples_per_second"], 0)
+            self.assertGreater(event["validation"], 0)
+            self.assertLessEqual(event["validation"], event["seconds"])
+
+    def test_batch_events_are_sampled(self):
+        every_batch = History(sample_interval=1)
+        sampled = History(sample_interval=4)
+        self.net.minibatch_gradient_descent(
+            self.test_data, 10, 2, 1, callbacks=[every_batch, sampled])
+        n_batches = len(self.test_data) // 10
+        self.assertEqual(len(every_batch.batches), 2 * n_batches)
+        self.assertEqual([event["batch"] for event in sampled.batches],
+                         list(range(0, n_batches, 4)) * 2)
+        for event in every_batch.batches:
+            self.assertEqual(event["examples"], 10)
+            for phase in PHASES[:-1]:
+                self.assertGreaterEqual(event[phase], 0)
+            self.assertAlmostEqual(event["seconds"],
+                                   sum(event[phase] for phase in PHASES[:-1]))
+
+    def test_loggers_write_every_event(self):
+        csv_path = os.path.join(self.directory.name, "log.csv")
+        jsonl_path = os.path.join(self.directory.name, "log.jsonl")
+        self.net.stochastic_gradient_descent(
+            self.test_data, 2, 1, callbacks=[CSVLogger(csv_path, 50), JSONLinesLogger(jsonl_path)])
+
+        with open(csv_path, encoding="utf-8") as file:
+            rows = list(csv.DictReader(file))
+        self.assertEqual(sum(row["event"] == "epoch" for row in rows), 2)
+        self.assertEqual(sum(row["event"] == "batch" for row in rows),
+                         2 * len(range(0, len(self.test_data), 50)))
+
+        with open(jsonl_path, encoding="utf-8") as file:
+            events = [json.loads(line) for line in file]
+        self.assertEqual([event["epoch"] for event in events], [0, 1])
+
+    def test_loggers_are_closed_when_training_raises(self):
+        class Interrupt(Callback):
+            def on_epoch_end(self, event):
+                raise KeyboardInterrupt
+
+        logger = JSONLinesLogger(os.path.join(self.directory.name, "log.jsonl"))
+        with self.assertRaises(KeyboardInterrupt):
+            self.net.minibatch_gradient_descent(self.test_data, 10, 2, 1,
+                                                callbacks=[logger, Interrupt()])
+        self.assertIsNone(logger._file)
+
+    def test_started_loggers_are_closed_when_a_callback_fails_to_start(self):
+        class FailingStart(Callback):
+            def on_train_begin(self, net):
+                raise RuntimeError("cannot start")
+
+        logger = CSVLogger(os.path.join(self.directory.name, "log.csv"))
+        with self.assertRaises(RuntimeError):
+            self.net.minibatch_gradient_descent(self.test_data, 10, 2, 1,
+                                                callbacks=[logger, FailingStart()])
+        self.assertIsNone(logger._file)
+
+
+class TestEarlyStopping(unittest.TestCase):
+    def setUp(self):
+        self.test_data = get_test_data()
+        self.net = Network([784, 10, 10])
+
+    def test_stops_and_restores_best_parameters(self):
+        stopping = EarlyStopping(patience=2)
+        params = []
+
+        class FixedAccuracy(Callback):
+            # Replaces the measured accuracy so the plateau does not depend on the training.
+            accuracies = [0.5, 0.7, 0.6, 0.65, 0.9]
+
+            def on_epoch_end(self, event):
+                event["validation_accuracy"] = self.accuracies[event["epoch"]]
+                params.append(net.params.copy())
+
+        net = self.net
+        self.net.minibatch_gradient_descent(self.test_data, 10, 5, 1, self.test_data[:50],
+                                            callbacks=[FixedAccuracy(), stopping])
+        self.assertEqual(stopping.best_epoch, 1)
+        self.assertEqual(stopping.best_accuracy, 0.7)
+        self.assertEqual(stopping.stopped_epoch, 3)
+        self.assertEqual(len(params), 4)
+        self.assertTrue(np.array_equal(self.net.params, params[1]))
+
+    def test_own_validation_subsample(self):
+        stopping = EarlyStopping(patience=1, validation_data=self.test_data, subsample=50,
+                                 interval=2)
+        loss, accuracy = self.net.stochastic_gradient_descent(
+            self.test_data, 30, 0.1, callbacks=[stopping])
+        self.assertEqual(accuracy, [])
+        self.assertEqual(len(stopping._validation_data), 50)
+        self.assertEqual(stopping.best_epoch % 2, 1)
+        self.assertLessEqual(len(loss), 30)
+
+    def test_requires_validation(self):
+        history = History()
+        with self.assertRaises(ValueError):
+            self.net.vanilla_gradient_descent(self.test_data, 2, 1,
+                                              callbacks=[history, EarlyStopping()])
+        self.assertEqual(history.epochs, [])
@@ -0,0 +1,137 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+from callbacks import Callback
+from checkpoint import (CHECKPOINT_VERSION, CheckpointWriter, load_checkpoint, resume,
+                        train_with_checkpoints, write_checkpoint)
+from data_handling import get_test_data
+from network import Network
+from optimizers import Adam, RMSProp
+
+
+class Crash(Callback):
+    def __init__(self, epoch):
+        self.epoch = epoch
+
+    def on_epoch_end(self, event):
+        if event["epoch"] == self.epoch:
+            raise KeyboardInterrupt
+
+
+class Unwritable:
+    def __array__(self, *args, **kwargs):
+        raise ValueError("cannot be written")
+
+
+class TestCheckpoint(unittest.TestCase):
+    def setUp(self):
+        self.test_data = get_test_data()
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "checkpoint")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_resume_continues_run_exactly(self):
+        initial = Network([784, 10, 10], activations="relu")
+        np.random.seed(0)
+        uninterrupted = Network([784, 10, 10], params=initial.params.copy(), activations="relu")
+        expected = train_with_checkpoints(
+            uninterrupted, self.test_data, "minibatch", 4, 0.01, 10, self.test_data, Adam(),
+            path=self.path)
+
+        np.random.seed(0)
+        net = Network([784, 10, 10], params=initial.params.copy(), activations="relu")
+        with self.assertRaises(KeyboardInterrupt):
+            train_with_checkpoints(net, self.test_data, "minibatch", 4, 0.01, 10,
+                                   self.test_data, Adam(), [Crash(1)], self.path)
+        np.random.seed(1)
+        resumed, optimizer, histories = resume(self.path, self.test_data, self.test_data)
+
+        self.assertTrue(np.array_equal(resumed.params, uninterrupted.params))
+        self.assertEqual(resumed.activations, ["relu"])
+        self.assertEqual(optimizer.steps, 4 * len(self.test_data) // 10)
+        self.assertEqual(histories, expected)
+        self.assertEqual(len(histories[0]), 4)
+
+    def test_resume_of_finished_run_does_not_train(self):
+        net = Network([784, 10, 10])
+        train_with_checkpoints(net, self.test_data, "vanilla", 2, 1, path=self.path,
+                               interval=5)
+        resumed, optimizer, (loss, accuracy) = resume(self.path, self.test_data)
+        self.assertTrue(np.array_equal(resumed.params, net.params))
+        self.assertIsNone(optimizer)
+        self.assertEqual(len(loss), 2)
+        self.assertEqual(accuracy, [])
+
+    def test_checkpoint_interval(self):
+        net = Network([784, 10, 10])
+        params = []
+
+        class Snapshot(Callback):
+            def on_epoch_end(self, event):
+                params.append(net.params.copy())
+
+        with self.assertRaises(KeyboardInterrupt):
+            train_with_checkpoints(net, self.test_data, "stochastic", 5, 0.1,
+                                   callbacks=[Snapshot(), Crash(2)], path=self.path, interval=2)
+        saved, _, metadata = load_checkpoint(self.path)
+        self.assertEqual(metadata["epoch"], 2)
+        self.assertFalse(metadata["finished"])
+        self.assertTrue(np.array_equal(saved.params, params[1]))
+        self.assertEqual(os.listdir(self.directory.name), ["checkpoint"])
+
+    def test_optimizer_state_is_restored(self):
+        net = Network([784, 10, 10], np.float32)
+        optimizer = RMSProp(rho=0.5)
+        train_with_checkpoints(net, self.test_data, "minibatch", 1, 0.001, 10,
+                               optimizer=optimizer, path=self.path)
+        saved, restored, _ = load_checkpoint(self.path)
+        self.assertEqual(saved.dtype, np.float32)
+        self.assertIsInstance(restored, RMSProp)
+        self.assertEqual(restored.rho, 0.5)
+        self.assertEqual(restored.steps, optimizer.steps)
+        self.assertTrue(np.array_equal(restored.state["mean_square"],
+                                       optimizer.state["mean_square"]))
+
+    def test_newer_version_is_rejected(self):
+        write_checkpoint(self.path, {}, {"version": CHECKPOINT_VERSION + 1})
+        with self.assertRaises(ValueError):
+            load_checkpoint(self.path)
+
+    def test_unknown_method_is_rejected(self):
+        with self.assertRaises(ValueError):
+            train_with_checkpoints(Network([784, 10, 10]), self.test_data, "newton", 1, 1,
+                                   path=self.path)
+        with self.assertRaises(ValueError):
+            train_with_checkpoints(Network([784, 10, 10]), self.test_data, "minibatch", 1, 1,
+                                   path=self.path)
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_numpy_learning_rate_is_saved(self):
+        net = Network([784, 10, 10])
+        train_with_checkpoints(net, self.test_data[:100], "minibatch", 2, np.float32(0.1), 10,
+                               path=self.path)
+        _, _, metadata = load_checkpoint(self.path)
+        self.assertAlmostEqual(metadata["run"]["lr"], 0.1, places=6)
+        self.assertTrue(metadata["finished"])
+
+    def test_failed_write_is_raised_and_cleaned_up(self):
+        writer = CheckpointWriter()
+        writer.submit(self.path, {"params": Unwritable()}, {"version": CHECKPOINT_VERSION})
+        with self.assertRaises(ValueError):
+            writer.submit(self.path, {"params": np.zeros(3)}, {"version": CHECKPOINT_VERSION})
+            writer.close()
+        writer.close()
+        self.assertFalse([name for name in os.listdir(self.directory.name)
+                          if name.endswith(".tmp")])
+
+    def test_writer_keeps_first_error(self):
+        writer = CheckpointWriter()
+        missing = os.path.join(self.directory.name, "missing", "checkpoint")
+        writer.submit(missing, {}, {"version": CHECKPOINT_VERSION})
+        writer.submit(self.path, {"params": Unwritable()}, {"version": CHECKPOINT_VERSION})
+        with self.assertRaises(OSError):
+            writer.close()
+        self.assertEqual(os.listdir(self.directory.name), [])
@@ -0,0 +1,154 @@
+import gzip
+import os
+import pickle
+import tempfile
+import threading
+import unittest
+import numpy as np
+from data_handling import (BatchPipeline, Dataset, as_dataset, cache_directory, get_data,
+                           get_test_data, load_cache)
+from network import GRADIENT_CHUNK_SIZE, Network
+
+
+class TestDataset(unittest.TestCase):
+    def setUp(self):
+        self.inputs = np.arange(12, dtype=np.float64).reshape((4, 3))
+        self.labels = np.array([2, 0, 1, 2])
+        self.data = Dataset(self.inputs, self.labels, n_classes=3)
+
+    def test_inputs_contiguous_float32(self):
+        self.assertEqual(self.data.inputs.dtype, np.float32)
+        self.assertTrue(self.data.inputs.flags["C_CONTIGUOUS"])
+
+    def test_expected_outputs_one_hot(self):
+        outputs = self.data.expected_outputs()
+        self.assertEqual(outputs.shape, (4, 3))
+        self.assertTrue(np.array_equal(np.argmax(outputs, axis=1), self.labels))
+        self.assertTrue(np.array_equal(np.sum(outputs, axis=1), np.ones(4)))
+
+    def test_slices_do_not_copy(self):
+        x, _ = self.data.batch(slice(1, 3))
+        self.assertTrue(np.shares_memory(x, self.data.inputs))
+        self.assertTrue(np.shares_memory(self.data[1:3].inputs, self.data.inputs))
+
+    def test_pairs_round_trip(self):
+        pairs = [(np.array([1, 1]), np.array([0])),
+                 (np.array([0, 1]), np.array([1]))]
+        data = as_dataset(pairs)
+        self.assertEqual(len(data), 2)
+        for (x1, y1), (x2, y2) in zip(pairs, data):
+            self.assertTrue(np.array_equal(x1, x2))
+            self.assertTrue(np.array_equal(y1, y2))
+        self.assertIs(as_dataset(data), data)
+        self.assertEqual(data.inputs.dtype, np.float32)
+
+    def test_pairs_keep_float_precision(self):
+        pairs = [(np.random.rand(3), np.array([0, 1])) for _ in range(4)]
+        data = as_dataset(pairs)
+        self.assertEqual(data.inputs.dtype, np.float64)
+        self.assertTrue(np.array_equal(data.inputs, [x for x, _ in pairs]))
+
+
+class TestBatchPipeline(unittest.TestCase):
+    def setUp(self):
+        self.data = Dataset(np.random.rand(25, 4), np.random.randint(0, 3, 25), n_classes=3)
+
+    def test_epoch_covers_every_example_once(self):
+        pipeline = BatchPipeline(self.data)
+        batches = [batch for batch, _ in pipeline.epoch(10)]
+        self.assertEqual([len(batch) for batch in batches], [10, 10, 5])
+        inputs = np.concatenate([batch.inputs for batch in batches])
+        self.assertTrue(np.array_equal(np.sort(inputs, axis=0), np.sort(self.data.inputs, axis=0)))
+
+    def test_transform_applied_to_each_example(self):
+        pipeline = BatchPipeline(self.data, transform=lambda x: 2 * x)
+        inputs = np.concatenate([batch.inputs for batch, _ in pipeline.epoch(10, False)])
+        self.assertTrue(np.allclose(inputs, 2 * self.data.inputs))
+
+    def test_transform_errors_raised_in_caller(self):
+        def transform(x):
+            raise ValueError("bad example")
+        with self.assertRaises(ValueError):
+            list(BatchPipeline(self.data, transform).epoch(10))
+
+    def test_stopping_early_ends_producer(self):
+        threads = threading.active_count()
+        for _ in BatchPipeline(self.data, prefetch=1).epoch(1):
+            break
+        self.assertEqual(threading.active_count(), threads)
+
+    def test_training_matches_dataset(self):
+        test_data = get_test_data()
+        net1 = Network([784, 10, 10])
+        net2 = Network([784, 10, 10], params=net1.params.copy())
+        np.random.seed(0)
+        loss1, _ = net1.minibatch_gradient_descent(test_data, 10, 2, 1)
+        np.random.seed(0)
+        loss2, _ = net2.minibatch_gradient_descent(BatchPipeline(test_data), 10, 2, 1)
+        self.assertTrue(np.allclose(loss1, loss2))
+        self.assertTrue(np.allclose(net1.params, net2.params))
+
+    def test_vanilla_training_reads_chunks(self):
+        data = Dataset(np.random.rand(2500, 20), np.random.randint(0, 3, 2500), n_classes=3)
+        sizes = []
+
+        class RecordingPipeline(BatchPipeline):
+            def epoch(self, batch_size, shuffle=True):
+                sizes.append(batch_size)
+                yield from super().epoch(batch_size, shuffle)
+
+        net1 = Network([20, 10, 3])
+        net2 = Network([20, 10, 3], params=net1.params.copy())
+        loss1, _ = net1.vanilla_gradient_descent(data, 2, 1)
+        loss2, _ = net2.vanilla_gradient_descent(RecordingPipeline(data), 2, 1)
+        self.assertEqual(sizes, [GRADIENT_CHUNK_SIZE] * 2)
+        self.assertTrue(np.allclose(loss1, loss2))
+        self.assertTrue(np.allclose(net1.params, net2.params))
+
+
+class TestCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "mnist.pkl.gz")
+        self.write_source(0)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def write_source(self, offset):
+        splits = []
+        for n in (6, 4, 2):
+            inputs = np.full((n, 784), offset, dtype=np.float32)
+            labels = np.arange(n) % 10
+            splits.append((inputs, labels))
+        with gzip.open(self.path, "wb") as file:
+            pickle.dump(tuple(splits), file)
+
+    def test_missing_source_leaves_no_cache_directory(self):
+        path = os.path.join(self.directory.name, "missing.pkl.gz")
+        with self.assertRaises(FileNotFoundError):
+            load_cache(path)
+        self.assertFalse(os.path.exists(cache_directory(path)))
+
+    def test_cached_data_memory_mapped(self):
+        training_data, validation_data, testing_data = load_cache(self.path)
+        self.assertEqual(
+            [len(training_data), len(validation_data), len(testing_data)], [6, 4, 2])
+        mapped = np.load(os.path.join(cache_directory(self.path), "training_inputs.npy"),
+                         mmap_mode="r")
+        self.assertIsInstance(mapped, np.memmap)
+        self.assertFalse(training_data.inputs.flags["WRITEABLE"])
+
+    def test_cache_matches_uncached(self):
+        cached = load_cache(self.path)
+        uncached = get_data(self.path, cache=False)
+        for data1, data2 in zip(cached, uncached):
+            self.assertTrue(np.array_equal(data1.inputs, data2.inputs))
+            self.assertTrue(np.array_equal(data1.labels, data2.labels))
+
+    def test_changed_source_invalidates_cache(self):
+        load_cache(self.path)
+        self.write_source(1)
+        os.utime(self.path, ns=(0, 0))
+        training_data, _, _ = load_cache(self.path)
+        self.assertTrue(np.all(training_data.inputs == 1))
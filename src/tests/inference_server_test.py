@@ -0,0 +1,96 @@
+import asyncio
+import json
+import unittest
+import numpy as np
+from inference_server import InferenceServer, generate_load, request_stats
+from network import Network
+
+
+class TestInferenceServer(unittest.TestCase):
+    def setUp(self):
+        self.net = Network([20, 8, 4])
+        self.inputs = np.random.rand(50, 20)
+
+    def serve(self, client, **kwargs):
+        async def run():
+            server = InferenceServer(self.net, **kwargs)
+            port = await server.start()
+            try:
+                return await client(port), server.stats.snapshot()
+            finally:
+                await server.stop()
+        return asyncio.run(run())
+
+    def test_answers_match_network(self):
+        async def client(port):
+            return await generate_load("127.0.0.1", port, self.inputs, 100, 8)
+
+        (classes, client_stats), server_stats = self.serve(client)
+        expected = np.argmax(self.net.evaluate(self.inputs.transpose()), axis=0)
+        for i, predicted in enumerate(classes):
+            self.assertEqual(predicted, expected[i % len(expected)])
+        self.assertGreater(client_stats["requests_per_second"], 0)
+        self.assertEqual(server_stats["requests"], 100)
+
+    def test_requests_are_batched(self):
+        async def client(port):
+            await generate_load("127.0.0.1", port, self.inputs, 64, 16)
+            return await request_stats("127.0.0.1", port)
+
+        stats, _ = self.serve(client, max_batch_size=16, max_wait=0.05)
+        self.assertEqual(stats["requests"], 64)
+        self.assertLess(stats["batches"], 64)
+        self.assertGreater(stats["mean_batch_size"], 1)
+        self.assertLessEqual(stats["mean_batch_size"], 16)
+
+    def test_bad_requests_are_answered(self):
+        requests = [b"not json\n", b"[1, 2]\n", b'{"id": 7}\n', b'{"input": ["a", "b"]}\n',
+                    b'{"input": [1, 2]}\n', b'{"input": {"x": 1}}\n']
+
+        async def client(port):
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            responses = []
+            for request in requests + [json.dumps({"input": self.inputs[0].tolist()}).encode()
+                                       + b"\n"]:
+                writer.write(request)
+                await writer.drain()
+                responses.append(json.loads(await reader.readline()))
+            writer.close()
+            await writer.wait_closed()
+            return responses
+
+        responses, _ = self.serve(client)
+        for response in responses[:-1]:
+            self.assertIn("error", response)
+        self.assertEqual(responses[2]["id"], 7)
+        self.assertIn("class", responses[-1])
+
+    def test_failed_evaluation_does_not_stop_batching(self):
+        evaluate = self.net.evaluate
+        calls = []
+
+        def failing_once(x):
+            calls.append(x)
+            if len(calls) == 1:
+                raise RuntimeError("out of memory")
+            return evaluate(x)
+
+        self.net.evaluate = failing_once
+
+        async def client(port):
+            first = await request_input(port, self.inputs[0])
+            second = await request_input(port, self.inputs[1])
+            return first, second
+
+        (first, second), _ = self.serve(client)
+        self.assertIn("error", first)
+        self.assertEqual(second["class"], int(np.argmax(evaluate(self.inputs[1]))))
+
+
+async def request_input(port, x):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(json.dumps({"input": x.tolist()}).encode() + b"\n")
+    response = json.loads(await reader.readline())
+    writer.close()
+    await writer.wait_closed()
+    return response
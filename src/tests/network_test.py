@@ -1,7 +1,12 @@
+import os
+import pickle
+import tempfile
+import tracemalloc
 import unittest
 import numpy as np
-from network import Network, save, load
-from data_handling import get_test_data
+from network import ACTIVATIONS, MODEL_MAGIC, Network, is_pickled, save, load, migrate
+from data_handling import Dataset, get_test_data
+from workspace import Workspace
 
 
 class TestNetwork(unittest.TestCase):
@@ -39,6 +44,41 @@ class TestNetwork(unittest.TestCase):
                 self.net.weights[i - 1].shape[1], self.layers[i - 1])
             self.assertEqual(self.net.biases[i - 1].shape[0], self.layers[i])
 
+    def test_weights_and_biases_are_views_of_params(self):
+        self.assertEqual(self.net.params.ndim, 1)
+        self.assertEqual(len(self.net.params),
+                         sum(w.size + b.size for w, b in zip(self.net.weights, self.net.biases)))
+        for weight, bias in zip(self.net.weights, self.net.biases):
+            self.assertTrue(np.shares_memory(weight, self.net.params))
+            self.assertTrue(np.shares_memory(bias, self.net.params))
+
+    def test_update_changes_params_in_place(self):
+        params = self.net.params
+        weight_d, bias_d, _ = self.net._gradient_calculation(self.inputs1, self.output1)
+        expected = [w - 0.5 * wd for w, wd in zip(self.net.weights, weight_d)]
+        copies = [d.copy() for d in weight_d + bias_d]
+        self.net._update_weights_and_biases(weight_d, bias_d, 0.5)
+        self.assertIs(self.net.params, params)
+        for w1, w2 in zip(expected, self.net.weights):
+            self.assertTrue(np.allclose(w1, w2))
+        for d, copy in zip(weight_d + bias_d, copies):
+            self.assertTrue(np.array_equal(d, copy))
+
+    def test_update_rejects_misshaped_derivatives(self):
+        weight_d, bias_d, _ = self.net._gradient_calculation(self.inputs1, self.output1)
+        with self.assertRaises(ValueError):
+            self.net._update_weights_and_biases(weight_d[::-1], bias_d, 0.5)
+
+    def test_workspace_rejects_out_of_range_indices(self):
+        data = Dataset(np.zeros((5, self.net.layers[0])), np.zeros(5), self.net.layers[-1])
+        workspace = Workspace(self.net.layers, 2)
+        for index in ([0, 5], [-1, 0]):
+            with self.assertRaises(IndexError):
+                workspace.load(data, np.array(index))
+        with self.assertRaises(IndexError):
+            workspace.load(Dataset(data.inputs, np.full(5, 99), self.net.layers[-1]),
+                           np.array([0, 1]))
+
     def test_activations_right_type(self):
         activations = self.net.feed_forward(self.inputs1)
         for activation in activations:
@@ -64,6 +104,80 @@ class TestNetwork(unittest.TestCase):
             self.assertEqual(wd.shape, w.shape)
             self.assertEqual(bd.shape, b.shape)
 
+    def test_batched_gradient_is_sum_of_example_gradients(self):
+        x = np.column_stack([self.inputs1, self.inputs2])
+        y = np.column_stack([self.output1, self.output2])
+        weight_d, bias_d, loss = self.net._gradient_calculation(x, y)
+        weight_d1, bias_d1, loss1 = self.net._gradient_calculation(
+            self.inputs1, self.output1)
+        weight_d2, bias_d2, loss2 = self.net._gradient_calculation(
+            self.inputs2, self.output2)
+        for wd, wd1, wd2 in zip(weight_d, weight_d1, weight_d2):
+            self.assertTrue(np.allclose(wd, wd1 + wd2))
+        for bd, bd1, bd2 in zip(bias_d, bias_d1, bias_d2):
+            self.assertTrue(np.allclose(bd, bd1 + bd2))
+        self.assertAlmostEqual(loss, loss1 + loss2)
+
+    def test_training_steps_do_not_allocate(self):
+        net = Network([784, 64, 10])
+        gradient = np.empty_like(net.params)
+        order = np.arange(len(self.test_data))
+
+        def steps():
+            for i in range(0, len(order) - 32, 32):
+                net._batch_gradient(self.test_data, order[i:i + 32], gradient)
+                net._update_params(gradient, 0.1)
+
+        steps()
+        tracemalloc.start()
+        steps()
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        for _ in range(10):
+            steps()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        # One batch of inputs alone takes 32 * 784 * 8 bytes.
+        self.assertLess(peak - before, 16 * 1024)
+
+    def test_float32_network_stays_float32(self):
+        net = Network([784, 10, 10], np.float32)
+        self.assertEqual(net.params.dtype, np.float32)
+        net.minibatch_gradient_descent(self.test_data, 10, 1, 1)
+        self.assertEqual(net.params.dtype, np.float32)
+        for w in net.weights:
+            self.assertEqual(w.dtype, np.float32)
+        self.assertEqual(net.evaluate(self.inputs1[:1].repeat(784)).dtype, np.float32)
+
+    def test_float64_training_on_pairs_keeps_precision(self):
+        pairs = [(np.random.rand(10), np.random.rand(4)) for _ in range(6)]
+        reference = Network(self.layers, params=self.net.params.copy())
+        x = np.column_stack([x for x, _ in pairs])
+        y = np.column_stack([y for _, y in pairs])
+        weight_d, bias_d, loss = reference._gradient_calculation(x, y)
+        reference._update_weights_and_biases(weight_d, bias_d, self.lr / len(pairs))
+        losses, _ = self.net.vanilla_gradient_descent(pairs, 1, self.lr)
+        self.assertTrue(np.allclose(self.net.params, reference.params, rtol=1e-12, atol=0))
+        self.assertTrue(np.isclose(losses[0], loss / len(pairs), rtol=1e-12, atol=0))
+
+    def test_float32_gradient_close_to_float64(self):
+        net32 = Network(self.layers, np.float32)
+        net32.params[...] = self.net.params
+        x = np.column_stack([self.inputs1, self.inputs2])
+        y = np.column_stack([self.output1, self.output2])
+        weight_d64, _, loss64 = self.net._gradient_calculation(x, y)
+        weight_d32, _, loss32 = net32._gradient_calculation(x, y)
+        for wd64, wd32 in zip(weight_d64, weight_d32):
+            self.assertTrue(np.allclose(wd64, wd32, atol=1e-5))
+        self.assertAlmostEqual(loss64, loss32, places=4)
+
+    def test_float32_sigmoid_does_not_overflow(self):
+        net = Network([2, 1], np.float32)
+        net.weights[0][...] = -1000
+        with np.errstate(over="raise"):
+            activation = net.evaluate(np.array([1, 1]))
+        self.assertTrue(np.all(np.isfinite(activation)))
+
     def test_vanilla_gradient_descends(self):
         ep = 2000
         learning_data, _ = self.small_net.vanilla_gradient_descent(
@@ -103,6 +217,148 @@ class TestNetwork(unittest.TestCase):
             self.assertTrue(np.array_equal(w1, w2))
         for b1, b2 in zip(net1.biases, net2.biases):
             self.assertTrue(np.array_equal(b1, b2))
+        for w in net2.weights:
+            self.assertTrue(np.shares_memory(w, net2.params))
+
+    def test_saved_file_format(self):
+        net = Network([3, 4, 2], np.float32)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "net")
+            save(net, path)
+            with open(path, "rb") as file:
+                self.assertEqual(file.read(len(MODEL_MAGIC)), MODEL_MAGIC)
+            self.assertEqual(os.listdir(directory), ["net"])
+            net2 = load(path)
+        self.assertEqual(net2.layers, [3, 4, 2])
+        self.assertEqual(net2.dtype, np.float32)
+        self.assertTrue(np.array_equal(net.params, net2.params))
+
+    def test_load_memory_mapped(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "net")
+            save(self.net, path)
+            net2 = load(path, mmap_mode="r")
+            self.assertIsInstance(net2.params, np.memmap)
+            self.assertTrue(np.array_equal(self.net.evaluate(self.inputs1),
+                                           net2.evaluate(self.inputs1)))
+            net3 = load(path, mmap_mode="c")
+            net3.stochastic_gradient_descent([(self.inputs1, self.output1)], 1, 1)
+            self.assertTrue(np.array_equal(load(path).params, self.net.params))
+            del net2, net3
+
+    def test_pickled_network_migrates(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "net")
+            with open(path, "wb") as file:
+                pickle.dump(self.net, file)
+            with self.assertRaises(ValueError):
+                load(path)
+            self.assertTrue(is_pickled(path))
+            migrate(path)
+            self.assertFalse(is_pickled(path))
+            net2 = load(path)
+        self.assertTrue(np.array_equal(self.net.params, net2.params))
+
+    def test_truncated_or_foreign_file_rejected(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "net")
+            save(self.net, path)
+            with open(path, "rb") as file:
+                content = file.read()
+            for broken in (content[:-8], content[:len(MODEL_MAGIC) + 3], b"garbage"):
+                with open(path, "wb") as file:
+                    file.write(broken)
+                with self.assertRaises(ValueError):
+                    load(path)
+                self.assertFalse(is_pickled(path))
+
+    def test_unknown_output_rejected(self):
+        with self.assertRaises(ValueError):
+            Network([2, 3, 2], output="relu")
+
+    def test_softmax_outputs_are_distributions(self):
+        net = Network(self.layers, output="softmax")
+        x = np.column_stack([self.inputs1, self.inputs2])
+        self.assertTrue(np.allclose(np.sum(net.evaluate(x), axis=0), 1))
+        self.assertAlmostEqual(np.sum(net.evaluate(self.inputs1)), 1)
+        net.params *= 1000
+        self.assertTrue(np.all(np.isfinite(net.evaluate(x))))
+
+    def assert_gradient_matches_finite_differences(self, net, x, y, msg=None):
+        weight_d, bias_d, _ = net._gradient_calculation(x, y)
+        gradient = np.concatenate([d.ravel() for pair in zip(weight_d, bias_d) for d in pair])
+        numerical = np.empty_like(gradient)
+        for i in range(len(net.params)):
+            original = net.params[i]
+            net.params[i] = original + 1e-6
+            loss_plus = net._loss(net.evaluate(x), y)
+            net.params[i] = original - 1e-6
+            loss_minus = net._loss(net.evaluate(x), y)
+            net.params[i] = original
+            numerical[i] = (loss_plus - loss_minus) / 2e-6
+        self.assertTrue(np.allclose(gradient, numerical, atol=1e-6), msg)
+
+    def test_softmax_gradient_matches_finite_differences(self):
+        net = Network([4, 3, 3], output="softmax")
+        x = np.random.rand(4, 2)
+        y = np.array([[1, 0], [0, 0], [0, 1]])
+        self.assert_gradient_matches_finite_differences(net, x, y)
+
+    def test_activation_gradients_match_finite_differences(self):
+        x = np.random.randn(4, 3)
+        y = np.eye(3)
+        for activation in ACTIVATIONS:
+            net = Network([4, 5, 3, 3], activations=activation)
+            self.assert_gradient_matches_finite_differences(net, x, y, activation)
+
+    def test_activations_per_layer(self):
+        net = Network([784, 300, 300, 10], activations=["relu", "tanh"])
+        self.assertEqual(net.activations, ["relu", "tanh"])
+        self.assertAlmostEqual(np.std(net.weights[0]), np.sqrt(2 / 784), delta=0.002)
+        self.assertAlmostEqual(np.std(net.weights[1]), np.sqrt(2 / 600), delta=0.002)
+        activations = net.feed_forward(np.random.randn(784, 5))
+        self.assertTrue(np.all(activations[0] >= 0))
+        self.assertTrue(np.all(np.abs(activations[1]) < 1))
+        with self.assertRaises(ValueError):
+            Network([2, 3, 2], activations="softplus")
+        with self.assertRaises(ValueError):
+            Network([2, 3, 3, 2], activations=["relu"])
+
+    def test_activations_saved(self):
+        net = Network([3, 4, 4, 2], activations=["leaky_relu", "fast_sigmoid"])
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "net")
+            save(net, path)
+            self.assertEqual(load(path).activations, ["leaky_relu", "fast_sigmoid"])
+
+    def test_deep_relu_network_overfits(self):
+        net = Network([784, 32, 32, 32, 32, 10], activations="relu", output="softmax")
+        for _ in range(50):
+            _, accuracy_list = net.minibatch_gradient_descent(
+                self.test_data, 10, 1, 0.05, self.test_data)
+            if accuracy_list[0] == 1:
+                break
+        self.assertEqual(accuracy_list[0], 1)
+
+    def test_softmax_output_saved(self):
+        net = Network([3, 4, 2], output="softmax")
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "net")
+            save(net, path)
+            self.assertEqual(load(path).output, "softmax")
+            with open(path, "wb") as file:
+                pickle.dump(net, file)
+            self.assertEqual(migrate(path).output, "softmax")
+
+    def test_model_overfits_softmax(self):
+        net = Network([784, 10, 10], output="softmax")
+        for _ in range(50):
+            _, accuracy_list = net.minibatch_gradient_descent(
+                self.test_data, 10, 1, 0.5, self.test_data)
+            if accuracy_list[0] == 1:
+                break
+        self.assertEqual(accuracy_list[0], 1)
+        self.assertGreater(net.overall_loss(self.test_data), 0)
 
     def test_overall_loss_reasonable(self):
         data = [(self.inputs1, self.output1), (self.inputs2, self.output2)]
@@ -115,6 +371,23 @@ class TestNetwork(unittest.TestCase):
         self.assertLessEqual(0, acc)
         self.assertLessEqual(acc, 1)
 
+    def test_bulk_evaluation_matches_single_examples(self):
+        evaluation = self.mnist_net.bulk_evaluate(self.test_data, chunk_size=7)
+        loss = 0
+        for i, (x, y) in enumerate(self.test_data):
+            activation = self.mnist_net.evaluate(x)
+            loss += self.mnist_net._loss(activation, y)
+            self.assertEqual(evaluation.predictions[i], np.argmax(activation))
+        self.assertAlmostEqual(evaluation.loss, loss / len(self.test_data))
+
+    def test_confusion_matrix_counts_examples(self):
+        evaluation = self.mnist_net.bulk_evaluate(self.test_data)
+        confusion = evaluation.confusion
+        self.assertEqual(confusion.shape, (10, 10))
+        self.assertEqual(np.sum(confusion), len(self.test_data))
+        self.assertAlmostEqual(np.trace(confusion) / len(self.test_data),
+                               evaluation.accuracy)
+
     def test_model_overfits_vanilla(self):
         for _ in range(100):
             _, accuracy_list = self.mnist_net.vanilla_gradient_descent(
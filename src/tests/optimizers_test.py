@@ -0,0 +1,75 @@
+import tracemalloc
+import unittest
+import numpy as np
+from data_handling import get_test_data
+from network import Network
+from optimizers import SGD, Adam, Momentum, Nesterov, RMSProp, compare_optimizers
+
+
+class TestOptimizers(unittest.TestCase):
+    def setUp(self):
+        self.test_data = get_test_data()
+        self.gradients = [np.random.randn(5) * t for t in range(1, 6)]
+
+    def run_steps(self, optimizer, lr=0.1):
+        params = np.zeros(5)
+        for gradient in self.gradients:
+            optimizer.step(params, gradient.copy(), lr)
+        return params
+
+    def test_sgd_matches_default_update(self):
+        net1 = Network([784, 10, 10])
+        net2 = Network([784, 10, 10], params=net1.params.copy())
+        np.random.seed(0)
+        net1.minibatch_gradient_descent(self.test_data, 10, 2, 1)
+        np.random.seed(0)
+        net2.minibatch_gradient_descent(self.test_data, 10, 2, 1, optimizer=SGD())
+        self.assertTrue(np.allclose(net1.params, net2.params))
+
+    def test_momentum(self):
+        velocity, expected = np.zeros(5), np.zeros(5)
+        for gradient in self.gradients:
+            velocity = 0.9 * velocity + gradient
+            expected -= 0.1 * velocity
+        self.assertTrue(np.allclose(self.run_steps(Momentum()), expected))
+
+    def test_nesterov(self):
+        velocity, expected = np.zeros(5), np.zeros(5)
+        for gradient in self.gradients:
+            velocity = 0.9 * velocity + gradient
+            expected -= 0.1 * (gradient + 0.9 * velocity)
+        self.assertTrue(np.allclose(self.run_steps(Nesterov()), expected))
+
+    def test_rmsprop(self):
+        mean_square, expected = np.zeros(5), np.zeros(5)
+        for gradient in self.gradients:
+            mean_square = 0.9 * mean_square + 0.1 * gradient ** 2
+            expected -= 0.1 * gradient / (np.sqrt(mean_square) + 1e-8)
+        self.assertTrue(np.allclose(self.run_steps(RMSProp()), expected))
+
+    def test_adam(self):
+        mean, mean_square, expected = np.zeros(5), np.zeros(5), np.zeros(5)
+        for t, gradient in enumerate(self.gradients, 1):
+            mean = 0.9 * mean + 0.1 * gradient
+            mean_square = 0.999 * mean_square + 0.001 * gradient ** 2
+            expected -= 0.1 * (mean / (1 - 0.9 ** t)) / (
+                np.sqrt(mean_square / (1 - 0.999 ** t)) + 1e-8)
+        self.assertTrue(np.allclose(self.run_steps(Adam()), expected))
+
+    def test_steps_do_not_allocate(self):
+        params = np.zeros(10000)
+        gradient = np.ones(10000)
+        for optimizer in (SGD(), Momentum(), Nesterov(), RMSProp(), Adam()):
+            optimizer.step(params, gradient, 0.1)
+            tracemalloc.start()
+            for _ in range(10):
+                optimizer.step(params, gradient, 0.1)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            self.assertLess(peak, 10000 * 8)
+
+    def test_every_optimizer_trains(self):
+        results = compare_optimizers([784, 10, 10], self.test_data, self.test_data, 10, 0.99, 30)
+        for epochs, _, accuracy in results.values():
+            self.assertIsNotNone(epochs)
+            self.assertEqual(len(accuracy), epochs)
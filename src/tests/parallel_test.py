@@ -0,0 +1,88 @@
+import unittest
+from multiprocessing import shared_memory
+import numpy as np
+from data_handling import get_test_data
+from network import Network
+from parallel import (DataParallelTrainer, compare_hogwild, hogwild_gradient_descent,
+                      parallel_minibatch_gradient_descent, parallel_vanilla_gradient_descent)
+
+
+class TestDataParallel(unittest.TestCase):
+    def setUp(self):
+        self.test_data = get_test_data()
+        self.serial_net = Network([784, 10, 10])
+        self.parallel_net = Network([784, 10, 10])
+        for w1, w2 in zip(self.serial_net.weights, self.parallel_net.weights):
+            w2[...] = w1
+
+    def assert_same_parameters(self):
+        for p1, p2 in zip(self.serial_net.weights + self.serial_net.biases,
+                          self.parallel_net.weights + self.parallel_net.biases):
+            self.assertTrue(np.allclose(p1, p2))
+
+    def test_vanilla_matches_serial(self):
+        loss1, _ = self.serial_net.vanilla_gradient_descent(self.test_data, 3, 1)
+        loss2, _ = parallel_vanilla_gradient_descent(
+            self.parallel_net, self.test_data, 3, 1, n_workers=3)
+        self.assertTrue(np.allclose(loss1, loss2))
+        self.assert_same_parameters()
+
+    def test_minibatch_matches_serial(self):
+        np.random.seed(0)
+        loss1, _ = self.serial_net.minibatch_gradient_descent(self.test_data, 16, 2, 1)
+        np.random.seed(0)
+        loss2, accuracy = parallel_minibatch_gradient_descent(
+            self.parallel_net, self.test_data, 16, 2, 1, self.test_data, n_workers=2)
+        self.assertTrue(np.allclose(loss1, loss2))
+        self.assertEqual(len(accuracy), 2)
+        self.assert_same_parameters()
+
+    def test_network_keeps_parameters_after_training(self):
+        parallel_vanilla_gradient_descent(self.parallel_net, self.test_data, 1, 1)
+        weights = [w.copy() for w in self.parallel_net.weights]
+        self.parallel_net.vanilla_gradient_descent(self.test_data, 1, 1)
+        for w1, w2 in zip(weights, self.parallel_net.weights):
+            self.assertFalse(np.array_equal(w1, w2))
+
+    def test_failed_start_frees_shared_memory(self):
+        names = []
+
+        class FailingTrainer(DataParallelTrainer):
+            def _share(self, array):
+                if len(names) == 3:
+                    raise MemoryError
+                shared = super()._share(array)
+                names.append(self._memory[-1].name)
+                return shared
+
+        params = self.parallel_net.params
+        with self.assertRaises(MemoryError):
+            FailingTrainer(self.parallel_net, self.test_data, 2)
+        self.assertIs(self.parallel_net.params, params)
+        self.assertEqual(len(names), 3)
+        for name in names:
+            with self.assertRaises(FileNotFoundError):
+                shared_memory.SharedMemory(name=name)
+
+    def test_workers_are_checked_before_allocating(self):
+        class RecordingTrainer(DataParallelTrainer):
+            def _share(self, array):
+                raise AssertionError("shared memory allocated")
+
+        with self.assertRaises(ValueError):
+            RecordingTrainer(self.parallel_net, self.test_data, 0)
+
+    def test_hogwild_overfits(self):
+        for _ in range(50):
+            _, accuracy_list = hogwild_gradient_descent(
+                self.parallel_net, self.test_data, 1, 0.1, self.test_data, n_workers=3)
+            if accuracy_list[0] == 1:
+                break
+        self.assertEqual(accuracy_list[0], 1)
+
+    def test_hogwild_comparison_covers_serial(self):
+        results = compare_hogwild([784, 10, 10], self.test_data, self.test_data, 1, 0.1, (2,))
+        self.assertEqual(sorted(results), [0, 2])
+        for speed, accuracy in results.values():
+            self.assertGreater(speed, 0)
+            self.assertEqual(len(accuracy), 1)
@@ -0,0 +1,136 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+from callbacks import Callback
+from data_handling import get_test_data
+from checkpoint import load_checkpoint, train_with_checkpoints
+from network import ACTIVATIONS, Network, load, save
+from optimizers import Adam
+from pruning import (IterativePruning, load_sparse, prune, pruning_report, save_sparse, to_sparse,
+                     weight_sparsity)
+
+
+class TestPruning(unittest.TestCase):
+    def setUp(self):
+        self.test_data = get_test_data()
+        self.net = Network([784, 30, 20, 10])
+        self.x = self.test_data.inputs[:20].transpose()
+
+    def test_smallest_weights_of_each_layer_are_pruned(self):
+        weights = [w.copy() for w in self.net.weights]
+        biases = [b.copy() for b in self.net.biases]
+        self.assertAlmostEqual(prune(self.net, 0.8), 0.8, places=3)
+        for before, after in zip(weights, self.net.weights):
+            kept = after != 0
+            self.assertAlmostEqual(np.mean(kept), 0.2, places=2)
+            self.assertLessEqual(np.max(np.abs(before[~kept])), np.min(np.abs(before[kept])))
+            self.assertTrue(np.array_equal(after[kept], before[kept]))
+        for before, after in zip(biases, self.net.biases):
+            self.assertTrue(np.array_equal(before, after))
+
+    def test_pruning_again_keeps_pruned_weights(self):
+        prune(self.net, 0.5)
+        pruned = [w == 0 for w in self.net.weights]
+        prune(self.net, 0.7)
+        for earlier, w in zip(pruned, self.net.weights):
+            self.assertTrue(np.all(w[earlier] == 0))
+        self.assertAlmostEqual(weight_sparsity(self.net), 0.7, places=3)
+
+    def test_mask_is_kept_through_training(self):
+        for optimizer in (None, Adam()):
+            net = Network([784, 30, 10])
+            prune(net, 0.9)
+            pruned = [w == 0 for w in net.weights]
+            net.minibatch_gradient_descent(self.test_data[:200], 10, 1, 0.1,
+                                           optimizer=optimizer)
+            net.stochastic_gradient_descent(self.test_data[:50], 1, 0.1)
+            for earlier, w in zip(pruned, net.weights):
+                self.assertTrue(np.all(w[earlier] == 0))
+            self.assertAlmostEqual(weight_sparsity(net), 0.9, places=3)
+
+    def test_mask_is_saved_with_the_network(self):
+        prune(self.net, 0.9)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "net")
+            save(self.net, path)
+            loaded = load(path)
+            unpruned = Network([784, 10])
+            save(unpruned, path)
+            self.assertIsNone(load(path).mask)
+        self.assertTrue(np.array_equal(loaded.mask, self.net.mask))
+        self.assertTrue(np.array_equal(loaded.params, self.net.params))
+        loaded.minibatch_gradient_descent(self.test_data[:100], 10, 1, 0.1)
+        self.assertAlmostEqual(weight_sparsity(loaded), 0.9, places=3)
+
+    def test_mask_is_checkpointed(self):
+        prune(self.net, 0.9)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "checkpoint")
+            train_with_checkpoints(self.net, self.test_data[:100], "minibatch", 1, 0.1, 10,
+                                   path=path)
+            restored, _, _ = load_checkpoint(path)
+        self.assertTrue(np.array_equal(restored.mask, self.net.mask))
+
+    def test_iterative_pruning_reaches_final_sparsity(self):
+        schedule = IterativePruning(0.9, start_epoch=1, end_epoch=3)
+        sparsities = []
+
+        class Recorder(Callback):
+            def on_epoch_end(self, event):
+                sparsities.append(weight_sparsity(self.net))
+
+            def on_train_begin(self, net):
+                self.net = net
+
+        self.net.minibatch_gradient_descent(self.test_data[:100], 10, 5, 0.1,
+                                            callbacks=[schedule, Recorder()])
+        self.assertEqual(sparsities[0], 0)
+        self.assertEqual(sorted(sparsities), sparsities)
+        self.assertLess(sparsities[1], 0.9)
+        self.assertAlmostEqual(sparsities[3], 0.9, places=3)
+        self.assertEqual(sparsities[4], sparsities[3])
+
+    def test_sparse_outputs_match_dense(self):
+        for output in ("sigmoid", "softmax"):
+            for activation in ACTIVATIONS:
+                net = Network([784, 30, 20, 10], output=output, activations=activation)
+                prune(net, 0.9)
+                snet = to_sparse(net)
+                self.assertTrue(np.allclose(snet.evaluate(self.x), net.evaluate(self.x)),
+                                (output, activation))
+                self.assertTrue(np.allclose(snet.evaluate(self.x[:, 0]),
+                                            net.evaluate(self.x[:, 0])))
+
+    def test_fully_pruned_layer(self):
+        prune(self.net, 1.0)
+        self.assertTrue(np.allclose(to_sparse(self.net).evaluate(self.x),
+                                    self.net.evaluate(self.x)))
+
+    def test_sparse_model_is_smaller(self):
+        prune(self.net, 0.9)
+        self.assertLess(to_sparse(self.net).nbytes * 4, self.net.params.nbytes)
+
+    def test_save_and_load(self):
+        prune(self.net, 0.9)
+        snet = to_sparse(self.net)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "sparse.npz")
+            save_sparse(snet, path)
+            loaded = load_sparse(path)
+        self.assertEqual(loaded.layers, snet.layers)
+        self.assertTrue(np.array_equal(loaded.evaluate(self.x), snet.evaluate(self.x)))
+
+    def test_report(self):
+        params = self.net.params.copy()
+        results = pruning_report(self.net, self.test_data[:100], self.test_data[:200],
+                                 sparsities=(0.0, 0.9), batch_sizes=(1, 100), repeats=1)
+        self.assertEqual([round(result["sparsity"], 3) for result in results], [0.0, 0.9])
+        self.assertTrue(np.array_equal(self.net.params, params))
+        self.assertIsNone(self.net.mask)
+        for result in results:
+            self.assertTrue(0 <= result["accuracy"] <= 1)
+            for key in ("dense_examples_per_second_1", "sparse_examples_per_second_1",
+                        "dense_examples_per_second_100", "sparse_examples_per_second_100"):
+                self.assertGreater(result[key], 0)
+        self.assertLess(results[1]["sparse_bytes"], results[1]["dense_bytes"])
@@ -0,0 +1,74 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+from data_handling import get_test_data
+from network import ACTIVATIONS, Network
+from quantization import (INT8_MAX, load_quantized, quantization_report, quantize,
+                          quantize_columns, save_quantized)
+
+
+class TestQuantization(unittest.TestCase):
+    def setUp(self):
+        self.test_data = get_test_data()
+        self.net = Network([784, 30, 20, 10])
+        self.x = self.test_data.inputs[:20].transpose()
+
+    def test_weights_are_int8_within_half_a_step(self):
+        qnet = quantize(self.net)
+        for w, q, scale in zip(self.net.weights, qnet.weights, qnet.scales):
+            self.assertEqual(q.dtype, np.int8)
+            self.assertLessEqual(np.max(np.abs(q)), INT8_MAX)
+            self.assertEqual(np.max(np.abs(q)), INT8_MAX)
+            self.assertTrue(np.all(np.abs(q * scale - w) <= scale / 2 + 1e-7))
+
+    def test_per_layer_scale_is_shared_by_rows(self):
+        for scale in quantize(self.net, per_row=False).scales:
+            self.assertTrue(np.all(scale == scale[0]))
+
+    def test_outputs_match_float_network(self):
+        for output in ("sigmoid", "softmax"):
+            for activation in ACTIVATIONS:
+                net = Network([784, 30, 20, 10], output=output, activations=activation)
+                qnet = quantize(net)
+                self.assertTrue(np.allclose(qnet.evaluate(self.x), net.evaluate(self.x),
+                                            atol=0.02), (output, activation))
+
+    def test_vector_input(self):
+        qnet = quantize(self.net)
+        self.assertTrue(np.allclose(qnet.evaluate(self.x[:, 0]), qnet.evaluate(self.x)[:, 0]))
+
+    def test_integer_product_is_exact(self):
+        qnet = quantize(self.net)
+        x_q, _ = quantize_columns(self.x)
+        exact = qnet.weights[0].astype(np.int64) @ x_q.astype(np.int64)
+        self.assertTrue(np.array_equal(np.dot(qnet.weights[0].astype(np.float32), x_q), exact))
+
+    def test_weights_are_cast_once(self):
+        qnet = quantize(self.net)
+        first = qnet.evaluate(self.x)
+        cast = list(qnet._accumulator_weights)
+        self.assertTrue(np.array_equal(qnet.evaluate(self.x), first))
+        for w, previous in zip(qnet._accumulator_weights, cast):
+            self.assertIs(w, previous)
+
+    def test_model_is_smaller(self):
+        self.assertLess(quantize(self.net).nbytes * 7, self.net.params.nbytes)
+
+    def test_save_and_load(self):
+        qnet = quantize(self.net)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "quantized.npz")
+            save_quantized(qnet, path)
+            loaded = load_quantized(path)
+        self.assertEqual(loaded.layers, qnet.layers)
+        self.assertTrue(np.array_equal(loaded.evaluate(self.x), qnet.evaluate(self.x)))
+
+    def test_report(self):
+        self.net.minibatch_gradient_descent(self.test_data, 10, 2, 1)
+        report = quantization_report(self.net, self.test_data, repeats=1)
+        self.assertEqual(report["float_accuracy"], self.net.validation_accuracy(self.test_data))
+        self.assertAlmostEqual(report["accuracy_delta"],
+                               report["quantized_accuracy"] - report["float_accuracy"])
+        self.assertLess(abs(report["accuracy_delta"]), 0.05)
+        self.assertGreater(report["quantized_examples_per_second"], 0)
@@ -0,0 +1,76 @@
+import os
+import tempfile
+import tracemalloc
+import unittest
+import numpy as np
+from data_handling import Dataset, get_test_data
+from network import Network
+from shards import ShardedDataset, write_shards
+
+
+class TestShards(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        labels = np.arange(95) % 3
+        inputs = np.random.rand(95, 6)
+        inputs[:, 0] = labels / 10
+        self.data = Dataset(inputs, labels, n_classes=3)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def epoch_inputs(self, stream, batch_size, shuffle=True):
+        batches = [batch for batch, _ in stream.epoch(batch_size, shuffle)]
+        return batches, np.concatenate([batch.inputs for batch in batches])
+
+    def test_shards_written_in_chunks(self):
+        chunks = (self.data[i:i + 7] for i in range(0, 95, 7))
+        manifest = write_shards(chunks, self.directory.name, shard_size=20)
+        self.assertEqual([shard["size"] for shard in manifest["shards"]], [20, 20, 20, 20, 15])
+        self.assertEqual(manifest["n_examples"], 95)
+        self.assertTrue(os.path.exists(os.path.join(self.directory.name, "manifest.json")))
+
+    def test_unshuffled_epoch_reads_data_in_order(self):
+        write_shards(self.data, self.directory.name, shard_size=20)
+        stream = ShardedDataset(self.directory.name, buffer_size=8)
+        batches, inputs = self.epoch_inputs(stream, 10, shuffle=False)
+        self.assertEqual(len(stream), 95)
+        self.assertEqual([len(batch) for batch in batches], [10] * 9 + [5])
+        self.assertTrue(np.array_equal(inputs, self.data.inputs))
+        labels = np.concatenate([batch.labels for batch in batches])
+        self.assertTrue(np.array_equal(labels, self.data.labels))
+
+    def test_shuffled_epoch_is_permutation(self):
+        write_shards(self.data, self.directory.name, shard_size=20)
+        stream = ShardedDataset(self.directory.name, buffer_size=8)
+        batches, inputs = self.epoch_inputs(stream, 10)
+        self.assertTrue(all(len(batch) == 10 for batch in batches[:-1]))
+        self.assertFalse(np.array_equal(inputs, self.data.inputs))
+        self.assertTrue(np.array_equal(np.sort(inputs, axis=0), np.sort(self.data.inputs, axis=0)))
+        for batch in batches:
+            self.assertTrue(np.array_equal(batch.labels, np.rint(batch.inputs[:, 0] * 10)))
+
+    def test_network_trains_from_shards(self):
+        test_data = get_test_data()
+        write_shards(test_data, self.directory.name, shard_size=64)
+        net = Network([784, 10, 10])
+        initial_accuracy = net.validation_accuracy(test_data)
+        loss, _ = net.minibatch_gradient_descent(
+            ShardedDataset(self.directory.name, buffer_size=50), 10, 20, 1)
+        self.assertEqual(len(loss), 20)
+        self.assertLess(loss[-1], loss[0])
+        self.assertGreater(net.validation_accuracy(test_data), initial_accuracy)
+
+    def test_vanilla_descent_memory_is_bounded(self):
+        data = Dataset(np.random.rand(40000, 200).astype(np.float32),
+                       np.random.randint(0, 3, 40000), n_classes=3)
+        write_shards(data, self.directory.name, shard_size=5000)
+        stream = ShardedDataset(self.directory.name, buffer_size=1000)
+        net = Network([200, 10, 3], np.float32)
+        tracemalloc.start()
+        try:
+            net.vanilla_gradient_descent(stream, 1, 0.1)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        self.assertLess(peak, data.inputs.nbytes / 2)
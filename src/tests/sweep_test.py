@@ -0,0 +1,52 @@
+import csv
+import os
+import tempfile
+import unittest
+from sweep import BLAS_THREAD_VARIABLES, SEARCH_SPACE, grid, random_search, sweep, write_table
+
+
+class TestSweep(unittest.TestCase):
+    def setUp(self):
+        self.space = dict(SEARCH_SPACE, hidden_layers=[[10]], activation=["sigmoid", "relu"],
+                          lr=[0.1, 1.0, 3.0], minibatch_size=[10])
+
+    def test_grid_covers_every_combination(self):
+        configurations = grid(self.space)
+        self.assertEqual(len(configurations), 6)
+        self.assertEqual(len({str(sorted(c.items())) for c in configurations}), 6)
+
+    def test_random_search_samples_from_space(self):
+        configurations = random_search(self.space, 4, seed=0)
+        self.assertEqual(len(configurations), 4)
+        for configuration in configurations:
+            self.assertIn(configuration, grid(self.space))
+        self.assertEqual(configurations, random_search(self.space, 4, seed=0))
+        self.assertEqual(len(random_search(self.space, 100, seed=0)), 6)
+
+    def test_successive_halving(self):
+        previous = {name: os.environ.get(name) for name in BLAS_THREAD_VARIABLES}
+        results = sweep(grid(self.space), 1, 9, 3, n_workers=2, n_training=500,
+                        n_validation=200)
+        self.assertEqual([result["epochs"] for result in results], [9, 3, 1, 1, 1, 1])
+        self.assertEqual([result["rank"] for result in results], list(range(1, 7)))
+        self.assertEqual(sorted(result["trial"] for result in results), list(range(6)))
+        first_rung = [result["validation_accuracy"] for result in results[2:]]
+        self.assertEqual(first_rung, sorted(first_rung, reverse=True))
+        self.assertEqual({name: os.environ.get(name) for name in BLAS_THREAD_VARIABLES},
+                         previous)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "sweep.csv")
+            write_table(results, path)
+            with open(path, encoding="utf-8") as file:
+                rows = list(csv.DictReader(file))
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(rows[0]["rank"], "1")
+        self.assertEqual(rows[0]["lr"], str(results[0]["lr"]))
+
+    def test_sweep_is_reproducible(self):
+        configurations = grid(self.space)[:2]
+        first = sweep(configurations, 2, 2, n_workers=2, n_training=300, n_validation=100)
+        second = sweep(configurations, 2, 2, n_workers=1, n_training=300, n_validation=100)
+        self.assertEqual([(r["trial"], r["validation_accuracy"]) for r in first],
+                         [(r["trial"], r["validation_accuracy"]) for r in second])
@@ -0,0 +1,99 @@
+import contextlib
+import csv
+import importlib.util
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+import numpy as np
+from network import load
+from train_cli import main
+
+
+class TestTrainCli(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.model = self.path("model")
+        self.arguments = ["--layers", "784", "10", "10", "--epochs", "2", "--batch-size", "20",
+                          "--training-examples", "500", "--output-model", self.model,
+                          "--seed", "0"]
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.directory.name, name)
+
+    def run_main(self, *arguments):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            result = main(self.arguments + list(arguments))
+        return result, output.getvalue()
+
+    def test_trains_and_saves_network(self):
+        metrics = self.path("metrics.csv")
+        (net, (loss, accuracy)), output = self.run_main(
+            "--activation", "relu", "--optimizer", "adam", "--metrics", metrics)
+        self.assertEqual(len(loss), 2)
+        self.assertEqual(len(accuracy), 2)
+        self.assertIn("Epoch 2/2", output)
+
+        saved = load(self.model)
+        self.assertTrue(np.array_equal(saved.params, net.params))
+        self.assertEqual(saved.activations, ["relu"])
+        with open(metrics, encoding="utf-8") as file:
+            rows = list(csv.DictReader(file))
+        self.assertEqual([row["epoch"] for row in rows], ["0", "1"])
+
+    def test_continues_saved_network(self):
+        (net, _), _ = self.run_main("--epochs", "1")
+        self.arguments = self.arguments[4:]
+        (continued, _), _ = self.run_main("--epochs", "1", "--input-model", self.model)
+        self.assertEqual(continued.layers, net.layers)
+        self.assertFalse(np.array_equal(continued.params, net.params))
+
+    def test_input_model_rejects_architecture(self):
+        error = io.StringIO()
+        with contextlib.redirect_stderr(error), self.assertRaises(SystemExit):
+            main(self.arguments + ["--input-model", self.model, "--dtype", "float32"])
+        self.assertIn("--layers, --dtype", error.getvalue())
+
+    def test_resume_of_finished_checkpoint(self):
+        checkpoint = self.path("checkpoint")
+        (net, histories), _ = self.run_main("--checkpoint", checkpoint)
+        self.arguments = self.arguments[8:]
+        (resumed, resumed_histories), output = self.run_main("--checkpoint", checkpoint,
+                                                             "--resume")
+        self.assertTrue(np.array_equal(resumed.params, net.params))
+        self.assertEqual(resumed_histories, histories)
+        self.assertNotIn("Epoch", output)
+
+    def test_resume_needs_checkpoint(self):
+        with contextlib.redirect_stderr(io.StringIO()), self.assertRaises(SystemExit):
+            main(self.arguments + ["--resume"])
+
+    def test_resume_rejects_run_options(self):
+        error = io.StringIO()
+        with contextlib.redirect_stderr(error), self.assertRaises(SystemExit):
+            main(self.arguments + ["--checkpoint", self.path("checkpoint"), "--resume"])
+        self.assertIn("--resume cannot be combined with --layers, --epochs, --batch-size",
+                      error.getvalue())
+        with contextlib.redirect_stderr(error), self.assertRaises(SystemExit):
+            main(["--checkpoint", self.path("checkpoint"), "--resume", "--lr", "0.1"])
+        self.assertIn("--lr", error.getvalue())
+
+    def test_matplotlib_is_not_imported_without_plot(self):
+        code = ("import sys, train_cli; train_cli.main(sys.argv[1:]); "
+                "print('matplotlib' in sys.modules)")
+        result = subprocess.run([sys.executable, "-c", code] + self.arguments, check=True,
+                                capture_output=True, text=True,
+                                env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path)))
+        self.assertEqual(result.stdout.splitlines()[-1], "False")
+
+    @unittest.skipUnless(importlib.util.find_spec("matplotlib"), "matplotlib is not installed")
+    def test_plot_is_written_to_file(self):
+        plot = self.path("training.png")
+        self.run_main("--plot", plot)
+        self.assertGreater(os.path.getsize(plot), 0)
@@ -0,0 +1,54 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from data_handling import get_data
+from user_interface import BASELINE_SAMPLE_SIZE, Ui
+
+
+class TestUi(unittest.TestCase):
+    def test_data_is_loaded_in_background(self):
+        ui = Ui()
+        training_data, validation_data, testing_data = get_data()
+        self.assertEqual(len(ui.training_data), len(training_data))
+        self.assertEqual(len(ui.validation_data), len(validation_data))
+        self.assertEqual(len(ui.testing_data), len(testing_data))
+
+    def test_loading_error_is_raised_on_use(self):
+        ui = Ui("nonexistent")
+        with self.assertRaises(FileNotFoundError):
+            len(ui.training_data)
+
+    def test_baseline_is_computed_lazily(self):
+        ui = Ui()
+        self.assertEqual(ui.training_loss, [])
+        ui._record_baseline()
+        expected = ui.net.overall_loss(ui.training_data[:BASELINE_SAMPLE_SIZE])
+        self.assertAlmostEqual(ui.training_loss[0], expected)
+        self.assertEqual(ui.validation_accuracy, [ui.net.validation_accuracy(ui.validation_data)])
+        ui._record_baseline()
+        self.assertEqual(len(ui.training_loss), 1)
+
+    def test_unreadable_saved_network_is_reported(self):
+        ui = Ui(os.path.abspath("data/mnist.pkl.gz"))
+        net = ui.net
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as directory:
+            os.chdir(directory)
+            try:
+                for content in (b"garbage", b"\x80\x04garbage"):
+                    with open("neuralnetwork", "wb") as file:
+                        file.write(content)
+                    ui.load_saved()
+                    self.assertIs(ui.net, net)
+            finally:
+                os.chdir(cwd)
+
+    def test_matplotlib_is_not_imported_at_startup(self):
+        code = ("import sys; from user_interface import Ui; Ui(); "
+                "print('matplotlib' in sys.modules, 'train_cli' in sys.modules)")
+        result = subprocess.run([sys.executable, "-c", code], check=True, capture_output=True,
+                                text=True,
+                                env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path)))
+        self.assertEqual(result.stdout.strip(), "False False")
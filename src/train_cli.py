@@ -0,0 +1,163 @@
+import argparse
+import sys
+from time import perf_counter
+import numpy as np
+from callbacks import Callback, CSVLogger, EarlyStopping, JSONLinesLogger
+from checkpoint import METHODS, load_checkpoint, resume, train, train_with_checkpoints
+from data_handling import get_data
+from network import ACTIVATIONS, DEFAULT_LAYERS, OUTPUTS, Network, load, save
+from optimizers import OPTIMIZERS
+from plotting import plot_training
+
+
+class ProgressPrinter(Callback):
+    """Callback printing one line per epoch, for the log of an unattended run.
+    """
+
+    def __init__(self, epochs: int, start_epoch: int = 0, file=None):
+        """Class constructor for the printer.
+
+        Args:
+            epochs (int): Total number of epochs of the run.
+            start_epoch (int, optional): Number of epochs done before the training call.
+            Defaults to 0.
+            file (optional): Text stream printed to. Defaults to sys.stdout.
+        """
+        self.epochs = epochs
+        self.start_epoch = start_epoch
+        self.file = file
+
+    def on_epoch_end(self, event: dict):
+        line = (f"Epoch {self.start_epoch + event['epoch'] + 1}/{self.epochs}: "
+                f"loss {event['loss']:.4f}")
+        if event["validation_accuracy"] is not None:
+            line += f", validation accuracy {event['validation_accuracy']:.4f}"
+        line += f", {event['seconds']:.1f} s"
+        print(line, file=self.file or sys.stdout, flush=True)
+
+
+# Options describing the architecture of a new network, and their defaults.
+ARCHITECTURE_DEFAULTS = {"layers": DEFAULT_LAYERS, "activation": "sigmoid", "output": "sigmoid",
+                         "dtype": "float64"}
+
+# Options describing the training run, and their defaults; a resumed run takes them from its
+# checkpoint.
+RUN_DEFAULTS = {"method": "minibatch", "optimizer": "sgd", "epochs": 10, "batch_size": 10}
+
+
+# One statement per option.
+# pylint: disable-next=too-many-statements
+def parse_arguments(argv: list = None):
+    parser = argparse.ArgumentParser(
+        description="Train a neural network on mnist without interaction.")
+    parser.add_argument("--layers", type=int, nargs="+",
+                        help="Layer sizes of a new network, input and output layers included.")
+    parser.add_argument("--activation", choices=ACTIVATIONS)
+    parser.add_argument("--output", choices=OUTPUTS)
+    parser.add_argument("--dtype", choices=("float32", "float64"))
+    parser.add_argument("--method", choices=METHODS)
+    parser.add_argument("--optimizer", choices=list(OPTIMIZERS))
+    parser.add_argument("--epochs", type=int)
+    parser.add_argument("--lr", type=float,
+                        help="Learning rate; defaults to the one suggested for the optimizer.")
+    parser.add_argument("--batch-size", type=int)
+    parser.add_argument("--patience", type=int, help="Stop early after this many epochs "
+                        "without validation improvement.")
+    parser.add_argument("--input-model", help="Continue training a saved network; the saved "
+                        "network keeps its own architecture.")
+    parser.add_argument("--output-model", default="neuralnetwork")
+    parser.add_argument("--metrics", help="Write the epoch events to a CSV file, or JSON lines "
+                        "if the name ends with .jsonl.")
+    parser.add_argument("--plot", help="Render the training curves to an image file.")
+    parser.add_argument("--checkpoint", help="Write a checkpoint to this path every epoch.")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue the interrupted run of --checkpoint with its own network "
+                        "and training options.")
+    parser.add_argument("--data", default="data/mnist.pkl.gz")
+    parser.add_argument("--training-examples", type=int,
+                        help="Train on the first N training examples only.")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args(argv)
+    if args.resume and not args.checkpoint:
+        parser.error("--resume needs --checkpoint")
+    given = [name for name in ARCHITECTURE_DEFAULTS if getattr(args, name) is not None]
+    if args.input_model and given:
+        parser.error("--input-model cannot be combined with " + _options(given))
+    if args.resume:
+        given = [name for name in ["input_model", *ARCHITECTURE_DEFAULTS, *RUN_DEFAULTS, "lr"]
+                 if getattr(args, name) is not None]
+        if given:
+            parser.error("--resume cannot be combined with " + _options(given))
+    for name, default in {**ARCHITECTURE_DEFAULTS, **RUN_DEFAULTS}.items():
+        if getattr(args, name) is None:
+            setattr(args, name, default)
+    return args
+
+
+def _options(names: list):
+    return ", ".join("--" + name.replace("_", "-") for name in names)
+
+
+# The steps of the run are read top to bottom.
+# pylint: disable-next=too-many-statements
+def main(argv: list = None):
+    """Train a network as described by the command-line arguments.
+
+    Args:
+        argv (list, optional): Arguments without the program name. Defaults to sys.argv.
+
+    Returns:
+        tuple: Network and tuple of list; the trained network and the mean loss and validation
+        accuracy of each epoch.
+    """
+    args = parse_arguments(argv)
+    if args.seed is not None:
+        np.random.seed(args.seed)
+
+    start = perf_counter()
+    training_data, validation_data, testing_data = get_data(args.data)
+    training_data = training_data[:args.training_examples]
+    print(f"Loaded data in {perf_counter() - start:.2f} s")
+
+    callbacks = []
+    if args.metrics:
+        logger = JSONLinesLogger if args.metrics.endswith(".jsonl") else CSVLogger
+        callbacks.append(logger(args.metrics))
+    if args.patience is not None:
+        callbacks.append(EarlyStopping(args.patience))
+
+    if args.resume:
+        _, _, metadata = load_checkpoint(args.checkpoint)
+        callbacks.append(ProgressPrinter(metadata["run"]["epochs"], metadata["epoch"]))
+        net, _, (training_loss, validation_accuracy) = resume(
+            args.checkpoint, training_data, validation_data, callbacks)
+    else:
+        if args.input_model:
+            net = load(args.input_model)
+        else:
+            net = Network(args.layers, np.dtype(args.dtype), output=args.output,
+                          activations=args.activation)
+        optimizer, lr = OPTIMIZERS[args.optimizer]
+        lr = lr if args.lr is None else args.lr
+        callbacks.append(ProgressPrinter(args.epochs))
+        if args.checkpoint:
+            training_loss, validation_accuracy = train_with_checkpoints(
+                net, training_data, args.method, args.epochs, lr, args.batch_size,
+                validation_data, optimizer(), callbacks, args.checkpoint)
+        else:
+            training_loss, validation_accuracy = train(
+                net, training_data, args.method, args.epochs, lr, args.batch_size,
+                validation_data, optimizer(), callbacks)
+
+    accuracy = net.validation_accuracy(testing_data)
+    print(f"Test accuracy {accuracy:.4f}")
+    save(net, args.output_model)
+    print(f"Saved the network to {args.output_model}")
+    if args.plot:
+        plot_training(training_loss, validation_accuracy, args.plot)
+        print(f"Saved the training curves to {args.plot}")
+    return net, (training_loss, validation_accuracy)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,30 +1,44 @@
-import matplotlib.pyplot as plt
+import pickle
+from threading import Thread
 import numpy as np
-from network import Network, load, save
+from network import ACTIVATIONS, DEFAULT_LAYERS, Network, is_pickled, load, migrate, save
 from data_handling import get_data
+from optimizers import OPTIMIZERS
+from callbacks import EarlyStopping
+from checkpoint import CHECKPOINT_PATH, METHODS, load_checkpoint, resume, train_with_checkpoints
+from plotting import plot_training
 
 
-# Layers of the neural network that is created by default.
-DEFAULT_LAYERS = [784, 16, 16, 10]
+# Number of training examples the loss of the untrained network is computed over.
+BASELINE_SAMPLE_SIZE = 10000
 
 
-class Ui:
+# The menu state and the data loaded in the background.
+class Ui:  # pylint: disable=too-many-instance-attributes
     """User interface for training, testing, creating, saving and loading neural networks to
     classify the hand written digits of the mnist data set.
     """
 
-    def __init__(self):
+    def __init__(self, data_path: str = "data/mnist.pkl.gz"):
         """Class constructor for the user interface.
 
-        Creates the default network, fetches the mnist data set and gets a baseline for the
-        network's accuracy.
+        Creates the default network and starts loading the mnist data set in a background thread,
+        so the menu is shown right away. The baseline loss and accuracy of a new network are
+        computed only when it is first trained.
+
+        Args:
+            data_path (str, optional): Path to mnist. Defaults to "data/mnist.pkl.gz".
         """
         self.net = Network(DEFAULT_LAYERS)
-        self.training_data, self.validation_data, self.testing_data = get_data()
-        initial_loss = self.net.overall_loss(self.training_data)
-        initial_accuracy = self.net.validation_accuracy(self.validation_data)
-        self.training_loss = [initial_loss]
-        self.validation_accuracy = [initial_accuracy]
+        self.training_loss = []
+        self.validation_accuracy = []
+        self.optimizer = None
+        self._baseline_pending = True
+
+        self._data = None
+        self._data_error = None
+        self._data_loader = Thread(target=self._load_data, args=(data_path,), daemon=True)
+        self._data_loader.start()
 
         self.instructions = "Instructions: \n"
         self.instructions += "0 = Quit \n"
@@ -32,7 +46,48 @@ class Ui:
         self.instructions += "2 = Create new neural network \n"
         self.instructions += "3 = Save neural network \n"
         self.instructions += "4 = Train neural network \n"
-        self.instructions += "5 = Test neural network"
+        self.instructions += "5 = Test neural network \n"
+        self.instructions += "6 = Resume interrupted training"
+
+    def _load_data(self, data_path: str):
+        try:
+            self._data = get_data(data_path)
+        except Exception as error:  # pylint: disable=broad-exception-caught
+            self._data_error = error
+
+    def _report_loading(self):
+        if self._data_loader.is_alive():
+            print("Loading the mnist data set...")
+
+    def _wait_for_data(self):
+        """Get the training, validation and testing data, waiting for the loading to finish.
+        """
+        self._data_loader.join()
+        if self._data_error is not None:
+            raise self._data_error
+        return self._data
+
+    @property
+    def training_data(self):
+        return self._wait_for_data()[0]
+
+    @property
+    def validation_data(self):
+        return self._wait_for_data()[1]
+
+    @property
+    def testing_data(self):
+        return self._wait_for_data()[2]
+
+    def _record_baseline(self):
+        """Start the history of a new network with its loss over a subsample of the training
+        data and its validation accuracy.
+        """
+        if not self._baseline_pending:
+            return
+        self.training_loss = [self.net.overall_loss(self.training_data[:BASELINE_SAMPLE_SIZE])]
+        self.validation_accuracy = [self.net.validation_accuracy(self.validation_data)]
+        self._baseline_pending = False
 
     def start(self):
 
@@ -41,10 +96,12 @@ class Ui:
         while True:
             print("Main selection:")
             action = self.action(
-                ["0", "1", "2", "3", "4", "5"], self.instructions)
+                ["0", "1", "2", "3", "4", "5", "6"], self.instructions)
 
             if action == 0:
                 break
+            if action in (4, 5, 6):
+                self._report_loading()
 
             if action == 1:
                 self.load_saved()
@@ -56,14 +113,25 @@ class Ui:
                 self.train()
             elif action == 5:
                 self.test()
+            elif action == 6:
+                self.resume_training()
 
     def load_saved(self):
         try:
-            self.net = load()
-            print("Network loaded. \n")
+            if is_pickled():
+                self.net = migrate()
+                print("Network saved in the old format loaded and converted to the new format. \n")
+            else:
+                self.net = load()
+                print("Network loaded. \n")
+            self.optimizer = None
         except FileNotFoundError:
             print("No neural network saved. Continuing with new. \n")
+        except (ValueError, pickle.UnpicklingError, EOFError) as error:
+            print(f"Could not load the saved network: {error}. Continuing with the current. \n")
 
+    # Menu dialogue asking each setting in turn.
+    # pylint: disable-next=too-many-statements
     def create_new(self):
         print("Create new neural network?")
         instr = "0 = cancel \n"
@@ -89,18 +157,35 @@ class Ui:
             print(f"{userinput} appended to layers")
 
         layers.append(10)
-        self.net = Network(layers)
-        print(f"New network with layers {layers} created.")
 
-        initial_loss = self.net.overall_loss(self.training_data)
-        initial_accuracy = self.net.validation_accuracy(self.validation_data)
-        self.training_loss = [initial_loss]
-        self.validation_accuracy = [initial_accuracy]
+        instr = "Choose hidden layer activation function: \n"
+        for i, activation in enumerate(ACTIVATIONS):
+            instr += f"{i + 1} = {activation} \n"
+        print(instr.rstrip())
+        activation = ACTIVATIONS[self.action(
+            [str(i + 1) for i in range(len(ACTIVATIONS))], instr) - 1]
+
+        instr = "Choose output layer: \n"
+        instr += "1 = Sigmoid with squared error \n"
+        instr += "2 = Softmax with cross-entropy"
+        print(instr)
+        output = ["sigmoid", "softmax"][self.action(["1", "2"], instr) - 1]
+
+        self.net = Network(layers, output=output, activations=activation)
+        self.optimizer = None
+        print(f"New network with layers {layers}, {activation} hidden layers and {output} output "
+              "created.")
+
+        self.training_loss = []
+        self.validation_accuracy = []
+        self._baseline_pending = True
 
     def save_net(self):
         save(self.net)
         print("Network saved.")
 
+    # Menu dialogue asking each setting in turn.
+    # pylint: disable-next=too-many-statements
     def train(self):
         instructions = "Choose gradient descent algorithm: (0 = Cancel) \n"
         instructions += "1 = Vanilla \n"
@@ -112,6 +197,17 @@ class Ui:
         if action == 0:
             return
 
+        names = list(OPTIMIZERS)
+        instructions = "Choose optimizer: \n"
+        for i, name in enumerate(names):
+            instructions += f"{i + 1} = {name} (suggested learning rate {OPTIMIZERS[name][1]}) \n"
+        print(instructions.rstrip())
+        optimizer, _ = OPTIMIZERS[names[self.action(
+            [str(i + 1) for i in range(len(names))], instructions) - 1]]
+        # Nesterov is a subclass of Momentum, so isinstance would keep the wrong one.
+        if type(self.optimizer) is not optimizer:  # pylint: disable=unidiomatic-typecheck
+            self.optimizer = optimizer()
+
         print("Enter amount of epochs:")
         epochs = self.get_integer_input(1, 500)
 
@@ -123,38 +219,57 @@ class Ui:
             print("Enter minibatch size:")
             minibatch_size = self.get_integer_input(1, len(self.training_data))
 
-        print("Training...")
-        if action == 1:
-            training_loss, validation_accuracy = self.net.vanilla_gradient_descent(
-                self.training_data, epochs, lr, self.validation_data)
-        elif action == 2:
-            training_loss, validation_accuracy = self.net.stochastic_gradient_descent(
-                self.training_data, epochs, lr, self.validation_data)
-        else:
-            training_loss, validation_accuracy = self.net.minibatch_gradient_descent(
-                self.training_data, minibatch_size, epochs, lr, self.validation_data)
+        print("Enter early stopping patience in epochs (Return blank for no early stopping):")
+        patience = self.get_integer_input(1, epochs, skip=True)
+        callbacks = None if patience == "" else [EarlyStopping(patience)]
+
+        self._record_baseline()
+        print(f"Training... (checkpoints are saved to {CHECKPOINT_PATH})")
+        training_loss, validation_accuracy = train_with_checkpoints(
+            self.net, self.training_data, METHODS[action - 1], epochs, lr, minibatch_size,
+            self.validation_data, self.optimizer, callbacks)
 
         self.training_loss += training_loss
         self.validation_accuracy += validation_accuracy
 
         print("Training completed \n")
+        if callbacks is not None:
+            stopping = callbacks[0]
+            if stopping.stopped_epoch is not None:
+                print(f"Stopped early after {stopping.stopped_epoch + 1} epochs.")
+            print(f"Restored the parameters of epoch {stopping.best_epoch + 1} with validation "
+                  f"accuracy {stopping.best_accuracy:.4f}. \n")
+        self.plot_training()
+
+    def resume_training(self):
+        try:
+            _, _, metadata = load_checkpoint(CHECKPOINT_PATH)
+        except FileNotFoundError:
+            print("No training checkpoint saved. \n")
+            return
+        if metadata["finished"]:
+            print("The last checkpointed training finished; nothing to resume. \n")
+            return
 
-        fig, ax1 = plt.subplots()
-        ax1.set_xlabel("Epochs")
-        ax1.set_ylabel("Training loss", color="navy")
-        ax1.set_ylim(0, max(self.training_loss))
-        ax1.plot(self.training_loss, color="navy")
-
-        ax2 = ax1.twinx()
-        ax2.set_ylabel("Validation accuracy", color="orangered")
-        ax2.set_ylim(0, 1)
-        ax2.plot(self.validation_accuracy, color="orangered")
+        run = metadata["run"]
+        print(f"Resuming {run['method']} training from epoch {metadata['epoch'] + 1} of "
+              f"{run['epochs']}...")
+        self.net, self.optimizer, (training_loss, validation_accuracy) = resume(
+            CHECKPOINT_PATH, self.training_data, self.validation_data)
+        self.training_loss = training_loss
+        self.validation_accuracy = validation_accuracy
+        self._baseline_pending = False
+        print("Training completed \n")
+        self.plot_training()
 
-        fig.tight_layout()
-        ax1.grid()
-        plt.show()
+    def plot_training(self):
+        plot_training(self.training_loss, self.validation_accuracy)
 
+    # Menu dialogue browsing the examples.
+    # pylint: disable-next=too-many-statements
     def test(self):
+        import matplotlib.pyplot as plt  # pylint: disable=import-outside-toplevel
+
         correct, incorrect = self.net.test_classification(self.testing_data)
 
         n = len(self.testing_data)
@@ -181,13 +296,13 @@ class Ui:
                 break
 
             if action == 1:
-                img, label = correct[i_corr]
+                img, label = self.test_example(correct[i_corr])
                 i_corr += 1
                 title = f"{i_corr}/{n_corr}, {label}"
             else:
-                img, label, classification = incorrect[i_incorr]
+                img, label = self.test_example(incorrect[i_incorr])
                 i_incorr += 1
-                cl = np.argmax(classification)
+                cl = np.argmax(self.net.evaluate(img))
                 title = f"{i_incorr}/{n_incorr}, "
                 title += f"{label} that the network classified as {cl}"
 
@@ -197,6 +312,11 @@ class Ui:
             plt.imshow(img, cmap="grey_r")
             plt.show()
 
+    def test_example(self, index: int):
+        img = self.testing_data.inputs[index]
+        label = self.testing_data.labels[index]
+        return img, label
+
     def action(self, choices: list, instructions: str):
         action = input("\n> ")
         print()
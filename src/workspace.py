@@ -0,0 +1,108 @@
+import numpy as np
+
+
+# One attribute per preallocated buffer.
+class Workspace:  # pylint: disable=too-many-instance-attributes
+    """Preallocated buffers for computing the gradient of batches of a fixed size.
+
+    Reusing the buffers across training steps keeps the steps free of new array allocations.
+
+    Attributes:
+        batch_size (int): Number of examples in a batch.
+        inputs (np.ndarray): Inputs of the batch, one example per row.
+        expected_outputs (np.ndarray): Expected outputs of the batch, one example per column.
+        activations (list): List of np.ndarray; activations of each layer, one example per column.
+        deltas (list): List of np.ndarray; delta values of each layer.
+        scratch (list): List of np.ndarray; temporary values shaped like the activations.
+        partial_gradient (np.ndarray): Flat gradient of one chunk of a larger batch.
+        ones (np.ndarray): Vector of ones for summing over the batch with a matrix product.
+    """
+
+    def __init__(self, layers: list, batch_size: int, dtype=np.float64):
+        """Class constructor for the workspace.
+
+        Args:
+            layers (list): List of integers; lengths of the layers of the network.
+            batch_size (int): Number of examples in a batch.
+            dtype (optional): Floating point precision of the buffers. Defaults to np.float64.
+        """
+        self.batch_size = batch_size
+        self.inputs = np.empty((batch_size, layers[0]), dtype)
+        self.expected_outputs = np.empty((layers[-1], batch_size), dtype)
+        self.activations = [np.empty((m, batch_size), dtype) for m in layers[1:]]
+        self.deltas = [np.empty((m, batch_size), dtype) for m in layers[1:]]
+        self.scratch = [np.empty((m, batch_size), dtype) for m in layers[1:]]
+        self.partial_gradient = np.empty(_n_params(layers), dtype)
+        self.ones = np.ones(batch_size, dtype)
+        self._labels = np.empty(batch_size, dtype=np.int64)
+        self._identity = np.eye(layers[-1], dtype=dtype)
+        self._staging = {}
+
+    def load(self, data, index: np.ndarray):
+        """Copy the inputs and expected outputs of the examples of data at index into the
+        buffers.
+
+        Args:
+            data (Dataset): Data set.
+            index (np.ndarray): Indices of batch_size examples.
+
+        Raises:
+            IndexError: An index or a label is out of range.
+        """
+        # With mode="raise" np.take buffers its result in a temporary array instead of writing
+        # into out. The takes clip instead, and since clipping would silently repeat the first
+        # or last example, the indices and labels are checked here first.
+        if len(index) and (index.min() < 0 or index.max() >= len(data)):
+            raise IndexError(f"Example index out of range for {len(data)} examples")
+        if data.inputs.dtype == self.inputs.dtype:
+            np.take(data.inputs, index, axis=0, out=self.inputs, mode="clip")
+        else:
+            staging = self._staging_buffer(data.inputs)
+            np.take(data.inputs, index, axis=0, out=staging, mode="clip")
+            np.copyto(self.inputs, staging)
+
+        if data.targets is not None:
+            staging = self._staging_buffer(data.targets)
+            np.take(data.targets, index, axis=0, out=staging, mode="clip")
+            np.copyto(self.expected_outputs, staging.transpose())
+        else:
+            np.take(data.labels, index, out=self._labels, mode="clip")
+            if self._labels.min() < 0 or self._labels.max() >= len(self._identity):
+                raise IndexError(f"Label out of range for {len(self._identity)} classes")
+            np.take(self._identity, self._labels, axis=1, out=self.expected_outputs,
+                    mode="clip")
+
+    def _staging_buffer(self, source: np.ndarray):
+        """Get a buffer for batch_size rows of source in its own type.
+        """
+        key = (source.dtype.str, source.shape[1:])
+        if key not in self._staging:
+            self._staging[key] = np.empty((self.batch_size,) + source.shape[1:], source.dtype)
+        return self._staging[key]
+
+
+def _n_params(layers: list):
+    """Get the number of weights and biases of a network with the given layers.
+    """
+    return sum(n * m + m for n, m in zip(layers, layers[1:]))
+
+
+def _layer_views(buffer: np.ndarray, layers: list):
+    """Split a flat buffer into the weight and bias arrays of each layer.
+
+    Args:
+        buffer (np.ndarray): Flat buffer, weights and biases layer by layer.
+        layers (list): List of integers; lengths of the layers.
+
+    Returns:
+        tuple: Two lists of np.ndarray; weight and bias arrays, views into buffer.
+    """
+    weights = []
+    biases = []
+    offset = 0
+    for n, m in zip(layers, layers[1:]):
+        weights.append(buffer[offset:offset + n * m].reshape((m, n)))
+        offset += n * m
+        biases.append(buffer[offset:offset + m])
+        offset += m
+    return weights, biases